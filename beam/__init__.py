@@ -2,9 +2,18 @@
 from __future__ import unicode_literals
 from os import path
 import codecs
+import functools
+import threading
 
+import six
+
+from beam import batch, fleet, instrument
+from beam.cache import HostCache
 from beam.config import Config
+from beam.diskcache import DiskCache
+from beam.history import History
 from beam.host import Host
+from beam.poller import Poller
 
 
 def _read_file(name, encoding='utf-8'):
@@ -21,25 +30,216 @@ def _read_file(name, encoding='utf-8'):
 
 __version__ = _read_file(path.join(path.dirname(__file__), 'VERSION')).strip()
 
-_config = Config.resolve()
+# loaded on first use by `_get_config()`, unless set by `configure()`
+_config = None
+_config_lock = threading.Lock()
+
+
+def configure(config=None):
+    """
+    Set the configuration used by beam, instead of searching for a .beam.ini
+    file on first use.
+
+    :param config: The path to a configuration file, a `Config` instance, or
+                   None to search for a configuration file again on next use.
+    :return: The configuration now in use, or None if it will be searched for.
+    :raises ValueError: If the configuration file cannot be parsed.
+    """
+    global _config
+    if isinstance(config, six.string_types):
+        config = Config.load(config)
+    with _config_lock:
+        _config = config
+    return config
+
+
+def _get_config():
+    """
+    Retrieve the configuration in use, searching for and parsing a .beam.ini
+    file the first time this is called if none has been set.
+
+    :return: The configuration.
+    :raises RuntimeError: If no configuration file could be located.
+    """
+    global _config
+    config = _config
+    if config is None:
+        with _config_lock:
+            if _config is None:
+                _config = Config.resolve()
+            config = _config
+    return config
 
 
-def host(identifier):
+def identities(patterns=None):
+    """
+    Find hosts in the inventory without retrieving information about them.
+
+    :param patterns: Host names, keys, hashes, or glob patterns over names,
+                     e.g. 'nyc-*'; None selects every host.
+    :return: The identities of the matching hosts, without duplicates.
+    :raises ValueError: If any pattern matches no hosts.
+    """
+    config = _get_config()
+    if patterns is None:
+        return list(config.hosts)
+    selected = []
+    seen = set()
+    for pattern in patterns:
+        for identity in config.select(pattern):
+            if identity not in seen:
+                seen.add(identity)
+                selected.append(identity)
+    return selected
+
+
+def host(identifier, fields=None):
     """
     Retrieve information about a host.
 
     :param identifier: The host's name, key or hash.
+    :param fields: The names of the attributes in `Host.FIELDS` to retrieve,
+                   or None to retrieve all of them.
     :return: The matching host.
     """
-    identity = _config.find_host(identifier)
-    return Host.request_from_identity(identity)
+    identity = _get_config().find_host(identifier)
+    return Host.request_from_identity(identity, fields)
 
 
-def hosts():
+def hosts(workers=fleet.DEFAULT_WORKERS, per_vendor=fleet.DEFAULT_PER_VENDOR,
+          return_exceptions=False, fields=None):
     """
-    Retrieve information about all hosts.
+    Retrieve information about all hosts. Requests are made concurrently.
     N.B. This operation can take some time!
 
-    :return: Metadata about every host in the inventory.
+    :param workers: The maximum number of requests to make at once.
+    :param per_vendor: The maximum number of requests to make at once to any
+                       single vendor, or None for no limit beyond `workers`.
+    :param return_exceptions: If true, a host that could not be retrieved is
+                              represented by the exception raised for it,
+                              rather than that exception propagating.
+    :param fields: The names of the attributes in `Host.FIELDS` to retrieve,
+                   or None to retrieve all of them.
+    :return: Metadata about every host in the inventory, in inventory order.
+    """
+    return fleet.map_identities(functools.partial(Host.request_from_identity,
+                                                  fields=fields),
+                                _get_config().hosts,
+                                workers, per_vendor, return_exceptions)
+
+
+def actions(identifiers, action, workers=fleet.DEFAULT_WORKERS,
+            per_vendor=fleet.DEFAULT_PER_VENDOR, rate_limit=None, rolling=None,
+            timeout=300, poll_interval=5):
+    """
+    Execute an action against many hosts concurrently. Hosts are not queried
+    before being acted on.
+
+    :param identifiers: The names, keys or hashes of the hosts to act on.
+    :param action: The name of the action, e.g. 'reboot'.
+    :param workers: The maximum number of actions to execute at once.
+    :param per_vendor: The maximum number of actions to execute at once
+                       against any single vendor, or None for no limit beyond
+                       `workers`.
+    :param rate_limit: The maximum number of actions to start per second, or
+                       None for no limit.
+    :param rolling: If set, act on this many hosts at a time, waiting for each
+                    to come back online (or go offline, for shutdown) before
+                    moving on. Once an action fails, the remaining hosts are
+                    skipped.
+    :param timeout: In rolling mode, the maximum number of seconds to wait for
+                    each host to change state.
+    :param poll_interval: In rolling mode, the maximum number of seconds
+                          between status checks.
+    :return: An `ActionReport` with a result for each host, in the order given.
+    :raises ValueError: If a host is not defined, or the action or any limit is
+                        invalid.
+    """
+    config = _get_config()
+    identities = [config.find_host(identifier) for identifier in identifiers]
+    return batch.execute(identities, action, workers, per_vendor, rate_limit,
+                         rolling, timeout, poll_interval)
+
+
+def enable_cache(ttl, max_size=1024, stale_ttl=0):
+    """
+    Cache host information in memory, so repeated lookups of a host within
+    `ttl` seconds do not make further API requests. Hosts are removed from the
+    cache when an action is executed against them.
+
+    :param ttl: The number of seconds host information is fresh for.
+    :param max_size: The maximum number of hosts to cache.
+    :param stale_ttl: The number of seconds after information becomes stale
+                      during which it is still returned while being refreshed
+                      in the background.
+    :return: The new cache.
+    """
+    Host.cache = HostCache(ttl, max_size, stale_ttl)
+    return Host.cache
+
+
+def disable_cache():
+    """
+    Stop caching host information.
+    """
+    Host.cache = None
+
+
+def enable_disk_cache(ttl, directory=None):
+    """
+    Cache info responses on disk, so processes looking up the same host
+    within `ttl` seconds, e.g. successive CLI invocations, share a single API
+    request. Hosts are removed from the cache when an action is executed
+    against them.
+
+    :param ttl: The number of seconds host information is fresh for.
+    :param directory: The directory to keep cached responses in; defaults to
+                      a hosts directory within beam's cache directory.
+    :return: The new disk cache.
+    :raises ValueError: If the TTL is not positive.
+    """
+    Host.disk_cache = DiskCache(ttl, directory)
+    return Host.disk_cache
+
+
+def disable_disk_cache():
+    """
+    Stop caching info responses on disk.
+    """
+    Host.disk_cache = None
+
+
+def enable_history(directory=None, retention=None):
+    """
+    Record every host retrieved in a local history store, so trends can be
+    queried later.
+
+    :param directory: The directory to keep history files in; defaults to a
+                      history directory within beam's cache directory.
+    :param retention: The number of seconds to keep readings for, or None to
+                      keep them forever; see `History`.
+    :return: The new history store.
+    """
+    Host.history = History(directory, retention)
+    return Host.history
+
+
+def disable_history():
+    """
+    Stop recording retrieved hosts.
+    """
+    Host.history = None
+
+
+def stats():
+    """
+    Summarise the time taken by beam's operations so far, e.g. to find slow
+    vendors. Operations are 'fetch' (retrieving a host, including any retries
+    and waiting for rate limits), 'request' (each HTTP request), 'parse' and
+    'action'. Use `beam.instrument.add_listener()` to receive each operation
+    as it finishes instead.
+
+    :return: A dictionary mapping `(operation, vendor name)` tuples to
+             `beam.instrument.Summary` instances.
     """
-    return [host(host_.hash) for host_ in _config.hosts]
+    return instrument.collector.summary()
@@ -1,12 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
+import os
 import sys
+import abc
 import argparse
+import csv
+import json
 import socket
 import functools
 
 import beam
+from beam import daemon, fleet
+from beam.config import Config
 from beam.host import Host
 
 
@@ -32,10 +38,22 @@ def _parse_args(argv):
     parser.add_argument('-V', '--version',
                         action='version',
                         version='%(prog)s ' + beam.__version__)
-    parser.add_argument('host',
-                        nargs='?', default=socket.gethostname(),
-                        help='the identifier of the host whose information to '
-                             'retrieve')
+    parser.add_argument('hosts',
+                        nargs='*', default=[socket.gethostname()],
+                        metavar='host',
+                        help='the identifier of a host whose information to '
+                             'retrieve, a glob pattern over host names, e.g. '
+                             '"nyc-*", or a vendor or tag, e.g. "vendor:a" or '
+                             '"tag:web"')
+    parser.add_argument('--all',
+                        action='store_true',
+                        help='select every host in the inventory')
+    parser.add_argument('-f', '--format',
+                        choices=sorted(_WRITERS),
+                        help='the output format when retrieving attributes; '
+                             'defaults to text for a single host, otherwise '
+                             'jsonl. Results are written as each host is '
+                             'retrieved')
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-A', '--action',
                        help='an action to execute against the host',
@@ -43,9 +61,101 @@ def _parse_args(argv):
     group.add_argument('-a', '--attributes',
                        nargs='+',
                        help='one or more attributes of the host to retrieve')
+    batch = parser.add_argument_group('several hosts')
+    batch.add_argument('--workers',
+                       type=int, default=fleet.DEFAULT_WORKERS,
+                       help='the maximum number of hosts to query or act on '
+                            'at once')
+    batch.add_argument('--rate-limit',
+                       type=float,
+                       help='the maximum number of actions to start per '
+                            'second')
+    batch.add_argument('--rolling',
+                       type=int, metavar='N',
+                       help='act on N hosts at a time, waiting for each to '
+                            'change state before moving on, and stopping at '
+                            'the first failure')
+    batch.add_argument('--timeout',
+                       type=float, default=300,
+                       help='in rolling mode, the number of seconds to wait '
+                            'for each host to change state')
+    parser.add_argument('--no-daemon',
+                        action='store_true',
+                        help='query vendors directly, even if a daemon is '
+                             'running')
+    parser.add_argument('--cache-ttl',
+                        type=float, default=os.environ.get('BEAM_CACHE_TTL'),
+                        metavar='SECONDS',
+                        help='cache host information on disk for this many '
+                             'seconds, sharing it between invocations; '
+                             'defaults to $BEAM_CACHE_TTL, otherwise disabled')
     return parser.parse_args(argv[1:])
 
 
+def _parse_serve_args(argv):
+    """
+    Interpret argv for the serve command.
+
+    :param argv: Command line options and positional arguments, including the
+                 command itself.
+    :return: The namespace resulting from a successful parsing.
+    """
+    parser = argparse.ArgumentParser(prog='beam serve',
+                                     description='Run a daemon answering '
+                                                 'single-host queries from '
+                                                 'beam on a Unix socket, '
+                                                 'keeping configuration, '
+                                                 'connections and host '
+                                                 'information warm.')
+    parser.add_argument('--socket',
+                        default=daemon.default_socket_path(),
+                        help='the path of the socket to listen on; defaults '
+                             'to %(default)s')
+    parser.add_argument('--ttl',
+                        type=float, default=30,
+                        help='the number of seconds to cache host information '
+                             'for')
+    parser.add_argument('--stale-ttl',
+                        type=float, default=0,
+                        help='the number of seconds after expiry that cached '
+                             'information may still be returned while it is '
+                             'refreshed')
+    return parser.parse_args(argv[2:])
+
+
+def _parse_export_args(argv):
+    """
+    Interpret argv for the export command.
+
+    :param argv: Command line options and positional arguments, including the
+                 command itself.
+    :return: The namespace resulting from a successful parsing.
+    """
+    from beam import exporter
+
+    parser = argparse.ArgumentParser(prog='beam export',
+                                     description='Serve metrics about every '
+                                                 'host in the inventory to '
+                                                 'Prometheus, refreshing them '
+                                                 'in the background.')
+    parser.add_argument('--address',
+                        default='',
+                        help='the address to listen on; defaults to all '
+                             'interfaces')
+    parser.add_argument('--port',
+                        type=int, default=exporter.DEFAULT_PORT,
+                        help='the port to listen on; defaults to '
+                             '%(default)s')
+    parser.add_argument('--interval',
+                        type=float, default=60,
+                        help='the number of seconds between retrievals of '
+                             'each host')
+    parser.add_argument('-w', '--workers',
+                        type=int, default=fleet.DEFAULT_WORKERS,
+                        help='the maximum number of hosts to retrieve at once')
+    return parser.parse_args(argv[2:])
+
+
 def _get_attribute(obj, attribute):
     """
     Retrieve an attribute denoted by a dotted string from an object.
@@ -63,33 +173,331 @@ def _get_attribute(obj, attribute):
     return functools.reduce(getattr, attribute.split('.'), obj)
 
 
-def main():
-    args = _parse_args(sys.argv)
+class _Writer(abc.ABC):
+    """
+    Writes the attributes of several hosts to a stream, one record per host.
+    Each output format subclasses this, and is looked up in `_WRITERS`.
+    """
+
+    def __init__(self, stream, attributes):
+        """
+        Initialise a new writer.
+
+        :param stream: The stream to write to, e.g. stdout.
+        :param attributes: The names of the attributes each record holds, in
+                           order.
+        """
+        self._stream = stream
+        self._attributes = attributes
+
+    @abc.abstractmethod
+    def write(self, name, values):
+        """
+        Write a host's record.
+
+        :param name: The name of the host.
+        :param values: The host's attribute values, in the same order as the
+                       attributes; None where an attribute does not exist.
+        """
+
+
+class _TextWriter(_Writer):
+    """
+    Writes one tab-separated line per host, starting with its name.
+    """
+
+    def write(self, name, values):
+        print('\t'.join([name] + ['' if value is None else str(value)
+                                  for value in values]),
+              file=self._stream)
+
+
+class _JsonLinesWriter(_Writer):
+    """
+    Writes one JSON object per host, keyed by attribute.
+    """
+
+    def write(self, name, values):
+        record = {'host': name}
+        record.update(zip(self._attributes, values))
+        print(json.dumps(record, default=str, sort_keys=True),
+              file=self._stream)
+
+
+class _CsvWriter(_Writer):
+    """
+    Writes one CSV row per host, after a header row naming the attributes.
+    """
+
+    def __init__(self, stream, attributes):
+        _Writer.__init__(self, stream, attributes)
+        self._writer = csv.writer(stream)
+        self._writer.writerow(['host'] + attributes)
+
+    def write(self, name, values):
+        self._writer.writerow([name] + ['' if value is None else value
+                                        for value in values])
+
+
+# output formats for attributes of several hosts
+_WRITERS = {
+    'text': _TextWriter,
+    'jsonl': _JsonLinesWriter,
+    'csv': _CsvWriter
+}
+
+
+def _get_attributes(obj, attributes):
+    """
+    Retrieve several attributes from an object, substituting None for any
+    that do not exist.
+
+    :param obj: The object to query.
+    :param attributes: The (possibly nested) attributes to retrieve.
+    :return: The list of values, in the same order as `attributes`.
+    """
+    values = []
+    for attribute in attributes:
+        try:
+            values.append(_get_attribute(obj, attribute))
+        except AttributeError:
+            values.append(None)
+    return values
+
+
+def _is_single_host(args):
+    """
+    Find whether the command line selects exactly one host by identifier.
+
+    :param args: The parsed command line arguments.
+    :return: True if a single host is selected, false otherwise.
+    """
+    return not args.all and len(args.hosts) == 1 and \
+        not Config.is_pattern(args.hosts[0])
+
+
+def _print_attributes_of_hosts(args, identities):
+    """
+    Retrieve attributes of several hosts concurrently, printing each host as
+    soon as it is retrieved.
+
+    :param args: The parsed command line arguments.
+    :param identities: The identities of the hosts to query.
+    :return: The exit code.
+    """
+    # only imported once a query cannot be answered by a daemon
+    import requests
+
+    writer = _WRITERS[args.format or 'jsonl'](sys.stdout, args.attributes)
+    fetch = functools.partial(Host.request_from_identity,
+                              fields=Host.fields_for(args.attributes))
+    status = 0
+    for _, identity, future in fleet.as_completed(fetch, identities,
+                                                  args.workers):
+        try:
+            host = future.result()
+        except (ValueError, RuntimeError, requests.RequestException) as e:
+            _print_error('Failed to retrieve host {0}: {1}'.format(
+                identity.name, e))
+            status = 1
+            continue
+        writer.write(identity.name, _get_attributes(host, args.attributes))
+        sys.stdout.flush()
+    return status
+
+
+def _act_on_hosts(args, identities):
+    """
+    Execute an action against several hosts, printing the outcome for each.
+
+    :param args: The parsed command line arguments.
+    :param identities: The identities of the hosts to act on.
+    :return: The exit code.
+    """
     try:
-        host = beam.host(args.host)
-    except ValueError:
-        _print_error('Host {0} not defined'.format(args.host))
+        report = beam.actions([identity.hash for identity in identities],
+                              args.action,
+                              workers=args.workers,
+                              rate_limit=args.rate_limit,
+                              rolling=args.rolling,
+                              timeout=args.timeout)
+    except ValueError as e:
+        _print_error(str(e))
         return 1
+    except RuntimeError as e:
+        _print_error('Failed to execute action: {0}'.format(e))
+        return 2
+
+    for result in report:
+        print(result)
+    return 0 if report.ok else 2
+
 
-    if args.action:
+def _query(query):
+    """
+    Retrieve a single host and optionally act on it. This is executed either
+    directly by the CLI, or by a daemon on its behalf.
+
+    :param query: A dictionary with the identifier of the host under 'host',
+                  and either the name of an action under 'action' or a list of
+                  attributes to retrieve under 'attributes'.
+    :return: A `[status, lines, errors]` list, containing the exit code, the
+             lines to print to stdout and the lines to print to stderr.
+    """
+    # only imported once a query cannot be answered by a daemon
+    import requests
+
+    name = query['host']
+    action = query.get('action')
+    attributes = query.get('attributes')
+    # only request what will be printed; actions need nothing beyond the
+    # host's name, which is always returned
+    fields = Host.fields_for(attributes or [])
+    try:
+        host = beam.host(name, fields)
+    except ValueError as e:
+        # e.g. no such host, with suggestions of similar names
+        return [1, [], [str(e)]]
+    except (RuntimeError, requests.RequestException) as e:
+        return [1, [], ['Failed to retrieve host: {0}'.format(e)]]
+
+    if action:
         try:
-            host.action(args.action)
+            host.action(action)
         except (ValueError, RuntimeError) as e:
-            _print_error('Failed to execute action: {0}'.format(e))
-            return 2
+            return [2, [], ['Failed to execute action: {0}'.format(e)]]
 
-    if not args.attributes:
-        print(host)
-        return 0
+    if not attributes:
+        return [0, [str(host)], []]
 
-    for attribute in args.attributes:
+    lines = []
+    for attribute in attributes:
         try:
-            print(_get_attribute(host, attribute))
+            lines.append(str(_get_attribute(host, attribute)))
         except AttributeError:
             # invalid; just print a blank line
-            print()
+            lines.append('')
+    return [0, lines, []]
+
+
+def _config_signature():
+    """
+    Identify the configuration file beam would load, so a daemon can tell
+    whether it loaded the same one.
+
+    :return: The file's signature as a list, or None if there is no file.
+    """
+    path = Config.locate()
+    if path is None:
+        return None
+    try:
+        return list(Config.file_signature(path))
+    except OSError:
+        return None
+
+
+def _answer(signature, query):
+    """
+    Answer a query on behalf of a client using the same configuration file
+    as the daemon. Other clients, e.g. those run from a directory with its own
+    .beam.ini, or after the file has been edited, would get answers from the
+    wrong inventory, so are declined and query vendors directly.
+
+    :param signature: The signature of the configuration file the daemon
+                      loaded, from `_config_signature()`.
+    :param query: A query from `main()`, with the client's configuration
+                  file signature under 'config'.
+    :return: The result of `_query()`, or None if the query is declined.
+    """
+    if query.get('config') != signature:
+        return None
+    return _query(query)
+
+
+def _serve(argv):
+    """
+    Run a daemon answering single-host queries until interrupted.
+
+    :param argv: Command line options and positional arguments, including the
+                 serve command.
+    :return: The exit code.
+    """
+    args = _parse_serve_args(argv)
+    try:
+        beam.enable_cache(args.ttl, stale_ttl=args.stale_ttl)
+        signature = _config_signature()
+        # fail now rather than on the first query
+        beam.identities()
+        daemon.serve(functools.partial(_answer, signature), args.socket)
+    except (ValueError, RuntimeError, OSError) as e:
+        _print_error(str(e))
+        return 1
     return 0
 
 
+def _export(argv):
+    """
+    Serve Prometheus metrics about every host until interrupted.
+
+    :param argv: Command line options and positional arguments, including the
+                 export command.
+    :return: The exit code.
+    """
+    from beam import exporter
+
+    args = _parse_export_args(argv)
+    try:
+        # fail now rather than in the background
+        beam.identities()
+        exporter.serve(exporter.Exporter(args.interval,
+                                         workers=args.workers),
+                       (args.address, args.port))
+    except (ValueError, RuntimeError, OSError) as e:
+        _print_error(str(e))
+        return 1
+    return 0
+
+
+def main():
+    if sys.argv[1:2] == ['serve']:
+        return _serve(sys.argv)
+    if sys.argv[1:2] == ['export']:
+        return _export(sys.argv)
+    args = _parse_args(sys.argv)
+    if args.cache_ttl:
+        try:
+            beam.enable_disk_cache(args.cache_ttl)
+        except ValueError as e:
+            _print_error(str(e))
+            return 1
+    if not _is_single_host(args) or args.format:
+        try:
+            identities = beam.identities(None if args.all else args.hosts)
+        except (ValueError, RuntimeError) as e:
+            _print_error(str(e))
+            return 1
+        if args.action:
+            return _act_on_hosts(args, identities)
+        return _print_attributes_of_hosts(args, identities)
+
+    query = {'host': args.hosts[0],
+             'action': args.action,
+             'attributes': args.attributes,
+             'config': _config_signature()}
+    try:
+        result = None if args.no_daemon else daemon.request(query)
+    except RuntimeError as e:
+        _print_error(str(e))
+        return 1
+    if result is None:
+        result = _query(query)
+    status, lines, errors = result
+    for line in lines:
+        print(line)
+    for error in errors:
+        _print_error(error)
+    return status
+
+
 if __name__ == '__main__':
     sys.exit(main())
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+
+import beam
+from beam import fleet
+from beam.host import Host
+
+
+async def host(identifier, transport=None, fields=None):
+    """
+    Asynchronously retrieve information about a host.
+
+    :param identifier: The host's name, key or hash.
+    :param transport: The transport to send the request with; defaults to the
+                      vendor's default transport.
+    :param fields: The names of the attributes in `Host.FIELDS` to retrieve,
+                   or None to retrieve all of them.
+    :return: The matching host.
+    """
+    identity = beam._get_config().find_host(identifier)
+    return await Host.arequest_from_identity(identity, transport, fields)
+
+
+async def hosts(workers=fleet.DEFAULT_WORKERS,
+                per_vendor=fleet.DEFAULT_PER_VENDOR, return_exceptions=False,
+                transport=None, fields=None):
+    """
+    Asynchronously retrieve information about all hosts, yielding each as
+    soon as its request completes.
+
+    :param workers: The maximum number of requests to make at once.
+    :param per_vendor: The maximum number of requests to make at once to any
+                       single vendor, or None for no limit beyond `workers`.
+    :param return_exceptions: If true, a host that could not be retrieved is
+                              yielded with the exception raised for it, rather
+                              than that exception propagating.
+    :param transport: The transport to send requests with; defaults to each
+                      vendor's default transport.
+    :param fields: The names of the attributes in `Host.FIELDS` to retrieve,
+                   or None to retrieve all of them.
+    :return: An asynchronous generator of `(identity, host)` tuples, in order
+             of completion.
+    :raises ValueError: If either limit is less than 1.
+    """
+    if workers < 1:
+        raise ValueError('At least one worker is required')
+    if per_vendor is not None and per_vendor < 1:
+        raise ValueError('The per-vendor limit must be at least 1')
+
+    limit = asyncio.Semaphore(workers)
+    vendor_limits = {}
+
+    async def fetch(identity):
+        vendor_limit = None
+        if per_vendor is not None:
+            vendor_limit = vendor_limits.setdefault(
+                identity.vendor, asyncio.Semaphore(per_vendor))
+            await vendor_limit.acquire()
+        try:
+            async with limit:
+                return identity, await Host.arequest_from_identity(
+                    identity, transport, fields)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return identity, e
+        finally:
+            if vendor_limit is not None:
+                vendor_limit.release()
+
+    tasks = [asyncio.ensure_future(fetch(identity))
+             for identity in beam._get_config().hosts]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def close():
+    """
+    Close the connections kept alive for asynchronous requests to every
+    vendor, e.g. before closing the event loop they were made on.
+    """
+    for vendor in set(identity.vendor
+                      for identity in beam._get_config().hosts):
+        vendor.transport().close()
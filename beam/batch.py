@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division
+
+import threading
+import time
+
+import six
+
+from beam import fleet
+from beam.host import Host
+from beam.wait import EXPECTED_STATES, Waiter
+
+
+@six.python_2_unicode_compatible
+class ActionResult(object):
+    """
+    The outcome of executing an action against a single host.
+    """
+
+    # the possible outcomes
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+    @property
+    def succeeded(self):
+        """
+        Find whether the action succeeded.
+
+        :return: True if it succeeded, false if it failed or was skipped.
+        """
+        return self.status == self.SUCCEEDED
+
+    def __init__(self, identity, status, error=None, elapsed=0):
+        """
+        Initialise a new action result.
+
+        :param identity: The identity of the host the action was executed
+                         against.
+        :param status: One of `SUCCEEDED`, `FAILED` or `SKIPPED`.
+        :param error: The exception that caused the action to fail, if any.
+        :param elapsed: The number of seconds the action took, including any
+                        time spent waiting for the host to change state.
+        """
+        self.identity = identity
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+
+    def __str__(self):
+        """
+        Generate a human-readable string representation of this result.
+
+        :return: This result as a friendly string.
+        """
+        if self.error is None:
+            return '{0}: {1}'.format(self.identity.name, self.status)
+        return '{0}: {1}: {2}'.format(self.identity.name, self.status,
+                                      self.error)
+
+
+@six.python_2_unicode_compatible
+class ActionReport(object):
+    """
+    The outcome of executing an action against many hosts.
+    """
+
+    @property
+    def succeeded(self):
+        """
+        Retrieve the results of the hosts the action succeeded against.
+
+        :return: The list of successful results.
+        """
+        return [result for result in self.results if result.succeeded]
+
+    @property
+    def failed(self):
+        """
+        Retrieve the results of the hosts the action failed against.
+
+        :return: The list of failed results.
+        """
+        return [result for result in self.results
+                if result.status == ActionResult.FAILED]
+
+    @property
+    def skipped(self):
+        """
+        Retrieve the results of the hosts the action was not attempted against.
+
+        :return: The list of skipped results.
+        """
+        return [result for result in self.results
+                if result.status == ActionResult.SKIPPED]
+
+    @property
+    def ok(self):
+        """
+        Find whether the action succeeded against every host.
+
+        :return: True if every result is successful, false otherwise.
+        """
+        return all(result.succeeded for result in self.results)
+
+    def __init__(self, action, results):
+        """
+        Initialise a new action report.
+
+        :param action: The name of the action executed.
+        :param results: The `ActionResult` of each host, in the order the hosts
+                        were specified.
+        """
+        self.action = action
+        self.results = results
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __str__(self):
+        """
+        Generate a human-readable summary of this report.
+
+        :return: This report as a friendly string.
+        """
+        return '{0}({1}: {2} succeeded, {3} failed, {4} skipped)'.format(
+            self.__class__.__name__,
+            self.action,
+            len(self.succeeded),
+            len(self.failed),
+            len(self.skipped))
+
+
+class _RateLimiter(object):
+    """
+    Spaces out calls so no more than a given number start per second.
+    """
+
+    def __init__(self, rate):
+        """
+        Initialise a new rate limiter.
+
+        :param rate: The maximum number of calls per second.
+        :raises ValueError: If the rate is not positive.
+        """
+        if rate <= 0:
+            raise ValueError('Rate limit must be positive')
+        self._interval = 1 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until the next call is allowed to start.
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self._interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _wait_for_state(waiter, identity, state, timeout):
+    """
+    Block until a host is online or offline, or has passed through several
+    states in order, e.g. gone down and come back up after a reboot.
+
+    :param waiter: The `Waiter` to poll the host's status with.
+    :param identity: The identity of the host to poll.
+    :param state: `wait.ONLINE` or `wait.OFFLINE`, or a sequence of them.
+    :param timeout: The maximum number of seconds to wait.
+    :raises RuntimeError: If the host does not reach the final state in
+                          time.
+    """
+    waiter.submit(identity, state, timeout).result()
+
+
+def execute(identities, action, workers=fleet.DEFAULT_WORKERS,
+            per_vendor=fleet.DEFAULT_PER_VENDOR, rate_limit=None,
+            rolling=None, timeout=300, poll_interval=5):
+    """
+    Execute an action against many hosts concurrently.
+
+    :param identities: The identities of the hosts to act on.
+    :param action: The name of the action, e.g. 'reboot'.
+    :param workers: The maximum number of actions to execute at once.
+    :param per_vendor: The maximum number of actions to execute at once
+                       against any single vendor, or None for no limit beyond
+                       `workers`.
+    :param rate_limit: The maximum number of actions to start per second, or
+                       None for no limit.
+    :param rolling: If set, act on this many hosts at a time, waiting for each
+                    to reach the state the action leaves it in (offline for
+                    shutdown, online for boot, and offline then online again
+                    for reboot) before moving on to the next.
+                    Once an action fails, the remaining hosts are skipped.
+                    Overrides `workers`.
+    :param timeout: In rolling mode, the maximum number of seconds to wait for
+                    each host to change state.
+    :param poll_interval: In rolling mode, the maximum number of seconds
+                          between polls of a host's status. Polls start more
+                          frequently, and back off towards this.
+    :return: An `ActionReport` with a result for each host, in the order given.
+    :raises ValueError: If the action or any limit is invalid.
+    """
+    if action not in Host.VALID_ACTIONS:
+        raise ValueError('Invalid action: {0}'.format(action))
+    if rolling is not None:
+        if rolling < 1:
+            raise ValueError('Must roll over at least one host at a time')
+        workers = rolling
+        # shared by every host being waited for
+        waiter = Waiter(min(1, poll_interval), poll_interval)
+    limiter = _RateLimiter(rate_limit) if rate_limit is not None else None
+    failed = threading.Event()
+
+    def run(identity):
+        if rolling is not None and failed.is_set():
+            return ActionResult(identity, ActionResult.SKIPPED)
+        if limiter is not None:
+            limiter.wait()
+        start = time.monotonic()
+        try:
+            Host.action_on_identity(identity, action)
+            if rolling is not None:
+                _wait_for_state(waiter, identity, EXPECTED_STATES[action],
+                                timeout)
+        except Exception as e:
+            failed.set()
+            return ActionResult(identity, ActionResult.FAILED, e,
+                                time.monotonic() - start)
+        return ActionResult(identity, ActionResult.SUCCEEDED,
+                            elapsed=time.monotonic() - start)
+
+    return ActionReport(action,
+                        fleet.map_identities(run, identities, workers,
+                                             per_vendor))
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of making a request to a vendor whose control panel has
+    recently been failing.
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Stops requests being made to a server after a run of consecutive failures,
+    so callers fail fast rather than each waiting for a dead server to time
+    out. Once the reset timeout has elapsed, a single trial request is let
+    through; if it succeeds the circuit closes again, otherwise it stays open
+    for another reset timeout.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=time.monotonic):
+        """
+        Initialise a new breaker, which starts closed.
+
+        :param threshold: The number of consecutive failures that open the
+                          circuit.
+        :param reset_timeout: The number of seconds to wait after opening
+                              before allowing a trial request.
+        :param clock: A function returning the current time in seconds.
+        :raises ValueError: If either parameter is out of range.
+        """
+        if threshold < 1:
+            raise ValueError('The failure threshold must be at least 1')
+        if reset_timeout <= 0:
+            raise ValueError('The reset timeout must be positive')
+
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        # when the circuit last opened, or None if it is closed
+        self._opened_at = None
+        # whether a trial request is in progress
+        self._trial = False
+
+    @property
+    def state(self):
+        """
+        Retrieve the state of the circuit.
+
+        :return: One of `CLOSED`, `OPEN` or `HALF_OPEN`.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if self._trial or \
+                    self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    def allow(self):
+        """
+        Check whether a request may be made. Every call that does not raise
+        must be followed by a call to `record()`.
+
+        :raises CircuitOpenError: If the circuit is open, or a trial request
+                                  is already in progress.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial or \
+                    self._clock() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    'Circuit open after {0} consecutive failures'.format(
+                        self._failures))
+            self._trial = True
+
+    def record(self, failed):
+        """
+        Record the outcome of a request.
+
+        :param failed: True if the request failed, false if it succeeded, or
+                       None if it was abandoned before completing, which
+                       counts as neither.
+        """
+        with self._lock:
+            trial = self._trial
+            self._trial = False
+            if failed is None:
+                return
+            if not failed:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if trial or self._failures >= self.threshold:
+                self._opened_at = self._clock()
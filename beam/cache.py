@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import collections
+import threading
+import time
+
+
+class _Entry(object):
+    """
+    A cached value and when it was stored.
+    """
+
+    def __init__(self, value, stored_at):
+        self.value = value
+        self.stored_at = stored_at
+
+
+class HostCache(object):
+    """
+    A thread-safe LRU cache of hosts, keyed on host hash. Entries are fresh
+    for `ttl` seconds after being stored. For a further `stale_ttl` seconds
+    they are stale: they are still returned, but trigger a refresh in the
+    background. After that, they are expired and reloaded before returning.
+    """
+
+    # the states a lookup can find an entry in
+    FRESH = 'fresh'
+    STALE = 'stale'
+    MISS = 'miss'
+
+    def __init__(self, ttl, max_size=1024, stale_ttl=0, clock=time.monotonic):
+        """
+        Initialise a new cache.
+
+        :param ttl: The number of seconds entries are fresh for.
+        :param max_size: The maximum number of entries to hold; the least
+                         recently used are evicted first.
+        :param stale_ttl: The number of seconds after becoming stale that an
+                          entry can still be served while it is refreshed.
+        :param clock: A function returning the current time in seconds.
+        :raises ValueError: If any parameter is out of range.
+        """
+        if ttl <= 0:
+            raise ValueError('TTL must be positive')
+        if max_size < 1:
+            raise ValueError('Cache must be able to hold at least one entry')
+        if stale_ttl < 0:
+            raise ValueError('Stale TTL cannot be negative')
+
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._refreshing = set()
+        # background refreshes by `aget()`; the event loop only holds weak
+        # references to tasks, so one could otherwise be collected mid-flight
+        self._tasks = set()
+        # incremented by invalidation, so loads begun before an invalidation
+        # cannot store what may now be outdated values
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Find the number of entries in the cache, including stale ones.
+
+        :return: The number of entries held.
+        """
+        return len(self._entries)
+
+    def lookup(self, key):
+        """
+        Retrieve an entry without loading it.
+
+        :param key: The key to look up.
+        :return: A `(value, state)` tuple. The value is None if the state is
+                 `MISS`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, self.MISS
+            age = self._clock() - entry.stored_at
+            if age >= self.ttl + self.stale_ttl:
+                del self._entries[key]
+                return None, self.MISS
+            self._entries.move_to_end(key)
+            return entry.value, self.FRESH if age < self.ttl else self.STALE
+
+    def store(self, key, value):
+        """
+        Add or replace an entry, evicting the least recently used entry if the
+        cache is full.
+
+        :param key: The key to store the value under.
+        :param value: The value to store.
+        """
+        self._store(key, value, None)
+
+    def _store(self, key, value, generation):
+        """
+        Add or replace an entry, unless the cache has been invalidated since a
+        given generation.
+
+        :param key: The key to store the value under.
+        :param value: The value to store.
+        :param generation: The generation the value was loaded in, or None to
+                           store unconditionally.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = _Entry(value, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Remove an entry, if present.
+
+        :param key: The key of the entry to remove.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def get(self, key, loader, accept=None):
+        """
+        Retrieve a value, loading it on a miss. If the entry is stale, it is
+        returned immediately and reloaded in a background thread.
+
+        :param key: The key to retrieve.
+        :param loader: A function taking no arguments that loads the value.
+        :param accept: A function taking a cached value and returning whether
+                       it satisfies this retrieval; if it returns false, the
+                       retrieval is treated as a miss.
+        :return: The value.
+        :raises Exception: Any exception raised by the loader on a miss.
+        """
+        value, state = self._lookup(key, accept)
+        if state == self.FRESH:
+            return value
+        generation = self._generation
+        if state == self.STALE:
+            if self._begin_refresh(key):
+                thread = threading.Thread(target=self._refresh,
+                                          args=(key, loader, generation))
+                thread.daemon = True
+                thread.start()
+            return value
+        value = loader()
+        self._store(key, value, generation)
+        return value
+
+    async def aget(self, key, loader, accept=None):
+        """
+        Asynchronously retrieve a value, loading it on a miss. If the entry is
+        stale, it is returned immediately and reloaded in a background task.
+
+        :param key: The key to retrieve.
+        :param loader: A coroutine function taking no arguments that loads the
+                       value.
+        :param accept: A function taking a cached value and returning whether
+                       it satisfies this retrieval; if it returns false, the
+                       retrieval is treated as a miss.
+        :return: The value.
+        :raises Exception: Any exception raised by the loader on a miss.
+        """
+        value, state = self._lookup(key, accept)
+        if state == self.FRESH:
+            return value
+        generation = self._generation
+        if state == self.STALE:
+            if self._begin_refresh(key):
+                # only imported once needed, as in `SingleFlight.ado()`
+                import asyncio
+
+                task = asyncio.ensure_future(
+                    self._arefresh(key, loader, generation))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return value
+        value = await loader()
+        self._store(key, value, generation)
+        return value
+
+    def _lookup(self, key, accept):
+        """
+        Retrieve an entry without loading it, treating unacceptable values as
+        misses.
+
+        :param key: The key to look up.
+        :param accept: A function taking the value and returning whether it is
+                       acceptable, or None to accept any value.
+        :return: A `(value, state)` tuple, as returned by `lookup()`.
+        """
+        value, state = self.lookup(key)
+        if state != self.MISS and accept is not None and not accept(value):
+            return None, self.MISS
+        return value, state
+
+    def _begin_refresh(self, key):
+        """
+        Mark a key as being refreshed.
+
+        :param key: The key about to be refreshed.
+        :return: True if the caller should refresh the key, false if a refresh
+                 is already in progress.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _refresh(self, key, loader, generation):
+        """
+        Reload a stale entry on a background thread, started by `get()`. A
+        failed reload leaves the stale entry in place.
+
+        :param key: The key to reload.
+        :param loader: A function taking no arguments that loads the value.
+        :param generation: The generation when the reload was scheduled; the
+                           value is discarded if the cache has been
+                           invalidated since.
+        """
+        try:
+            self._store(key, loader(), generation)
+        except Exception:
+            # keep serving the stale entry until it expires
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _arefresh(self, key, loader, generation):
+        """
+        Reload a stale entry in a background task, scheduled by `aget()`. A
+        failed reload leaves the stale entry in place.
+
+        :param key: The key to reload.
+        :param loader: A coroutine function taking no arguments that loads
+                       the value.
+        :param generation: The generation when the reload was scheduled; the
+                           value is discarded if the cache has been
+                           invalidated since.
+        """
+        try:
+            self._store(key, await loader(), generation)
+        except Exception:
+            # keep serving the stale entry until it expires
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
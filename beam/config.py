@@ -2,13 +2,35 @@
 from __future__ import unicode_literals
 
 import os
+import re
+import bisect
+import difflib
+import errno
+import fnmatch
+import hashlib
+import marshal
+import tempfile
 import six
 # noinspection PyUnresolvedReferences
 from six.moves import configparser
 
-from beam.vendor import Vendor
 from beam.host import HostIdentity
 
+# beam.vendor imports requests, so is only imported once vendors are built,
+# keeping the CLI cheap to start when a daemon answers its query
+
+
+def cache_directory():
+    """
+    Find the directory beam should store cached data in, following the XDG
+    base directory specification.
+
+    :return: The path of the directory, which may not exist.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'beam')
+
 
 # noinspection PyClassHasNoInit
 class _DictConfigParser(configparser.ConfigParser):
@@ -30,6 +52,137 @@ class _DictConfigParser(configparser.ConfigParser):
         return d
 
 
+class _HostIndex(object):
+    """
+    Indices over host names, vendors and tags, for selecting groups of hosts
+    without examining every host. Hosts are referred to by their position in
+    the inventory.
+    """
+
+    # separates names in `_joined`; cannot appear in a section name
+    _SEPARATOR = '\n'
+
+    # the maximum number of names to compare an unknown identifier against
+    _SUGGESTION_CANDIDATES = 1000
+
+    def __init__(self, names, vendors, tags, order=None):
+        """
+        Initialise a new index.
+
+        :param names: The name of each host.
+        :param vendors: The name of each host's vendor.
+        :param tags: The tags of each host.
+        :param order: The positions of the hosts sorted by name, if already
+                      known.
+        """
+        self._names = names
+        self._order = list(order) if order is not None else \
+            sorted(range(len(names)), key=names.__getitem__)
+        self._sorted = [names[position] for position in self._order]
+        # every name in one string, so substrings are found by str.find()
+        self._joined = self._SEPARATOR.join(names) + self._SEPARATOR
+        self._offsets = []
+        offset = 0
+        for name in names:
+            self._offsets.append(offset)
+            offset += len(name) + 1
+        self._by_vendor = {}
+        for position, vendor in enumerate(vendors):
+            self._by_vendor.setdefault(vendor, []).append(position)
+        self._by_tag = {}
+        for position, host_tags in enumerate(tags):
+            for tag in host_tags:
+                self._by_tag.setdefault(tag, []).append(position)
+
+    def prefix(self, prefix):
+        """
+        Find the hosts whose names start with a string.
+
+        :param prefix: The start of the names.
+        :return: The sorted positions of matching hosts.
+        """
+        start = bisect.bisect_left(self._sorted, prefix)
+        # names sharing the prefix are contiguous in sorted order
+        end = bisect.bisect_left(self._sorted, prefix + '\U0010ffff', start)
+        return sorted(self._order[start:end])
+
+    def substring(self, substring):
+        """
+        Find the hosts whose names contain a string.
+
+        :param substring: The string to search for.
+        :return: The sorted positions of matching hosts.
+        """
+        if not substring:
+            return list(range(len(self._names)))
+        positions = []
+        find = self._joined.find
+        offset = find(substring)
+        while offset != -1:
+            position = bisect.bisect_right(self._offsets, offset) - 1
+            positions.append(position)
+            # continue from the next name, so each host matches once
+            offset = find(substring, self._offsets[position] +
+                          len(self._names[position]) + 1)
+        return positions
+
+    def glob(self, pattern):
+        """
+        Find the hosts whose names match a glob pattern. Patterns of the form
+        'prefix*' and '*substring*' are answered from the index; others are
+        only matched against names sharing the pattern's literal prefix.
+
+        :param pattern: The pattern, containing *, ? or [.
+        :return: The sorted positions of matching hosts.
+        """
+        literal = re.match(r'[^*?[]*', pattern).group()
+        rest = pattern[len(literal):]
+        if rest == '*':
+            return self.prefix(literal)
+        inner = pattern[1:-1]
+        if len(pattern) > 1 and pattern[0] == pattern[-1] == '*' and \
+                not any(char in inner for char in '*?['):
+            return self.substring(inner)
+        match = re.compile(fnmatch.translate(pattern)).match
+        return [position for position in self.prefix(literal)
+                if match(self._names[position])]
+
+    def vendor(self, name):
+        """
+        Find the hosts provided by a vendor.
+
+        :param name: The name of the vendor.
+        :return: The sorted positions of matching hosts.
+        """
+        return self._by_vendor.get(name, [])
+
+    def tag(self, tag):
+        """
+        Find the hosts with a tag.
+
+        :param tag: The tag.
+        :return: The sorted positions of matching hosts.
+        """
+        return self._by_tag.get(tag, [])
+
+    def suggest(self, identifier):
+        """
+        Find host names similar to an identifier that matched no host.
+
+        :param identifier: The identifier.
+        :return: Up to three similar names, most similar first.
+        """
+        candidates = self._sorted
+        if len(candidates) > self._SUGGESTION_CANDIDATES:
+            # comparing against every name is slow for large inventories, so
+            # only consider those that sort nearby, i.e. share a prefix
+            middle = bisect.bisect_left(candidates, identifier)
+            candidates = candidates[
+                max(0, middle - self._SUGGESTION_CANDIDATES // 2):
+                middle + self._SUGGESTION_CANDIDATES // 2]
+        return difflib.get_close_matches(identifier, candidates, 3)
+
+
 class Config(object):
     """
     Represents beam's configuration file.
@@ -41,6 +194,14 @@ class Config(object):
     # places to look for the above config file, in order
     _PLACES = ['.', os.path.expanduser('~')]
 
+    # the version of the compiled inventory format; change whenever the format
+    # changes so existing compiled files are ignored
+    _COMPILED_VERSION = 2
+
+    # selectors of hosts by vendor or tag rather than name, e.g. 'tag:web'
+    _VENDOR_SELECTOR = 'vendor:'
+    _TAG_SELECTOR = 'tag:'
+
     @property
     def hosts(self):
         """
@@ -64,6 +225,9 @@ class Config(object):
         self._hosts_by_name = {host.name: host for host in hosts}
         self._hosts_by_key = {host.key: host for host in hosts}
         self._hosts_by_hash = {host.hash: host for host in hosts}
+        self._hosts = list(self._hosts_by_name.values())
+        # built on first selection, as finding a single host does not need it
+        self._index = None
 
     def find_host(self, identifier):
         """
@@ -82,7 +246,87 @@ class Config(object):
         if identifier in self._hosts_by_hash:
             return self._hosts_by_hash[identifier]
 
-        raise ValueError('No host found matching {0}'.format(identifier))
+        raise self._not_found(identifier)
+
+    def _not_found(self, identifier):
+        """
+        Create the error raised when an identifier matches no host, suggesting
+        similar names.
+
+        :param identifier: The identifier.
+        :return: The exception to raise.
+        """
+        message = 'No host found matching {0}'.format(identifier)
+        suggestions = self._get_index().suggest(identifier)
+        if suggestions:
+            message += '; did you mean {0}?'.format(', '.join(suggestions))
+        return ValueError(message)
+
+    @classmethod
+    def is_pattern(cls, pattern):
+        """
+        Find whether a string passed to `select()` may match several hosts.
+
+        :param pattern: The string.
+        :return: True if it is a glob pattern or selects by vendor or tag,
+                 false if it is a host identifier.
+        """
+        return pattern.startswith((cls._VENDOR_SELECTOR, cls._TAG_SELECTOR)) \
+            or any(char in pattern for char in '*?[')
+
+    def select(self, pattern):
+        """
+        Retrieve hosts by identifier, by a glob pattern over their names, e.g.
+        'nyc-*', by vendor, e.g. 'vendor:ramnode', or by tag, e.g. 'tag:web'.
+        Patterns of the form 'prefix*' and '*substring*' are fastest.
+
+        :param pattern: A host identifier, a pattern containing *, ? or [, or a
+                        vendor or tag selector.
+        :return: The list of matching hosts, in inventory order.
+        :raises ValueError: If no hosts match.
+        """
+        if pattern.startswith(self._VENDOR_SELECTOR):
+            positions = self._get_index().vendor(
+                pattern[len(self._VENDOR_SELECTOR):])
+        elif pattern.startswith(self._TAG_SELECTOR):
+            positions = self._get_index().tag(
+                pattern[len(self._TAG_SELECTOR):])
+        elif self.is_pattern(pattern):
+            positions = self._get_index().glob(pattern)
+        else:
+            return [self.find_host(pattern)]
+        if not positions:
+            raise ValueError('No hosts found matching {0}'.format(pattern))
+        return [self._identity(position) for position in positions]
+
+    def _get_index(self):
+        """
+        Retrieve the index of hosts, building it on first use.
+
+        :return: The `_HostIndex`.
+        """
+        if self._index is None:
+            self._index = self._build_index()
+        return self._index
+
+    def _build_index(self):
+        """
+        Build an index of the hosts in this configuration.
+
+        :return: The new `_HostIndex`.
+        """
+        return _HostIndex([host.name for host in self._hosts],
+                          [host.vendor.name for host in self._hosts],
+                          [host.tags for host in self._hosts])
+
+    def _identity(self, position):
+        """
+        Retrieve the identity of a host by its position in the inventory.
+
+        :param position: The position.
+        :return: The host's identity.
+        """
+        return self._hosts[position]
 
     @staticmethod
     def from_ini(path):
@@ -107,6 +351,12 @@ class Config(object):
                 'Config file must contain a special:vendors section')
         vendors = dict(six.iteritems(values.pop('special:vendors')))
         default_vendor = vendors.pop('default', None)  # None must be explicit
+
+        # keys of the form vendor.option configure that vendor's connections
+        options = {}
+        for key in [key for key in vendors if '.' in key]:
+            name, option = key.split('.', 1)
+            options.setdefault(name, {})[option] = vendors.pop(key)
         if not vendors:
             raise ValueError('At least one vendor must be defined')
 
@@ -122,7 +372,16 @@ class Config(object):
             raise ValueError('The default vendor specified does not correspond '
                              'to a defined vendor')
 
-        vendors = {name: Vendor(name, endpoint)
+        for name in options:
+            if name not in vendors:
+                raise ValueError(
+                    'Options specified for undefined vendor {0}'.format(name))
+
+        from beam.vendor import Vendor
+
+        vendors = {name: Vendor(name, endpoint,
+                                **Config._parse_vendor_options(
+                                    name, options.get(name, {})))
                    for name, endpoint in six.iteritems(vendors)}
         default_vendor = vendors[default_vendor]
 
@@ -143,12 +402,177 @@ class Config(object):
             if 'hash' not in attrs:
                 raise ValueError(
                     'Host {0} is missing its hash'.format(name))
+            tags = [tag.strip() for tag in attrs.get('tags', '').split(',')
+                    if tag.strip()]
             hosts.append(HostIdentity(name,
                                       attrs['key'],
                                       attrs['hash'],
-                                      vendor))
+                                      vendor,
+                                      tags))
         return Config(hosts)
 
+    @staticmethod
+    def _parse_vendor_options(name, options):
+        """
+        Convert a vendor's connection options from strings.
+
+        :param name: The name of the vendor the options apply to.
+        :param options: A dictionary of option names to string values.
+        :return: A dictionary of option names to parsed values.
+        :raises ValueError: If an option is unknown or its value is invalid.
+        """
+        from beam.vendor import Vendor
+
+        parsed = {}
+        for option, value in six.iteritems(options):
+            if option not in Vendor.OPTIONS:
+                raise ValueError('Unknown option {0} for vendor {1}'.format(
+                    option, name))
+            try:
+                parsed[option] = Vendor.OPTIONS[option](value)
+            except ValueError:
+                raise ValueError('Invalid value for {0}.{1}: {2}'.format(
+                    name, option, value))
+        return parsed
+
+    @classmethod
+    def load(cls, path):
+        """
+        Create a configuration instance from a .ini file, using a compiled copy
+        of it if one is available and up to date. Otherwise, the file is parsed
+        and compiled for next time. Compiled copies are stored in
+        `cache_directory()`, and are rebuilt whenever the .ini file's
+        modification time or size changes.
+
+        :param path: The path to the ini file.
+        :return: The parsed configuration.
+        :raises ValueError: If parsing fails, or the configuration is malformed.
+        """
+        try:
+            signature = (cls._COMPILED_VERSION,) + cls.file_signature(path)
+        except OSError:
+            raise ValueError('Failed to parse ini file at {0}'.format(path))
+        compiled_path = cls._compiled_path(path)
+
+        try:
+            with open(compiled_path, 'rb') as f:
+                compiled = marshal.loads(f.read())
+            if compiled[0] == signature:
+                return cls._from_compiled(compiled)
+        except (OSError, IOError, EOFError, ValueError, TypeError,
+                IndexError):
+            # missing, unreadable or corrupt; recompile
+            pass
+
+        config = cls.from_ini(path)
+        try:
+            config._compile(compiled_path, signature)
+        except (OSError, IOError):
+            # the cache is an optimisation; failing to write it is harmless
+            pass
+        return config
+
+    @staticmethod
+    def _compiled_path(path):
+        """
+        Find where the compiled copy of a .ini file is stored.
+
+        :param path: The path to the ini file.
+        :return: The path of the compiled file.
+        """
+        digest = hashlib.sha1(
+            os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(cache_directory(), digest + '.inventory')
+
+    def _compile(self, path, signature):
+        """
+        Atomically write this configuration in compiled form.
+
+        :param path: The path to write the compiled file to.
+        :param signature: The version and source file details the compiled
+                          file is valid for.
+        :raises OSError: If the file cannot be written.
+        """
+        from beam.vendor import Vendor
+
+        vendors = []
+        vendor_indices = {}
+        rows = []
+        for host in self.hosts:
+            if host.vendor not in vendor_indices:
+                vendor_indices[host.vendor] = len(vendors)
+                vendors.append((host.vendor.name,
+                                host.vendor.endpoint,
+                                {option: getattr(host.vendor, option)
+                                 for option in Vendor.OPTIONS}))
+            rows.append((host.name, host.key, host.hash,
+                         vendor_indices[host.vendor], tuple(sorted(host.tags))))
+        compiled = (signature,
+                    tuple(vendors),
+                    tuple(rows),
+                    {row[0]: i for i, row in enumerate(rows)},
+                    {row[1]: i for i, row in enumerate(rows)},
+                    {row[2]: i for i, row in enumerate(rows)},
+                    # positions sorted by name, so the index need not sort
+                    tuple(sorted(range(len(rows)), key=lambda i: rows[i][0])))
+
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                marshal.dump(compiled, f)
+            os.replace(temporary, path)
+        except Exception:
+            os.remove(temporary)
+            raise
+
+    @staticmethod
+    def _from_compiled(compiled):
+        """
+        Create a configuration instance from its compiled form.
+
+        :param compiled: The unmarshalled contents of a compiled file.
+        :return: The configuration.
+        """
+        from beam.vendor import Vendor
+
+        _, vendors, rows, by_name, by_key, by_hash, order = compiled
+        vendors = [Vendor(name, endpoint, **options)
+                   for name, endpoint, options in vendors]
+        return _CompiledConfig(vendors, rows, by_name, by_key, by_hash, order)
+
+    @staticmethod
+    def file_signature(path):
+        """
+        Identify a version of a configuration file, which changes whenever the
+        file is edited or replaced.
+
+        :param path: The path to the file.
+        :return: A tuple of the file's absolute path, modification time in
+                 nanoseconds and size.
+        :raises OSError: If the file cannot be accessed.
+        """
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def locate(cls):
+        """
+        Find the config file `resolve()` would parse, without parsing it.
+
+        :return: The path of the file, or None if there is none.
+        """
+        for place in cls._PLACES:
+            path = os.path.join(place, cls._NAME)
+            if os.path.isfile(path):
+                return path
+        return None
+
     @classmethod
     def resolve(cls):
         """
@@ -157,8 +581,85 @@ class Config(object):
         :return: The parsed config file.
         :raises RuntimeError: If the file could not be located.
         """
-        for place in cls._PLACES:
-            path = os.path.join(place, cls._NAME)
-            if os.path.isfile(path):
-                return cls.from_ini(path)
-        raise RuntimeError('Unable to locate config file')
+        path = cls.locate()
+        if path is None:
+            raise RuntimeError('Unable to locate config file')
+        return cls.load(path)
+
+
+class _CompiledConfig(Config):
+    """
+    A configuration loaded from a compiled inventory. Host identities are only
+    created when they are retrieved, so finding a single host does not
+    require building objects for the entire inventory.
+    """
+
+    @property
+    def hosts(self):
+        """
+        Retrieve all defined hosts.
+
+        :return: The list of all hosts defined in the configuration.
+        """
+        return [self._identity(index) for index in range(len(self._rows))]
+
+    # noinspection PyMissingConstructor
+    def __init__(self, vendors, rows, by_name, by_key, by_hash, order):
+        """
+        Initialise a new compiled configuration instance.
+
+        :param vendors: The list of vendors referenced by rows.
+        :param rows: A sequence of `(name, key, hash, vendor index, tags)`
+                     tuples.
+        :param by_name: A dictionary of host name to row index.
+        :param by_key: A dictionary of host key to row index.
+        :param by_hash: A dictionary of host hash to row index.
+        :param order: The row indices sorted by host name.
+        """
+        self._vendors = vendors
+        self._rows = rows
+        self._indices = (by_name, by_key, by_hash)
+        self._order = order
+        self._identities = {}
+        self._index = None
+
+    def find_host(self, identifier):
+        """
+        Retrieve a host by one of its unique identifiers.
+
+        :param identifier: The host identifier to look up.
+        :return: The matching host.
+        :raises ValueError: If no such host matches.
+        """
+        for index in self._indices:
+            if identifier in index:
+                return self._identity(index[identifier])
+        raise self._not_found(identifier)
+
+    def _build_index(self):
+        """
+        Build an index of the hosts in this configuration, without creating
+        their identities.
+
+        :return: The new `_HostIndex`.
+        """
+        return _HostIndex([row[0] for row in self._rows],
+                          [self._vendors[row[3]].name for row in self._rows],
+                          [row[4] for row in self._rows],
+                          self._order)
+
+    def _identity(self, index):
+        """
+        Retrieve the identity of the host in a given row, creating it on first
+        access.
+
+        :param index: The row index.
+        :return: The host's identity.
+        """
+        identity = self._identities.get(index)
+        if identity is None:
+            name, key, hash_, vendor, tags = self._rows[index]
+            identity = HostIdentity(name, key, hash_, self._vendors[vendor],
+                                    tags)
+            self._identities[index] = identity
+        return identity
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import os
+import signal
+import socket
+import stat
+# noinspection PyUnresolvedReferences
+from six.moves import socketserver
+
+
+def default_socket_path():
+    """
+    Find where the daemon listens by default: $BEAM_SOCKET if set, otherwise
+    beam.sock in a directory private to the current user under /tmp. The
+    latter only depends on the user, so cron jobs, monitoring checks and sudo
+    find the same daemon as a login shell.
+
+    :return: The path of the socket.
+    """
+    if os.environ.get('BEAM_SOCKET'):
+        return os.environ['BEAM_SOCKET']
+    return os.path.join('/tmp', 'beam-{0}'.format(os.getuid()), 'beam.sock')
+
+
+def _is_trusted_directory(path):
+    """
+    Find whether a directory can only have entries replaced by the current
+    user: it must be owned by them or root, and must not be writable by
+    anyone else unless it is sticky, like /tmp.
+
+    :param path: The path of the directory.
+    :return: True if the directory is trusted, false otherwise.
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and \
+        info.st_uid in (os.getuid(), 0) and \
+        (not info.st_mode & 0o022 or bool(info.st_mode & stat.S_ISVTX))
+
+
+def _is_trusted(path):
+    """
+    Find whether a socket was created by the current user, in a directory no
+    one else can replace it in, so a daemon listening on it can be trusted to
+    answer queries. Another user could otherwise create the socket first and
+    return arbitrary results.
+
+    :param path: The path of the socket.
+    :return: True if the socket is trusted, false otherwise.
+    """
+    if not _is_trusted_directory(os.path.dirname(os.path.abspath(path))):
+        return False
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    Answers newline-delimited JSON queries on a connection, one response line
+    per query line.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = {'result': self.server.handler(
+                    json.loads(line.decode('utf-8')))}
+            except Exception as e:
+                response = {'error': '{0}: {1}'.format(e.__class__.__name__,
+                                                       e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    A server answering queries on a Unix domain socket, so clients do not each
+    pay for loading the configuration and connecting to vendors.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, handler):
+        """
+        Initialise a new daemon, listening on a socket only accessible to the
+        current user.
+
+        :param path: The path of the socket to create.
+        :param handler: A function taking a query dictionary and returning a
+                        JSON-serialisable result, or None to decline the
+                        query.
+        :raises RuntimeError: If another daemon is already listening on the
+                              socket, or the socket's directory or an existing
+                              file at its path belongs to another user.
+        :raises OSError: If the socket cannot be created.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.mkdir(directory, 0o700)
+        if not _is_trusted_directory(directory):
+            raise RuntimeError(
+                '{0} may be modified by another user'.format(directory))
+        if os.path.lexists(path):
+            if os.lstat(path).st_uid != os.getuid():
+                raise RuntimeError(
+                    '{0} belongs to another user'.format(path))
+            client = _connect(path, 1)
+            if client is not None:
+                client.close()
+                raise RuntimeError(
+                    'A daemon is already listening on {0}'.format(path))
+            # left behind by a daemon that did not exit cleanly
+            os.remove(path)
+        self.path = path
+        self.handler = handler
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def serve(handler, path=None):
+    """
+    Run a daemon in the foreground until interrupted or terminated.
+
+    :param handler: A function taking a query dictionary and returning a
+                    JSON-serialisable result, or None to decline the query.
+    :param path: The path of the socket to listen on; defaults to
+                 `default_socket_path()`.
+    :raises RuntimeError: If another daemon is already listening on the socket.
+    """
+    server = Daemon(path or default_socket_path(), handler)
+
+    def terminate(*_):
+        raise KeyboardInterrupt()
+
+    previous = signal.signal(signal.SIGTERM, terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        server.server_close()
+
+
+def _connect(path, timeout):
+    """
+    Connect to a daemon's socket.
+
+    :param path: The path of the socket.
+    :param timeout: The number of seconds to wait for any socket operation.
+    :return: The connected socket, or None if no daemon is listening.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+    except (OSError, socket.error):
+        client.close()
+        return None
+    return client
+
+
+def request(query, path=None, timeout=120):
+    """
+    Send a query to a running daemon.
+
+    :param query: The JSON-serialisable query dictionary.
+    :param path: The path of the daemon's socket; defaults to
+                 `default_socket_path()`.
+    :param timeout: The number of seconds to wait for the daemon to respond.
+    :return: The daemon's result, or None if no trusted daemon is running or
+             its handler declined the query by returning None, in which case
+             the query was not executed.
+    :raises RuntimeError: If the query was sent but no valid response was
+                          received, or the daemon failed to execute it.
+    """
+    path = path or default_socket_path()
+    if not _is_trusted(path):
+        return None
+    client = _connect(path, timeout)
+    if client is None:
+        return None
+    try:
+        client.sendall(json.dumps(query).encode('utf-8') + b'\n')
+        line = client.makefile('rb').readline()
+        response = json.loads(line.decode('utf-8'))
+    except (OSError, socket.error, ValueError) as e:
+        raise RuntimeError('No response from beam daemon: {0}'.format(e))
+    finally:
+        client.close()
+    if 'error' in response:
+        raise RuntimeError('beam daemon failed: {0}'.format(response['error']))
+    return response['result']
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import marshal
+import os
+import tempfile
+import time
+
+from beam.config import cache_directory
+
+
+class DiskCache(object):
+    """
+    A cache of info responses shared between processes, with one file per
+    host. Files are replaced atomically, so concurrent readers and writers
+    never see a partial entry, and the last writer wins. Entries are fresh for
+    `ttl` seconds after being stored.
+
+    Invalidations are recorded in marker files whose modification times are
+    when they happened, so a response requested before an invalidation, but
+    stored after it, is discarded in any process.
+    """
+
+    # incremented whenever the entry format changes
+    _VERSION = 1
+
+    # marks when every entry was last invalidated by `clear()`
+    _CLEARED = 'cleared'
+
+    def __init__(self, ttl, directory=None, clock=time.time):
+        """
+        Initialise a new disk cache.
+
+        :param ttl: The number of seconds entries are fresh for.
+        :param directory: The directory to keep entries in; defaults to a
+                          hosts directory within `cache_directory()`.
+        :param clock: A function returning the current time in seconds, which
+                      must agree between processes.
+        :raises ValueError: If the TTL is not positive.
+        """
+        if ttl <= 0:
+            raise ValueError('TTL must be positive')
+        self.ttl = ttl
+        self.directory = directory or os.path.join(cache_directory(), 'hosts')
+        self._clock = clock
+
+    def _path(self, hash_, extension='.info'):
+        """
+        Find the file holding a host's entry.
+
+        :param hash_: The host's hash.
+        :param extension: The extension of the file; '.invalidated' finds the
+                          host's invalidation marker.
+        :return: The path of the file.
+        """
+        digest = hashlib.sha1(hash_.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + extension)
+
+    def _make_directory(self):
+        """
+        Create the cache's directory if it does not exist.
+
+        :raises OSError: If the directory cannot be created.
+        """
+        try:
+            # host information is only for the user's eyes
+            os.makedirs(self.directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    @staticmethod
+    def _nanoseconds(seconds):
+        """
+        Convert a time to the integer form of file modification times, so
+        equal times compare equal.
+
+        :param seconds: The time in seconds.
+        :return: The time in nanoseconds.
+        """
+        return int(round(seconds * 1e9))
+
+    def _mark(self, path):
+        """
+        Record that an invalidation happened now.
+
+        :param path: The path of the marker file.
+        :raises OSError: If the marker cannot be written.
+        """
+        now = self._nanoseconds(self._clock())
+        self._make_directory()
+        with open(path, 'ab'):
+            pass
+        os.utime(path, ns=(now, now))
+
+    def _invalidated_since(self, hash_, started):
+        """
+        Find whether a host has been invalidated since a given time.
+
+        :param hash_: The host's hash.
+        :param started: The time, by the cache's clock.
+        :return: True if an invalidation happened at or after `started`,
+                 false otherwise.
+        """
+        started = self._nanoseconds(started)
+        for path in (self._path(hash_, '.invalidated'),
+                     os.path.join(self.directory, self._CLEARED)):
+            try:
+                if os.stat(path).st_mtime_ns >= started:
+                    return True
+            except OSError:
+                # never invalidated
+                pass
+        return False
+
+    def time(self):
+        """
+        Retrieve the current time by the cache's clock, e.g. to record when a
+        request whose response may be stored started.
+
+        :return: The time in seconds.
+        """
+        return self._clock()
+
+    def load(self, hash_, fields):
+        """
+        Retrieve a host's cached info response.
+
+        :param hash_: The host's hash.
+        :param fields: The names of the attributes in `Host.FIELDS` the
+                       response must contain.
+        :return: The response body, or None if there is no fresh entry with
+                 the fields.
+        """
+        try:
+            with open(self._path(hash_), 'rb') as f:
+                version, stored_at, stored_fields, body = marshal.loads(
+                    f.read())
+        except (OSError, IOError, EOFError, ValueError, TypeError):
+            # missing, unreadable or corrupt
+            return None
+        if version != self._VERSION or \
+                not 0 <= self._clock() - stored_at < self.ttl or \
+                not fields <= frozenset(stored_fields):
+            return None
+        return body
+
+    def store(self, hash_, fields, body, started=None):
+        """
+        Atomically add or replace a host's entry, unless the host has been
+        invalidated since its response was requested.
+
+        :param hash_: The host's hash.
+        :param fields: The names of the attributes in `Host.FIELDS` the
+                       response was requested with.
+        :param body: The response body, as bytes.
+        :param started: When the response was requested, from `time()`, or
+                        None to store unconditionally.
+        :raises OSError: If the entry cannot be written.
+        """
+        if started is not None and self._invalidated_since(hash_, started):
+            return
+        self._make_directory()
+        entry = (self._VERSION, self._clock(), tuple(sorted(fields)),
+                 bytes(body))
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                marshal.dump(entry, f)
+            os.replace(temporary, self._path(hash_))
+        except Exception:
+            os.remove(temporary)
+            raise
+        # an invalidation marks before removing, so either it removes this
+        # entry, or this sees its mark
+        if started is not None and self._invalidated_since(hash_, started):
+            self._remove(hash_)
+
+    def invalidate(self, hash_):
+        """
+        Remove a host's entry, if present, and prevent responses requested
+        before now from being stored.
+
+        :param hash_: The host's hash.
+        :raises OSError: If the entry exists but cannot be removed, or the
+                        invalidation cannot be recorded.
+        """
+        self._mark(self._path(hash_, '.invalidated'))
+        self._remove(hash_)
+
+    def _remove(self, hash_):
+        """
+        Remove a host's entry, if present.
+
+        :param hash_: The host's hash.
+        :raises OSError: If the entry exists but cannot be removed.
+        """
+        try:
+            os.remove(self._path(hash_))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def clear(self):
+        """
+        Remove every entry, and prevent responses requested before now from
+        being stored.
+
+        :raises OSError: If an entry cannot be removed, or the invalidation
+                         cannot be recorded.
+        """
+        self._mark(os.path.join(self.directory, self._CLEARED))
+        for name in os.listdir(self.directory):
+            if name.endswith('.info'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import bisect
+import signal
+import threading
+import time
+# noinspection PyUnresolvedReferences
+from six.moves import BaseHTTPServer, socketserver
+
+from beam import fleet, instrument
+from beam.host import Host
+from beam.poller import Poller
+
+
+# the media type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_PORT = 9877
+
+# each resource attribute exported, and the suffix of its metric
+_RESOURCE_METRICS = [
+    ('used_bytes', 'used_bytes', 'Bytes of {0} used.'),
+    ('free_bytes', 'free_bytes', 'Bytes of {0} free.'),
+    ('total_bytes', 'total_bytes', 'Total bytes of {0}.'),
+    ('used_percentage', 'used_ratio', 'Proportion of {0} used.'),
+    ('free_percentage', 'free_ratio', 'Proportion of {0} free.')
+]
+
+
+def _escape(value):
+    """
+    Escape a label value for the text exposition format.
+
+    :param value: The label value.
+    :return: The escaped value.
+    """
+    return value.replace('\\', '\\\\').replace('\n', '\\n') \
+        .replace('"', '\\"')
+
+
+def _labels(names, values):
+    """
+    Format a set of labels.
+
+    :param names: The label names.
+    :param values: The corresponding label values.
+    :return: The labels in braces, or an empty string if there are none.
+    """
+    if not names:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(name, _escape(value))
+                          for name, value in zip(names, values)) + '}'
+
+
+def _format(value):
+    """
+    Format a sample value.
+
+    :param value: The number to format.
+    :return: The formatted number.
+    """
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(int(value))
+
+
+class Histogram(object):
+    """
+    A Prometheus histogram, counting observations into cumulative buckets.
+    Thread safe.
+    """
+
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30,
+                       60)
+
+    def __init__(self, name, help_, labels=(), buckets=DEFAULT_BUCKETS):
+        """
+        Initialise a new histogram.
+
+        :param name: The name of the metric.
+        :param help_: A description of the metric.
+        :param labels: The names of the labels observations are made with.
+        :param buckets: The upper bounds of the buckets, in increasing order.
+                        An infinite bucket is added automatically.
+        :raises ValueError: If the buckets are not in increasing order.
+        """
+        if list(buckets) != sorted(buckets) or \
+                len(set(buckets)) != len(buckets):
+            raise ValueError('Buckets must be in increasing order')
+        self.name = name
+        self.help = help_
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._lock = threading.Lock()
+        # label values to [bucket counts, sum]; counts are not cumulative
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        """
+        Record an observation.
+
+        :param value: The observed value, e.g. a duration in seconds.
+        :param label_values: The values of the histogram's labels.
+        :raises ValueError: If the wrong number of label values is given.
+        """
+        if len(label_values) != len(self.labels):
+            raise ValueError('Expected {0} label values'.format(
+                len(self.labels)))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = \
+                    [[0] * len(self.buckets), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        """
+        Render the histogram in the text exposition format.
+
+        :return: A list of lines.
+        """
+        with self._lock:
+            series = sorted((values, list(counts), total)
+                            for values, (counts, total) in
+                            self._series.items())
+        lines = ['# HELP {0} {1}'.format(self.name, self.help),
+                 '# TYPE {0} histogram'.format(self.name)]
+        names = self.labels + ('le',)
+        for values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append('{0}_bucket{1} {2}'.format(
+                    self.name, _labels(names, values + (_format(bound),)),
+                    cumulative))
+            labels = _labels(self.labels, values)
+            lines.append('{0}_sum{1} {2}'.format(self.name, labels,
+                                                 _format(float(total))))
+            lines.append('{0}_count{1} {2}'.format(self.name, labels,
+                                                   cumulative))
+        return lines
+
+
+class Exporter(object):
+    """
+    Exposes the state of the fleet as Prometheus metrics. Hosts are refreshed
+    by a background `Poller`, so rendering metrics never waits on SolusVM.
+    """
+
+    def __init__(self, interval=60, identities=None,
+                 workers=fleet.DEFAULT_WORKERS):
+        """
+        Initialise a new exporter. It does not poll until started.
+
+        :param interval: The number of seconds between polls of each host.
+        :param identities: The identities of the hosts to export; defaults to
+                           every host in the inventory.
+        :param workers: The maximum number of requests to make at once.
+        :raises ValueError: If any parameter is out of range.
+        """
+        self.upstream_latency = Histogram(
+            'beam_upstream_request_duration_seconds',
+            'Time taken to retrieve a host from its vendor.',
+            ['vendor'])
+        self.scrape_duration = Histogram(
+            'beam_scrape_duration_seconds',
+            'Time taken to render metrics.')
+        self.poller = Poller(interval, identities, workers=workers,
+                             fetch=self._fetch)
+
+    def _fetch(self, identity):
+        """
+        Retrieve a host, recording how long any request to its vendor took.
+        Hosts answered from a cache, or by sharing a request already in
+        progress, make no request, so are not recorded. The host last
+        exported is reused if its response has not changed.
+
+        :param identity: The identity of the host.
+        :return: The host.
+        """
+        thread = threading.current_thread()
+
+        def record(span):
+            # fetch spans are only emitted when a request is made, on the
+            # thread making it
+            if span.name == instrument.FETCH and \
+                    threading.current_thread() is thread:
+                self.upstream_latency.observe(span.duration,
+                                              span.attributes['vendor'])
+
+        instrument.add_listener(record)
+        try:
+            return Host.request_from_identity(
+                identity, previous=self.poller.snapshot.get(identity))
+        finally:
+            instrument.remove_listener(record)
+
+    def start(self):
+        """
+        Keep hosts up to date in the background. Metrics can be rendered
+        straight away; hosts are included once first retrieved.
+        """
+        self.poller.start()
+
+    def stop(self):
+        """
+        Stop refreshing hosts.
+        """
+        self.poller.stop()
+
+    def render(self):
+        """
+        Render the latest state of the fleet in the text exposition format.
+
+        :return: The metrics, as a string.
+        """
+        start = time.monotonic()
+        snapshot = self.poller.snapshot
+        # the inventory order, so output is stable between scrapes
+        identities = [identity for identity in self.poller.identities
+                      if identity in snapshot]
+        labels = ('host', 'vendor')
+        label_values = dict((identity, _labels(labels, (identity.name,
+                                                        identity.vendor.name)))
+                            for identity in identities)
+        lines = []
+
+        def gauge(name, help_, value_of):
+            samples = []
+            for identity in identities:
+                value = value_of(identity)
+                if value is not None:
+                    samples.append('{0}{1} {2}'.format(
+                        name, label_values[identity], _format(value)))
+            if samples:
+                lines.extend(['# HELP {0} {1}'.format(name, help_),
+                              '# TYPE {0} gauge'.format(name)])
+                lines.extend(samples)
+
+        gauge('beam_poll_success',
+              'Whether the last retrieval of the host succeeded.',
+              lambda identity: identity not in snapshot.errors)
+        gauge('beam_last_poll_timestamp_seconds',
+              'When the host was last retrieved, successfully or not.',
+              snapshot.updated_at)
+
+        def attribute(identity, name):
+            host = snapshot.get(identity)
+            return None if host is None else getattr(host, name)
+
+        gauge('beam_online', 'Whether the host is online.',
+              lambda identity: attribute(identity, 'is_online'))
+        for resource in ('memory', 'storage', 'bandwidth'):
+            for name, suffix, help_ in _RESOURCE_METRICS:
+                gauge('beam_{0}_{1}'.format(resource, suffix),
+                      help_.format(resource),
+                      lambda identity: getattr(
+                          attribute(identity, resource), name, None))
+        lines.extend(self.upstream_latency.render())
+        self.scrape_duration.observe(time.monotonic() - start)
+        lines.extend(self.scrape_duration.render())
+        return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves metrics at /metrics.
+    """
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.exporter.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        # scrapes are frequent and uninteresting
+        pass
+
+
+class ExporterServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    A HTTP server exposing an exporter's metrics to Prometheus.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, exporter):
+        """
+        Initialise a new server.
+
+        :param address: A `(host, port)` tuple to listen on.
+        :param exporter: The `Exporter` whose metrics to serve.
+        :raises OSError: If the server cannot listen on the address.
+        """
+        self.exporter = exporter
+        BaseHTTPServer.HTTPServer.__init__(self, address, _Handler)
+
+
+def serve(exporter, address=('', DEFAULT_PORT)):
+    """
+    Run an exporter in the foreground until interrupted or terminated.
+
+    :param exporter: The `Exporter` to serve.
+    :param address: A `(host, port)` tuple to listen on.
+    :raises OSError: If the server cannot listen on the address.
+    """
+    server = ExporterServer(address, exporter)
+
+    def terminate(*_):
+        raise KeyboardInterrupt()
+
+    previous = signal.signal(signal.SIGTERM, terminate)
+    try:
+        exporter.start()
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        exporter.stop()
+        server.server_close()
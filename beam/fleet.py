@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# the default maximum number of requests in flight across all vendors
+DEFAULT_WORKERS = 8
+
+# the default maximum number of requests in flight against a single vendor
+DEFAULT_PER_VENDOR = 4
+
+
+def as_completed(func, identities, workers=DEFAULT_WORKERS,
+                 per_vendor=DEFAULT_PER_VENDOR):
+    """
+    Call a function with each of a sequence of host identities concurrently,
+    yielding calls as they complete. Vendors are served round-robin, so a
+    vendor with many hosts cannot starve the others.
+
+    :param func: The function to call with each identity.
+    :param identities: The host identities to process.
+    :param workers: The maximum number of calls to run at once.
+    :param per_vendor: The maximum number of calls to run at once against any
+                       single vendor, or None for no limit beyond `workers`.
+    :return: A generator of `(index, identity, future)` tuples, where `index`
+             is the identity's position in `identities`, and `future` is
+             the completed call.
+    :raises ValueError: If either limit is less than 1.
+    """
+    if workers < 1:
+        raise ValueError('At least one worker is required')
+    if per_vendor is not None and per_vendor < 1:
+        raise ValueError('The per-vendor limit must be at least 1')
+
+    pending = collections.OrderedDict()
+    for index, identity in enumerate(identities):
+        pending.setdefault(identity.vendor, collections.deque()).append(
+            (index, identity))
+    in_flight = collections.Counter()
+    futures = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit():
+            progress = True
+            while progress and len(futures) < workers:
+                progress = False
+                for vendor, queue in pending.items():
+                    if len(futures) >= workers:
+                        break
+                    if not queue or (per_vendor is not None and
+                                     in_flight[vendor] >= per_vendor):
+                        continue
+                    index, identity = queue.popleft()
+                    futures[executor.submit(func, identity)] = (index,
+                                                                identity)
+                    in_flight[vendor] += 1
+                    progress = True
+
+        submit()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, identity = futures.pop(future)
+                in_flight[identity.vendor] -= 1
+                yield index, identity, future
+            submit()
+
+
+def map_identities(func, identities, workers=DEFAULT_WORKERS,
+                   per_vendor=DEFAULT_PER_VENDOR, return_exceptions=False):
+    """
+    Call a function with each of a sequence of host identities concurrently.
+
+    :param func: The function to call with each identity.
+    :param identities: The host identities to process.
+    :param workers: The maximum number of calls to run at once.
+    :param per_vendor: The maximum number of calls to run at once against any
+                       single vendor, or None for no limit beyond `workers`.
+    :param return_exceptions: If true, an exception raised by a call is
+                              placed in the results in place of its return
+                              value, rather than being raised.
+    :return: The return value of each call, in the same order as
+             `identities`.
+    :raises Exception: The first exception raised by a call, if
+                       `return_exceptions` is false.
+    """
+    identities = list(identities)
+    results = [None] * len(identities)
+    for index, _, future in as_completed(func, identities, workers,
+                                         per_vendor):
+        exception = future.exception()
+        if exception is None:
+            results[index] = future.result()
+        elif return_exceptions:
+            results[index] = exception
+        else:
+            raise exception
+    return results
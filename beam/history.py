@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division
+
+import bisect
+import collections
+import errno
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from beam.config import cache_directory
+from beam.resource import Resource
+
+
+class Reading(collections.namedtuple('Reading', ['time', 'is_online',
+                                                 'memory', 'storage',
+                                                 'bandwidth'])):
+    """
+    The state of a host at a point in time. Any of `is_online` and the
+    resources may be None if they were not retrieved.
+    """
+
+
+class _Records(object):
+    """
+    The readings in a history file, unpacked on access, so a query only pays
+    for the records it reads. Use `_Times` to bisect over reading times.
+    """
+
+    def __init__(self, buffer, count):
+        """
+        Initialise a new view of records.
+
+        :param buffer: The contents of the history file, including its
+                       header, e.g. a memory map.
+        :param count: The number of complete records in the buffer.
+        """
+        self._buffer = buffer
+        self._count = count
+
+    def __len__(self):
+        """
+        Find the number of records.
+
+        :return: The number of records.
+        """
+        return self._count
+
+    def __getitem__(self, index):
+        """
+        Unpack a record.
+
+        :param index: The index of the record; negative indices count from
+                      the end.
+        :return: The record as a tuple of `History._RECORD` fields; see
+                 `History._unpack()`.
+        :raises IndexError: If there is no such record.
+        """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return History._RECORD.unpack_from(
+            self._buffer, History._HEADER.size + index * History._RECORD.size)
+
+    def time(self, index):
+        """
+        Retrieve the time of a reading without unpacking the rest of it.
+
+        :param index: The index of the reading.
+        :return: The time of the reading.
+        """
+        return History._TIME.unpack_from(
+            self._buffer,
+            History._HEADER.size + index * History._RECORD.size)[0]
+
+
+class _Times(object):
+    """
+    A view of the times of records, which `bisect` can search without
+    unpacking whole records.
+    """
+
+    def __init__(self, records):
+        """
+        Initialise a new view of times.
+
+        :param records: The `_Records` whose times to view.
+        """
+        self._records = records
+
+    def __len__(self):
+        """
+        Find the number of records.
+
+        :return: The number of records.
+        """
+        return len(self._records)
+
+    def __getitem__(self, index):
+        """
+        Retrieve the time of a record.
+
+        :param index: The index of the record.
+        :return: The time of the reading.
+        """
+        return self._records.time(index)
+
+
+class History(object):
+    """
+    An append-only local store of host readings, with one file of fixed-size
+    records per host. Readings are appended in time order, so ranges can be
+    found by binary search without reading whole files. If a retention
+    period is set, a host's readings are compacted as they are appended.
+    """
+
+    # identifies history files, followed by the version of the record format
+    _MAGIC = b'BEAMHIST'
+    _VERSION = 1
+    _HEADER = struct.Struct('<8sI')
+
+    # time, status (0 offline, 1 online, 2 unknown), then used and free bytes
+    # of memory, storage and bandwidth, each -1 if unknown
+    _RECORD = struct.Struct('<dB6q')
+    _TIME = struct.Struct('<d')
+
+    _STATUSES = {False: 0, True: 1, None: 2}
+    _RESOURCES = ('memory', 'storage', 'bandwidth')
+
+    # a host's file is compacted on append once its oldest reading is this
+    # many retention periods old, so it is rewritten at most once every half
+    # a retention period rather than on every append
+    _COMPACT_AFTER = 1.5
+
+    def __init__(self, directory=None, retention=None):
+        """
+        Initialise a new history store.
+
+        :param directory: The directory to keep history files in; defaults to
+                          a history directory within `cache_directory()`.
+        :param retention: The number of seconds to keep readings for, or None
+                          to keep them forever. Readings older than this are
+                          removed from a host's file as readings are appended
+                          to it, and from every file by `compact()`.
+        :raises ValueError: If the retention period is not positive.
+        """
+        if retention is not None and retention <= 0:
+            raise ValueError('Retention period must be positive')
+        self.directory = directory or os.path.join(cache_directory(),
+                                                   'history')
+        self.retention = retention
+        # serialises appends, so readings from this process stay in order
+        self._lock = threading.Lock()
+
+    def _path(self, hash_):
+        """
+        Find the history file of a host.
+
+        :param hash_: The host's hash.
+        :return: The path of the file.
+        """
+        digest = hashlib.sha1(hash_.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.history')
+
+    @classmethod
+    def _pack(cls, at, host):
+        """
+        Encode a host's state as a record.
+
+        :param at: The time of the reading.
+        :param host: The host.
+        :return: The encoded record.
+        """
+        values = []
+        for name in cls._RESOURCES:
+            resource = getattr(host, name)
+            if resource is None:
+                values += [-1, -1]
+            else:
+                values += [resource.used_bytes, resource.free_bytes]
+        return cls._RECORD.pack(at, cls._STATUSES[host.is_online], *values)
+
+    @classmethod
+    def _unpack(cls, record):
+        """
+        Decode a record.
+
+        :param record: The unpacked record tuple.
+        :return: The `Reading`.
+        """
+        at, status = record[:2]
+        resources = [None if record[i] < 0 else
+                     Resource(record[i], record[i + 1])
+                     for i in range(2, 8, 2)]
+        return Reading(at, None if status == 2 else bool(status), *resources)
+
+    def append(self, host, at=None):
+        """
+        Record a host's current state, removing the host's readings older than
+        the retention period if they have built up.
+
+        :param host: The retrieved host.
+        :param at: The time of the reading as returned by `time.time()`;
+                   defaults to now.
+        :raises OSError: If the reading cannot be written.
+        """
+        path = self._path(host.hash)
+        at = time.time() if at is None else at
+        with self._lock:
+            record = self._pack(at, host)
+            flags = os.O_RDWR | os.O_APPEND
+            try:
+                descriptor = os.open(path, flags)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                self._create(path)
+                descriptor = os.open(path, flags)
+            try:
+                # a single write of a small record, so concurrent appenders
+                # cannot interleave partial records
+                os.write(descriptor, record)
+                oldest = os.pread(descriptor, self._TIME.size,
+                                  self._HEADER.size)
+            finally:
+                os.close(descriptor)
+            if self.retention is not None and \
+                    len(oldest) == self._TIME.size and \
+                    self._TIME.unpack(oldest)[0] < \
+                    at - self._COMPACT_AFTER * self.retention:
+                self._compact_file(path, at - self.retention)
+
+    def _create(self, path, records=()):
+        """
+        Atomically create a history file.
+
+        :param path: The path of the file.
+        :param records: The encoded records to write after the header.
+        """
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(self._HEADER.pack(self._MAGIC, self._VERSION))
+                f.writelines(records)
+            if records:
+                os.replace(temporary, path)
+            else:
+                # another process may have created it in the meantime
+                try:
+                    os.link(temporary, path)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+                os.remove(temporary)
+        except Exception:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def _read(self, hash_, func):
+        """
+        Map a host's history file and apply a function to its records.
+
+        :param hash_: The host's hash.
+        :param func: A function taking a `_Records` instance.
+        :return: The function's return value, or that of calling it with no
+                 records if the host has no history.
+        :raises ValueError: If the file is not a history file.
+        """
+        try:
+            f = open(self._path(hash_), 'rb')
+        except (OSError, IOError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return func(_Records(b'', 0))
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self._HEADER.size:
+                return func(_Records(b'', 0))
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if self._HEADER.unpack_from(buffer) != (self._MAGIC,
+                                                        self._VERSION):
+                    raise ValueError('Not a history file')
+                # ignore a trailing partial record being appended
+                return func(_Records(buffer, (size - self._HEADER.size) //
+                                     self._RECORD.size))
+            finally:
+                buffer.close()
+
+    @staticmethod
+    def _bounds(records, start, end):
+        """
+        Find the indices of the records within a time range.
+
+        :param records: The records to search.
+        :param start: The earliest time to include, or None for no limit.
+        :param end: The time to stop before, or None for no limit.
+        :return: A `(first, stop)` tuple of indices.
+        """
+        times = _Times(records)
+        first = 0 if start is None else bisect.bisect_left(times, start)
+        stop = len(records) if end is None else \
+            bisect.bisect_left(times, end, first)
+        return first, stop
+
+    def range(self, hash_, start=None, end=None):
+        """
+        Retrieve the readings of a host within a time range.
+
+        :param hash_: The host's hash.
+        :param start: The earliest time to include, as returned by
+                      `time.time()`, or None for no limit.
+        :param end: The time to stop before, or None for no limit.
+        :return: The list of `Reading`s, oldest first.
+        """
+        def query(records):
+            first, stop = self._bounds(records, start, end)
+            return [self._unpack(records[i]) for i in range(first, stop)]
+        return self._read(hash_, query)
+
+    def downsample(self, hash_, start, end, step):
+        """
+        Retrieve at most one reading per interval, for plotting long ranges.
+        Only the records returned are decoded, so this is fast even for long
+        histories.
+
+        :param hash_: The host's hash.
+        :param start: The start of the first interval, as returned by
+                      `time.time()`.
+        :param end: The time to stop before.
+        :param step: The length of each interval in seconds.
+        :return: The list of `Reading`s, each the latest within its interval,
+                 oldest first. Intervals without readings are omitted.
+        :raises ValueError: If the step is not positive.
+        """
+        if step <= 0:
+            raise ValueError('Step must be positive')
+
+        def query(records):
+            times = _Times(records)
+            first, stop = self._bounds(records, start, end)
+            readings = []
+            while first < stop:
+                # the end of the interval containing the next reading
+                boundary = min(start + step * (
+                    (times[first] - start) // step + 1), end)
+                # the index of the first reading in the next interval
+                next_ = bisect.bisect_left(times, boundary, first, stop)
+                if next_ > first:
+                    readings.append(self._unpack(records[next_ - 1]))
+                first = next_
+            return readings
+        return self._read(hash_, query)
+
+    def forecast(self, hash_, resource='bandwidth', start=None):
+        """
+        Estimate when a host will run out of a resource, by fitting a straight
+        line to its free bytes over time.
+
+        :param hash_: The host's hash.
+        :param resource: The name of the resource, one of 'memory', 'storage'
+                         or 'bandwidth'.
+        :param start: The earliest reading to consider, as returned by
+                      `time.time()`, e.g. the start of the billing period for
+                      bandwidth; defaults to all readings.
+        :return: The time the resource is expected to be exhausted as
+                 returned by `time.time()`, or None if it is not being
+                 consumed or there are too few readings.
+        :raises ValueError: If the resource is unknown.
+        """
+        if resource not in self._RESOURCES:
+            raise ValueError('Unknown resource: {0}'.format(resource))
+        points = [(reading.time, getattr(reading, resource).free_bytes)
+                  for reading in self.range(hash_, start)
+                  if getattr(reading, resource) is not None]
+        if len(points) < 2:
+            return None
+        mean_time = sum(point[0] for point in points) / len(points)
+        mean_free = sum(point[1] for point in points) / len(points)
+        covariance = sum((at - mean_time) * (free - mean_free)
+                         for at, free in points)
+        variance = sum((at - mean_time) ** 2 for at, _ in points)
+        if not variance or covariance >= 0:
+            return None
+        slope = covariance / variance
+        return mean_time - mean_free / slope
+
+    def compact(self, retention=None, now=None):
+        """
+        Remove readings older than the retention period from every history
+        file, including those of hosts no longer being appended to. Readings
+        appended by other processes while a file is compacted may be lost.
+
+        :param retention: The number of seconds to keep readings for;
+                          defaults to the store's retention period.
+        :param now: The current time as returned by `time.time()`; defaults
+                    to now.
+        :return: The number of readings removed.
+        :raises ValueError: If no retention period is set.
+        """
+        retention = retention or self.retention
+        if retention is None:
+            raise ValueError('No retention period set')
+        cutoff = (time.time() if now is None else now) - retention
+        try:
+            names = os.listdir(self.directory)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return 0
+
+        removed = 0
+        for name in names:
+            if name.endswith('.history'):
+                with self._lock:
+                    removed += self._compact_file(
+                        os.path.join(self.directory, name), cutoff)
+        return removed
+
+    def _compact_file(self, path, cutoff):
+        """
+        Remove readings before a time from a history file. Must be called with
+        the lock held.
+
+        :param path: The path of the file.
+        :param cutoff: The earliest time of readings to keep.
+        :return: The number of readings removed.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            if self._HEADER.unpack_from(data) != (self._MAGIC, self._VERSION):
+                return 0
+        except struct.error:
+            return 0
+        count = (len(data) - self._HEADER.size) // self._RECORD.size
+        records = _Records(data, count)
+        first = bisect.bisect_left(_Times(records), cutoff)
+        if not first:
+            return 0
+        offset = self._HEADER.size + first * self._RECORD.size
+        end = self._HEADER.size + count * self._RECORD.size
+        if first == count:
+            os.remove(path)
+        else:
+            self._create(path, [data[offset:end]])
+        return first
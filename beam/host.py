@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, division
 
+import hashlib
+import re
+
 import six
-import requests
-from xml.etree import cElementTree
-from xml.etree.cElementTree import ParseError
+from xml.etree.ElementTree import XMLPullParser, ParseError
 
+from beam import instrument
 from beam.resource import Resource
+from beam.singleflight import SingleFlight
 
 
 @six.python_2_unicode_compatible
@@ -15,6 +18,8 @@ class HostIdentity(object):
     Represents identification information for a host.
     """
 
+    __slots__ = ('name', 'key', 'hash', 'vendor', 'tags')
+
     @property
     def request_params(self):
         """
@@ -25,7 +30,7 @@ class HostIdentity(object):
         """
         return {'key': self.key, 'hash': self.hash}
 
-    def __init__(self, name, key, hash_, vendor):
+    def __init__(self, name, key, hash_, vendor, tags=frozenset()):
         """
         Initialise a new host identity object.
 
@@ -33,11 +38,13 @@ class HostIdentity(object):
         :param key: The node's key.
         :param hash_: The node's hash.
         :param vendor: The vendor providing this host.
+        :param tags: The labels the host can be selected by, e.g. 'web'.
         """
         self.name = name
         self.key = key
         self.hash = hash_
         self.vendor = vendor
+        self.tags = frozenset(tags)
 
     def __hash__(self):
         """
@@ -76,25 +83,81 @@ class Host(HostIdentity):
     Represents a host with all its metadata.
     """
 
+    # the identity's attributes are held in `HostIdentity`'s slots
+    __slots__ = ('fqdn', 'primary_ip', 'is_online', 'memory', 'storage',
+                 'bandwidth', 'ip_addresses', 'fields', 'fingerprint')
+
     # the relative path to the metadata service
     _ENDPOINT = '/api/client/command.php'
 
     # actions that can be carried out against a host
     VALID_ACTIONS = ['boot', 'reboot', 'shutdown']
 
+    # the `HostCache` consulted by `request_from_identity()`, if any
+    cache = None
+
+    # the `History` each retrieved host is appended to, if any
+    history = None
+
+    # the `DiskCache` info responses are shared between processes through,
+    # if any
+    disk_cache = None
+
+    # coalesces concurrent info requests for the same host and fields
+    _flights = SingleFlight()
+
+    # attributes that are only populated if requested, and the info request
+    # flag that causes SolusVM to return each
+    FIELDS = {
+        'ip_addresses': 'ipaddr',
+        'storage': 'hdd',
+        'memory': 'mem',
+        'bandwidth': 'bw',
+        'is_online': 'status'
+    }
+
+    # interned values of `fields`, keyed by themselves
+    _FIELD_SETS = {}
+
+    # attributes compared by `diff()` in addition to any fields retrieved
+    _DIFFED_ATTRIBUTES = ('fqdn', 'primary_ip')
+
+    # attributes derived from a field, rather than being fields themselves
+    _DERIVED_FIELDS = {
+        'is_offline': 'is_online'
+    }
+
+    # the elements of an info response that are read
+    _RESPONSE_FIELDS = frozenset(['status', 'statusmsg', 'hostname',
+                                  'ipaddress', 'vmstat', 'mem', 'hdd', 'bw',
+                                  'ipaddr'])
+
+    # SolusVM responses are a flat sequence of elements containing only text,
+    # so can be tokenized without an XML parser; anything else, e.g. entities
+    # or nesting, is left to the parser
+    _ELEMENT_NAME = re.compile(r'[A-Za-z_][\w.-]*\Z')
+    _TOKENS = {
+        six.text_type: ('<', '>', '</', '&', ' \t\r\n'),
+        six.binary_type: (b'<', b'>', b'</', b'&', b' \t\r\n')
+    }
+
     @property
     def is_offline(self):
         """
         Find whether this host is offline.
 
-        :return: True if it is offline, false if it is online.
+        :return: True if it is offline, false if it is online, or None if
+                 the host's status was not requested.
         """
+        if self.is_online is None:
+            return None
         return not self.is_online
 
     def __init__(self, identity, fqdn, primary_ip, is_online, memory, storage,
                  bandwidth, ip_addresses):
         """
-        Initialise a new host object.
+        Initialise a new host object. Any of the attributes in `FIELDS` may be
+        None if they were not requested.
 
         :param identity: This host's identity.
         :param fqdn: The node's fully-qualified domain name (sans trailing .).
@@ -106,7 +169,7 @@ class Host(HostIdentity):
         :param ip_addresses: All IP addresses assigned to the node.
         """
         super(Host, self).__init__(identity.name, identity.key, identity.hash,
-                                   identity.vendor)
+                                   identity.vendor, identity.tags)
         self.fqdn = fqdn
         self.primary_ip = primary_ip
         self.is_online = is_online
@@ -114,84 +177,461 @@ class Host(HostIdentity):
         self.storage = storage
         self.bandwidth = bandwidth
         self.ip_addresses = ip_addresses
+        fields = frozenset(field for field in self.FIELDS
+                           if getattr(self, field) is not None)
+        # only a handful of distinct sets occur, so share them between hosts
+        self.fields = self._FIELD_SETS.setdefault(fields, fields)
+        """ The names of the attributes in `FIELDS` that are populated. """
+        self.fingerprint = None
+        """ Identifies the response this host was parsed from, if known. """
+
+    @classmethod
+    def fields_for(cls, attributes):
+        """
+        Find the fields that must be requested to retrieve a set of attributes.
+
+        :param attributes: The (possibly nested, dotted) attribute names, e.g.
+                           'memory.free_bytes'.
+        :return: The set of field names to request.
+        """
+        fields = set()
+        for attribute in attributes:
+            name = attribute.split('.', 1)[0]
+            name = cls._DERIVED_FIELDS.get(name, name)
+            if name in cls.FIELDS:
+                fields.add(name)
+        return frozenset(fields)
+
+    def diff(self, previous):
+        """
+        Find the attributes that changed since an earlier retrieval of this
+        host. Fields retrieved only one of the times are not compared.
 
-    def action(self, action):
+        :param previous: The host as retrieved earlier.
+        :return: A dictionary mapping the name of each attribute that changed,
+                 e.g. 'memory' or 'is_online', to a `(before, after)` tuple.
+        """
+        if previous is self:
+            return {}
+        changes = {}
+        for name in self._DIFFED_ATTRIBUTES + tuple(self.fields &
+                                                    previous.fields):
+            before = getattr(previous, name)
+            after = getattr(self, name)
+            if before != after:
+                changes[name] = (before, after)
+        return changes
+
+    def action(self, action, wait=False, timeout=300):
         """
         Execute an action against this host by name. If always executing the
         same action, use `.boot()`, `.reboot()` or `.shutdown()` instead.
 
         :param action: The name of the action, e.g. 'reboot'.
+        :param wait: Whether to block until the host reaches the state the
+                     action leaves it in: offline for shutdown, online for
+                     boot, and for reboot, offline and then online again.
+        :param timeout: The maximum number of seconds to wait.
+        :raises ValueError: If an invalid action is passed.
+        :raises RuntimeError: If the SolusVM API indicates failure, or the host
+                              does not reach the state in time.
+        """
+        self.action_on_identity(self, action)
+        if wait:
+            self._wait_after(action, timeout)
+
+    def wait_until(self, state, timeout=300):
+        """
+        Block until this host is online or offline, polling only its status,
+        less often the longer it takes.
+
+        :param state: `beam.wait.ONLINE` or `beam.wait.OFFLINE`, or a sequence
+                      of them the host must be seen in one after the other.
+        :param timeout: The maximum number of seconds to wait.
+        :return: The host as retrieved in the final state, with only
+                 `is_online` populated.
+        :raises ValueError: If any state is invalid.
+        :raises RuntimeError: If the host does not reach the state in time.
+        """
+        # imported here, as the waiter polls through this class
+        from beam.wait import wait_until
+        return wait_until([self], state, timeout)[0]
+
+    def _wait_after(self, action, timeout):
+        """
+        Block until this host reaches the state an action leaves it in.
+
+        :param action: The name of the action executed.
+        :param timeout: The maximum number of seconds to wait.
+        :raises RuntimeError: If the host does not reach the state in time.
+        """
+        from beam.wait import EXPECTED_STATES
+        self.wait_until(EXPECTED_STATES[action], timeout)
+
+    @classmethod
+    def action_on_identity(cls, identity, action):
+        """
+        Execute an action against a host by name, without first retrieving
+        information about it.
+
+        :param identity: The host's identification details.
+        :param action: The name of the action, e.g. 'reboot'.
+        :raises ValueError: If an invalid action is passed.
+        :raises RuntimeError: If the SolusVM API indicates failure.
+        """
+        data = cls._action_params(identity, action)
+        with instrument.span(instrument.ACTION, host=identity.name,
+                             vendor=identity.vendor.name,
+                             action=action) as span:
+            try:
+                response = identity.vendor.post(cls._ENDPOINT, data)
+            finally:
+                cls._invalidate(identity)
+            span.attributes['status'] = response.status_code
+            cls._check_action_response(action, response)
+
+    async def aaction(self, action, transport=None):
+        """
+        Asynchronously execute an action against this host by name.
+
+        :param action: The name of the action, e.g. 'reboot'.
+        :param transport: The transport to send the request with; defaults to
+                          the vendor's default transport.
         :raises ValueError: If an invalid action is passed.
         :raises RuntimeError: If the SolusVM API indicates failure.
         """
+        data = self._action_params(self, action)
+        transport = transport or self.vendor.transport()
+        with instrument.span(instrument.ACTION, host=self.name,
+                             vendor=self.vendor.name, action=action) as span:
+            try:
+                response = await self.vendor.request(transport, 'POST',
+                                                     self._ENDPOINT, data)
+            finally:
+                self._invalidate(self)
+            span.attributes['status'] = response.status_code
+            self._check_action_response(action, response)
 
-        if action not in self.VALID_ACTIONS:
+    @classmethod
+    def _action_params(cls, identity, action):
+        """
+        Build the request parameters for an action against a host.
+
+        :param identity: The host's identification details.
+        :param action: The name of the action, e.g. 'reboot'.
+        :return: The request parameters dictionary.
+        :raises ValueError: If an invalid action is passed.
+        """
+        if action not in cls.VALID_ACTIONS:
             raise ValueError('Invalid action: {0}'.format(action))
 
-        data = self.request_params
+        data = identity.request_params
         data.update({
             'action': action,
             'status': 'true'
         })
+        return data
+
+    @classmethod
+    def _invalidate(cls, identity):
+        """
+        Remove a host from the caches, if any, as an action may have changed
+        its state.
+
+        :param identity: The host's identification details.
+        """
+        if cls.cache is not None:
+            cls.cache.invalidate(identity.hash)
+        if cls.disk_cache is not None:
+            try:
+                cls.disk_cache.invalidate(identity.hash)
+            except OSError:
+                # the entry will expire anyway
+                pass
+
+    @staticmethod
+    def _check_action_response(action, response):
+        """
+        Ensure an action request succeeded.
 
-        response = requests.post(
-            self.vendor.endpoint + self._ENDPOINT, data=data)
-        if response.status_code != requests.codes.ok or \
+        :param action: The name of the action executed.
+        :param response: The response to the action request.
+        :raises RuntimeError: If the response indicates failure.
+        """
+        if response.status_code != 200 or \
                 '<status>success</status>' not in response.text:
             raise RuntimeError(
                 'Unable to {0} host: {1}'.format(action, response.text))
 
-    def boot(self):
+    def boot(self, wait=False, timeout=300):
         """
         Start this host.
+
+        :param wait: Whether to block until the host is online.
+        :param timeout: The maximum number of seconds to wait.
         """
         self.action('boot')
+        if wait:
+            self._wait_after('boot', timeout)
 
-    def reboot(self):
+    def reboot(self, wait=False, timeout=300):
         """
         Restart this host.
+
+        :param wait: Whether to block until the host is online.
+        :param timeout: The maximum number of seconds to wait.
         """
         self.action('reboot')
+        if wait:
+            self._wait_after('reboot', timeout)
 
-    def shutdown(self):
+    def shutdown(self, wait=False, timeout=300):
         """
         Turn off this host.
+
+        :param wait: Whether to block until the host is offline.
+        :param timeout: The maximum number of seconds to wait.
         """
         self.action('shutdown')
+        if wait:
+            self._wait_after('shutdown', timeout)
+
+    async def aboot(self, transport=None):
+        """
+        Asynchronously start this host.
+
+        :param transport: The transport to send the request with.
+        """
+        await self.aaction('boot', transport)
+
+    async def areboot(self, transport=None):
+        """
+        Asynchronously restart this host.
+
+        :param transport: The transport to send the request with.
+        """
+        await self.aaction('reboot', transport)
+
+    async def ashutdown(self, transport=None):
+        """
+        Asynchronously turn off this host.
+
+        :param transport: The transport to send the request with.
+        """
+        await self.aaction('shutdown', transport)
+
+    @classmethod
+    def request_from_identity(cls, identity, fields=None, cached=True,
+                              previous=None):
+        """
+        Retrieve information about a host, from the in-memory or disk cache
+        if either is configured. Concurrent calls for the same host and fields
+        share a single request.
+
+        :param identity: The host's identification details.
+        :param fields: The names of the attributes in `FIELDS` to retrieve, or
+                       None to retrieve all of them. Requesting fewer makes the
+                       request faster.
+        :param cached: Whether a host from a cache may be returned. If false,
+                       a request is always made, e.g. to watch for a change.
+        :param previous: The host as last retrieved, if any; it is returned
+                         again if the response has not changed, avoiding
+                         parsing it.
+        :return: The retrieved host object.
+        :raises ValueError: If an unknown field is requested.
+        :raises RuntimeError: If the API request fails.
+        """
+        fields = cls._validate_fields(fields)
+
+        def fetch():
+            started = cls._disk_cache_time()
+            with instrument.span(instrument.FETCH, host=identity.name,
+                                 vendor=identity.vendor.name) as span:
+                response = identity.vendor.get(
+                    cls._ENDPOINT, cls._info_params(identity, fields))
+                span.attributes['status'] = response.status_code
+            return cls._from_info_response(response, identity, fields,
+                                           previous, started)
+
+        def load():
+            host = cls._from_disk_cache(identity, fields) if cached else None
+            if host is None:
+                host = cls._flights.do((identity.hash, fields), fetch)
+            return host
+
+        if cls.cache is None or not cached:
+            return load()
+        return cls.cache.get(identity.hash, load,
+                             lambda host: fields <= host.fields)
 
     @classmethod
-    def request_from_identity(cls, identity):
+    async def arequest_from_identity(cls, identity, transport=None,
+                                     fields=None, previous=None):
         """
-        Retrieve information about a host.
+        Asynchronously retrieve information about a host, from the in-memory
+        or disk cache if either is configured. Concurrent calls for the same
+        host and fields share a single request.
 
         :param identity: The host's identification details.
+        :param transport: The transport to send the request with; defaults to
+                          the vendor's default transport.
+        :param fields: The names of the attributes in `FIELDS` to retrieve, or
+                       None to retrieve all of them.
+        :param previous: The host as last retrieved, if any; it is returned
+                         again if the response has not changed.
         :return: The retrieved host object.
+        :raises ValueError: If an unknown field is requested.
         :raises RuntimeError: If the API request fails.
         """
+        fields = cls._validate_fields(fields)
+        transport = transport or identity.vendor.transport()
+
+        async def fetch():
+            started = cls._disk_cache_time()
+            with instrument.span(instrument.FETCH, host=identity.name,
+                                 vendor=identity.vendor.name) as span:
+                response = await identity.vendor.request(
+                    transport, 'GET', cls._ENDPOINT,
+                    cls._info_params(identity, fields))
+                span.attributes['status'] = response.status_code
+            return cls._from_info_response(response, identity, fields,
+                                           previous, started)
+
+        async def load():
+            host = cls._from_disk_cache(identity, fields)
+            if host is None:
+                host = await cls._flights.ado((identity.hash, fields), fetch)
+            return host
+
+        if cls.cache is None:
+            return await load()
+        return await cls.cache.aget(identity.hash, load,
+                                    lambda host: fields <= host.fields)
+
+    @classmethod
+    def _validate_fields(cls, fields):
+        """
+        Normalise a set of requested fields.
+
+        :param fields: The names of the attributes in `FIELDS` to retrieve, or
+                       None for all of them.
+        :return: The fields as a frozenset.
+        :raises ValueError: If an unknown field is requested.
+        """
+        if fields is None:
+            return frozenset(cls.FIELDS)
+        fields = frozenset(fields)
+        unknown = fields.difference(cls.FIELDS)
+        if unknown:
+            raise ValueError('Unknown fields: {0}'.format(
+                ', '.join(sorted(unknown))))
+        return fields
+
+    @classmethod
+    def _info_params(cls, identity, fields):
+        """
+        Build the request parameters for retrieving information about a host.
+
+        :param identity: The host's identification details.
+        :param fields: The names of the attributes in `FIELDS` to retrieve.
+        :return: The request parameters dictionary.
+        """
         params = identity.request_params
-        params.update({
-            'action': 'info',
-            'ipaddr': 'true',
-            'hdd': 'true',
-            'mem': 'true',
-            'bw': 'true',
-            'status': 'true'
-        })
+        params['action'] = 'info'
+        for field in fields:
+            params[cls.FIELDS[field]] = 'true'
+        return params
+
+    @classmethod
+    def _disk_cache_time(cls):
+        """
+        Record when a request whose response may be stored in the disk cache
+        started, so it is not stored if the host is invalidated meanwhile.
+
+        :return: The time by the disk cache's clock, or None if there is no
+                 disk cache.
+        """
+        return None if cls.disk_cache is None else cls.disk_cache.time()
+
+    @classmethod
+    def _from_disk_cache(cls, identity, fields):
+        """
+        Create a host object from a fresh info response in the disk cache.
+
+        :param identity: The host's identification details.
+        :param fields: The names of the attributes in `FIELDS` requested.
+        :return: The host, or None if there is no disk cache, or it does not
+                 hold a usable response.
+        """
+        if cls.disk_cache is None:
+            return None
+        body = cls.disk_cache.load(identity.hash, fields)
+        if body is None:
+            return None
+        try:
+            return cls.from_response(body, identity, fields)
+        except (ValueError, RuntimeError):
+            return None
+
+    @classmethod
+    def _from_info_response(cls, response, identity, fields, previous=None,
+                            started=None):
+        """
+        Create a host object from the response to an info request, recording
+        it in the history store and disk cache if they are configured.
 
-        response = requests.get(
-            identity.vendor.endpoint + cls._ENDPOINT, params=params)
-        if response.status_code != requests.codes.ok:
+        :param response: The response to the info request.
+        :param identity: The host's identification details.
+        :param fields: The names of the attributes in `FIELDS` requested.
+        :param previous: The host as last retrieved, if any.
+        :param started: When the request started, from `_disk_cache_time()`;
+                        the response is not cached if the host was
+                        invalidated since.
+        :return: The retrieved host object.
+        :raises RuntimeError: If the API request failed.
+        """
+        if response.status_code != 200:
             raise RuntimeError(
                 'Unable to retrieve host: {0}'.format(response.text))
-        return cls.from_response(response.text, identity)
+        # already imported by the vendor that made the request
+        from beam.transport import content_charset
+
+        body = response.content
+        charset = content_charset(getattr(response, 'headers', None))
+        if charset != 'utf-8':
+            # responses are parsed and cached as UTF-8
+            body = body.decode(charset, 'replace').encode('utf-8')
+        with instrument.span(instrument.PARSE, host=identity.name,
+                             vendor=identity.vendor.name):
+            host = cls.from_response(body, identity, fields, previous)
+        if cls.history is not None:
+            try:
+                cls.history.append(host)
+            except (OSError, IOError):
+                # failing to record a reading should not fail the request
+                pass
+        if cls.disk_cache is not None:
+            try:
+                cls.disk_cache.store(identity.hash, fields, body, started)
+            except (OSError, IOError):
+                # the cache is an optimisation; failing to write it is harmless
+                pass
+        return host
 
     @classmethod
-    def from_response(cls, body, identity):
+    def from_response(cls, body, identity, fields=None, previous=None):
         """
         Create a host object from an API response.
 
-        :param body: The raw API response text.
+        :param body: The raw API response, as text, bytes, or an iterable of
+                     byte chunks as they are received.
         :param identity: This host's identity.
+        :param fields: The names of the attributes in `FIELDS` the response
+                       was requested with, or None if it contains all of them.
+                       Only these are parsed; the rest are None.
+        :param previous: The host as last retrieved, if any. If the response
+                         is identical to the one it was parsed from, it is
+                         returned without parsing the response again.
         :return: An object representing the host.
         :raises ValueError: If the response is empty or malformed.
         :raises RuntimeError: If the response indicates the API request failed.
@@ -199,28 +639,178 @@ class Host(HostIdentity):
         if not body:
             raise ValueError('Cannot construct host from empty response')
 
-        try:
-            root = cElementTree.fromstring('<root>' + body + '</root>')
+        fields = cls._validate_fields(fields)
+        fingerprint = cls._fingerprint(body, fields)
+        if fingerprint is not None and previous is not None and \
+                previous.fingerprint == fingerprint and \
+                cls._same_identity(previous, identity):
+            return previous
 
-            if root.find('status').text != 'success':
-                message = root.find('statusmsg')
+        values = cls._parse_fields(body)
+        try:
+            if values['status'] != 'success':
                 raise RuntimeError(
                     'Response indicates failed API call: {0}'.format(
-                        message.text if message else 'unspecified error'))
-
-            return Host(identity,
-                        root.find('hostname').text,
-                        root.find('ipaddress').text,
-                        root.find('vmstat').text == 'online',
-                        Resource.from_response(root.find('mem').text),
-                        Resource.from_response(root.find('hdd').text),
-                        Resource.from_response(root.find('bw').text),
-                        root.find('ipaddr').text.split(','))
-        except ParseError as e:
-            raise ValueError('Host response is malformed: {0}'.format(e))
-        except AttributeError as e:
+                        values.get('statusmsg') or 'unspecified error'))
+
+            host = Host(identity,
+                        values['hostname'],
+                        values['ipaddress'],
+                        values['vmstat'] == 'online'
+                        if 'is_online' in fields else None,
+                        Resource.from_response(values['mem'])
+                        if 'memory' in fields else None,
+                        Resource.from_response(values['hdd'])
+                        if 'storage' in fields else None,
+                        Resource.from_response(values['bw'])
+                        if 'bandwidth' in fields else None,
+                        values['ipaddr'].split(',')
+                        if 'ip_addresses' in fields else None)
+        except (KeyError, AttributeError) as e:
             raise ValueError(
                 'Host response is missing an attribute: {0}'.format(e))
+        host.fingerprint = fingerprint
+        return host
+
+    @staticmethod
+    def _fingerprint(body, fields):
+        """
+        Summarise a response, so an unchanged response can be recognised
+        without parsing it.
+
+        :param body: The raw API response, as text, bytes, or an iterable of
+                     byte chunks.
+        :param fields: The fields the response was requested with, as a
+                       frozenset.
+        :return: A `(fields, digest)` tuple, or None if the response is an
+                 iterable of chunks, which can only be read once.
+        """
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        elif not isinstance(body, six.binary_type):
+            return None
+        return fields, hashlib.blake2b(body, digest_size=16).digest()
+
+    @staticmethod
+    def _same_identity(host, identity):
+        """
+        Find whether a host was retrieved with an identity, rather than an
+        older definition of it, e.g. before the inventory was edited.
+
+        :param host: The host.
+        :param identity: The identity.
+        :return: True if every identifying attribute matches, false otherwise.
+        """
+        return all(getattr(host, name) == getattr(identity, name)
+                   for name in HostIdentity.__slots__)
+
+    @classmethod
+    def _parse_fields(cls, body):
+        """
+        Extract the text of the elements beam uses from an API response in a
+        single pass, without building a tree of the whole response.
+
+        :param body: The raw API response, as text, bytes, or an iterable of
+                     byte chunks.
+        :return: A dictionary of element names to their text. Only the first
+                 occurrence of each top-level element is included.
+        :raises ValueError: If the response is malformed.
+        """
+        if isinstance(body, (six.text_type, six.binary_type)):
+            fields = cls._tokenize_fields(body)
+            if fields is not None:
+                return fields
+            body = (body,)
+
+        # the response is a sequence of elements with no common root
+        parser = XMLPullParser(events=('start', 'end'))
+        fields = {}
+        depth = 0
+        try:
+            parser.feed('<root>')
+            for chunk in body:
+                parser.feed(chunk)
+                depth = cls._read_fields(parser, fields, depth)
+            parser.feed('</root>')
+            parser.close()
+        except ParseError as e:
+            raise ValueError('Host response is malformed: {0}'.format(e))
+        cls._read_fields(parser, fields, depth)
+        return fields
+
+    @classmethod
+    def _tokenize_fields(cls, body):
+        """
+        Extract the text of the elements beam uses from a response consisting
+        only of flat, text-only elements.
+
+        :param body: The raw API response, as text or bytes.
+        :return: A dictionary of element names to their text as returned by
+                 `_parse_fields()`, or None if the response is not flat.
+        """
+        binary = isinstance(body, six.binary_type)
+        open_, close, end_open, entity, whitespace = cls._TOKENS[type(body)]
+        fields = {}
+        position = 0
+        while True:
+            start = body.find(open_, position)
+            if start == -1:
+                if body[position:].strip(whitespace):
+                    return None
+                return fields
+            if body[position:start].strip(whitespace):
+                return None
+            name_end = body.find(close, start)
+            if name_end == -1:
+                return None
+            tag = body[start + 1:name_end]
+            if binary:
+                try:
+                    tag = tag.decode('ascii')
+                except UnicodeDecodeError:
+                    return None
+            if not cls._ELEMENT_NAME.match(tag):
+                return None
+            text_end = body.find(open_, name_end)
+            end_tag = end_open + body[start + 1:name_end] + close
+            if text_end == -1 or not body.startswith(end_tag, text_end):
+                return None
+            text = body[name_end + 1:text_end]
+            if entity in text:
+                return None
+            if tag in cls._RESPONSE_FIELDS and tag not in fields:
+                if binary:
+                    try:
+                        text = text.decode('utf-8')
+                    except UnicodeDecodeError:
+                        return None
+                # match ElementTree, which represents no text as None
+                fields[tag] = text or None
+            position = text_end + len(end_tag)
+
+    @classmethod
+    def _read_fields(cls, parser, fields, depth):
+        """
+        Consume pending parser events, recording the text of wanted top-level
+        elements.
+
+        :param parser: The parser to read events from.
+        :param fields: The dictionary to record element text in.
+        :param depth: The element depth before these events.
+        :return: The element depth after these events.
+        """
+        for event, element in parser.read_events():
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                if element.tag in cls._RESPONSE_FIELDS and \
+                        element.tag not in fields:
+                    fields[element.tag] = element.text
+                # free each top-level element once read
+                element.clear()
+        return depth
 
     def __str__(self):
         """
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division
+
+import collections
+import contextlib
+import math
+import threading
+import time
+
+
+# the operations spans are recorded for
+FETCH = 'fetch'
+REQUEST = 'request'
+PARSE = 'parse'
+ACTION = 'action'
+
+
+class Span(object):
+    """
+    A timed operation within beam, e.g. retrieving a host. Listeners receive
+    each span once it has finished.
+    """
+
+    def __init__(self, name, attributes):
+        """
+        Initialise a new span.
+
+        :param name: The operation, one of `FETCH`, `REQUEST`, `PARSE` or
+                     `ACTION`.
+        :param attributes: A dictionary describing the operation, e.g. with
+                           'host', 'vendor' and 'status' keys.
+        """
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        """ When the operation started, as returned by `time.time()`. """
+        self.duration = None
+        """ The number of seconds the operation took, once finished. """
+        self.error = None
+        """ The exception the operation raised, if any. """
+
+    @property
+    def failed(self):
+        """
+        Find whether the operation failed.
+
+        :return: True if it raised an exception or received an error status.
+        """
+        return self.error is not None or \
+            self.attributes.get('status', 0) >= 400
+
+    def __repr__(self):
+        return 'Span({0}, {1}, {2})'.format(self.name, self.attributes,
+                                            self.duration)
+
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+def add_listener(callback):
+    """
+    Register a function to be called with every `Span` once it finishes.
+    Listeners are called on the thread that performed the operation, so should
+    be quick. Exceptions raised by listeners are ignored.
+
+    :param callback: The function to call.
+    :return: The callback, so this can be used as a decorator.
+    """
+    global _listeners
+    with _listeners_lock:
+        _listeners = _listeners + [callback]
+    return callback
+
+
+def remove_listener(callback):
+    """
+    Stop calling a function registered with `add_listener()`.
+
+    :param callback: The function to stop calling.
+    :raises ValueError: If the function is not registered.
+    """
+    global _listeners
+    with _listeners_lock:
+        listeners = list(_listeners)
+        listeners.remove(callback)
+        _listeners = listeners
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Time the operation in the body of a with statement, then pass the span to
+    listeners. Attributes can be added to the span within the body, e.g. the
+    response status once known.
+
+    :param name: The operation, one of `FETCH`, `REQUEST`, `PARSE` or
+                 `ACTION`.
+    :param attributes: Attributes describing the operation.
+    :return: A context manager yielding the `Span`.
+    """
+    current = Span(name, attributes)
+    start = time.monotonic()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = e
+        raise
+    finally:
+        current.duration = time.monotonic() - start
+        for listener in _listeners:
+            try:
+                listener(current)
+            except Exception:
+                pass
+
+
+class Summary(collections.namedtuple('Summary', ['count', 'errors', 'mean',
+                                                 'p50', 'p90', 'p99',
+                                                 'max'])):
+    """
+    Statistics about the duration of an operation, in seconds. Percentiles are
+    estimated to within about 10%.
+    """
+
+
+class _Distribution(object):
+    """
+    Counts durations in logarithmic buckets, so percentiles can be estimated
+    to within about 10% in constant memory, however many are added. Not
+    thread-safe; `Collector` serialises access.
+    """
+
+    # each bucket's upper bound is this factor larger than the last
+    _GROWTH = 2 ** 0.25
+
+    # the upper bound of the first bucket, in seconds
+    _SMALLEST = 1e-5
+
+    def __init__(self):
+        """
+        Initialise a new, empty distribution.
+        """
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = collections.Counter()
+
+    def add(self, duration, failed):
+        """
+        Record a duration.
+
+        :param duration: The duration in seconds.
+        :param failed: Whether the timed operation failed.
+        """
+        self.count += 1
+        self.errors += failed
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.buckets[self._index(duration)] += 1
+
+    @classmethod
+    def _index(cls, duration):
+        """
+        Find the bucket a duration is counted in.
+
+        :param duration: The duration in seconds.
+        :return: The index of the bucket; 0 for durations of at most
+                 `_SMALLEST`.
+        """
+        if duration <= cls._SMALLEST:
+            return 0
+        return int(math.ceil(math.log(duration / cls._SMALLEST,
+                                      cls._GROWTH)))
+
+    def percentile(self, q):
+        """
+        Estimate a percentile of the durations.
+
+        :param q: The percentile, between 0 and 100.
+        :return: The estimated duration.
+        """
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # the bucket's midpoint, bounded by the actual maximum
+                return min(self.max, self._SMALLEST * self._GROWTH ** (
+                    index - 0.5) if index else self._SMALLEST)
+        return self.max
+
+    def summary(self):
+        """
+        Summarise the durations recorded. Must not be called while empty.
+
+        :return: A `Summary`.
+        """
+        return Summary(self.count, self.errors, self.total / self.count,
+                       self.percentile(50), self.percentile(90),
+                       self.percentile(99), self.max)
+
+
+class Collector(object):
+    """
+    Aggregates the durations of spans in memory, by operation and vendor.
+    """
+
+    def __init__(self):
+        """
+        Initialise a new collector, with no spans recorded.
+        """
+        self._lock = threading.Lock()
+        # maps (operation, vendor name) tuples to `_Distribution`s
+        self._distributions = {}
+
+    def __call__(self, span_):
+        """
+        Record a finished span.
+
+        :param span_: The `Span`.
+        """
+        key = (span_.name, span_.attributes.get('vendor'))
+        failed = span_.failed
+        with self._lock:
+            distribution = self._distributions.get(key)
+            if distribution is None:
+                distribution = self._distributions[key] = _Distribution()
+            distribution.add(span_.duration, failed)
+
+    def summary(self):
+        """
+        Summarise the spans recorded so far.
+
+        :return: A dictionary mapping `(operation, vendor name)` tuples to
+                 `Summary` instances.
+        """
+        with self._lock:
+            return dict((key, distribution.summary())
+                        for key, distribution in
+                        self._distributions.items())
+
+    def reset(self):
+        """
+        Forget every span recorded.
+        """
+        with self._lock:
+            self._distributions = {}
+
+
+collector = add_listener(Collector())
+""" The default `Collector`, summarised by `beam.stats()`. """
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import concurrent.futures
+import heapq
+import random
+import threading
+import time
+import types
+
+import beam
+from beam import fleet
+from beam.host import Host
+
+
+class Snapshot(object):
+    """
+    An immutable view of the fleet as last polled. Reading a snapshot never
+    makes a request.
+    """
+
+    def __init__(self, hosts, errors, updated):
+        """
+        Initialise a new snapshot.
+
+        :param hosts: A dictionary mapping each identity to the host last
+                      retrieved successfully for it.
+        :param errors: A dictionary mapping each identity whose last poll
+                       failed to the exception raised.
+        :param updated: A dictionary mapping each identity to the time of its
+                        last poll, as returned by `time.time()`.
+        """
+        self._hosts = hosts
+        self._errors = errors
+        self._updated = updated
+
+    @property
+    def hosts(self):
+        """
+        Retrieve the hosts in this snapshot.
+
+        :return: A read-only mapping of identity to host. Hosts whose last
+                 poll failed map to the last host retrieved successfully.
+        """
+        return types.MappingProxyType(self._hosts)
+
+    @property
+    def errors(self):
+        """
+        Retrieve the hosts whose last poll failed.
+
+        :return: A read-only mapping of identity to the exception raised.
+        """
+        return types.MappingProxyType(self._errors)
+
+    def __len__(self):
+        """
+        Find the number of hosts that have been polled.
+
+        :return: The number of hosts polled at least once.
+        """
+        return len(self._updated)
+
+    def __contains__(self, identity):
+        return identity in self._updated
+
+    def get(self, identity):
+        """
+        Retrieve the last host retrieved successfully for an identity.
+
+        :param identity: The identity of the host.
+        :return: The host, or None if it has never been retrieved.
+        """
+        return self._hosts.get(identity)
+
+    def updated_at(self, identity):
+        """
+        Find when a host was last polled, successfully or not.
+
+        :param identity: The identity of the host.
+        :return: The time of the last poll as returned by `time.time()`, or
+                 None if the host has not been polled.
+        """
+        return self._updated.get(identity)
+
+    def state(self, identity):
+        """
+        Find the state of a host as of its last poll.
+
+        :param identity: The identity of the host.
+        :return: One of `Poller.ONLINE`, `Poller.OFFLINE` or
+                 `Poller.UNREACHABLE`, or None if the host has not been polled
+                 or its status was not retrieved.
+        """
+        if identity in self._errors:
+            return Poller.UNREACHABLE
+        host = self._hosts.get(identity)
+        if host is None or host.is_online is None:
+            return None
+        return Poller.ONLINE if host.is_online else Poller.OFFLINE
+
+
+class Poller(object):
+    """
+    Refreshes a set of hosts in the background on a fixed interval, keeping
+    the results in a `Snapshot` that can be read at any time without making a
+    request. Requests are spread evenly across the interval, with a random
+    delay added to each, so they do not arrive at vendors in bursts.
+    """
+
+    # the states a host can be in, as reported to subscribers
+    ONLINE = 'online'
+    OFFLINE = 'offline'
+    UNREACHABLE = 'unreachable'
+
+    def __init__(self, interval=60, identities=None, fields=None, jitter=0.1,
+                 workers=fleet.DEFAULT_WORKERS, publish_interval=1,
+                 fetch=None):
+        """
+        Initialise a new poller. It does not poll until started.
+
+        :param interval: The number of seconds between polls of each host.
+        :param identities: The identities of the hosts to poll; defaults to
+                           every host in the inventory.
+        :param fields: The names of the attributes in `Host.FIELDS` to
+                       retrieve, or None to retrieve all of them. Include
+                       'is_online' to receive state changes.
+        :param jitter: The maximum random delay added to each poll, as a
+                       fraction of the interval.
+        :param workers: The maximum number of requests to make at once.
+        :param publish_interval: The minimum number of seconds between
+                                 snapshots; results arriving in the meantime
+                                 are published together.
+        :param fetch: A function taking an identity and returning its host;
+                      defaults to `Host.request_from_identity`, which uses the
+                      host cache if one is enabled, and reuses the host in the
+                      snapshot if its response has not changed.
+        :raises ValueError: If any parameter is out of range.
+        """
+        if interval <= 0:
+            raise ValueError('Interval must be positive')
+        if not 0 <= jitter <= 1:
+            raise ValueError('Jitter must be between 0 and 1')
+        if workers < 1:
+            raise ValueError('At least one worker is required')
+        if publish_interval < 0:
+            raise ValueError('Publish interval cannot be negative')
+
+        self.interval = interval
+        self.jitter = jitter
+        self.workers = workers
+        self.publish_interval = publish_interval
+        self._identities = None if identities is None else list(identities)
+        self._fields = fields
+        self._fetch = fetch or self._request
+        self._snapshot = Snapshot({}, {}, {})
+        self._subscribers = []
+        self._watchers = []
+        # results waiting to be published, and the indices being polled
+        self._pending = []
+        self._in_flight = set()
+        self._condition = threading.Condition()
+        self._publish_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+
+    @property
+    def snapshot(self):
+        """
+        Retrieve the latest snapshot. This never blocks on a request.
+
+        :return: The current `Snapshot`.
+        """
+        return self._snapshot
+
+    @property
+    def identities(self):
+        """
+        Retrieve the identities of the hosts polled.
+
+        :return: The list of identities.
+        """
+        if self._identities is None:
+            self._identities = list(beam._get_config().hosts)
+        return self._identities
+
+    def subscribe(self, callback):
+        """
+        Register a function to be called whenever a host's state changes, e.g.
+        from online to offline. It is called with the host's identity, its
+        previous state and its new state, each one of `ONLINE`, `OFFLINE` and
+        `UNREACHABLE`. Hosts being polled for the first time do not trigger
+        calls. Exceptions raised by callbacks are ignored.
+
+        :param callback: The function to call.
+        :return: The callback, so this can be used as a decorator.
+        """
+        with self._publish_lock:
+            self._subscribers = self._subscribers + [callback]
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        Stop calling a function registered with `subscribe()`.
+
+        :param callback: The function to stop calling.
+        :raises ValueError: If the function is not subscribed.
+        """
+        with self._publish_lock:
+            subscribers = list(self._subscribers)
+            subscribers.remove(callback)
+            self._subscribers = subscribers
+
+    def watch(self, callback):
+        """
+        Register a function to be called whenever any retrieved attribute of a
+        host changes, e.g. its memory usage. It is called with the host's
+        identity and a dictionary as returned by `Host.diff()`. Hosts being
+        polled for the first time, and polls that fail, do not trigger calls.
+        Exceptions raised by callbacks are ignored.
+
+        :param callback: The function to call.
+        :return: The callback, so this can be used as a decorator.
+        """
+        with self._publish_lock:
+            self._watchers = self._watchers + [callback]
+        return callback
+
+    def unwatch(self, callback):
+        """
+        Stop calling a function registered with `watch()`.
+
+        :param callback: The function to stop calling.
+        :raises ValueError: If the function is not watching.
+        """
+        with self._publish_lock:
+            watchers = list(self._watchers)
+            watchers.remove(callback)
+            self._watchers = watchers
+
+    def poll(self):
+        """
+        Poll every host once, immediately, and publish the results. This can
+        be used without starting the poller, e.g. to fill the snapshot before
+        serving reads.
+
+        :return: The new snapshot.
+        """
+        identities = self.identities
+        results = fleet.map_identities(self._fetch, identities, self.workers,
+                                       return_exceptions=True)
+        now = time.time()
+        return self._publish([(identity, result, now)
+                              for identity, result in zip(identities,
+                                                          results)])
+
+    def start(self):
+        """
+        Start polling in the background.
+
+        :raises RuntimeError: If the poller is already running.
+        """
+        if self._thread is not None:
+            raise RuntimeError('Poller is already running')
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop polling. Requests already being made are allowed to finish, but
+        their results are not published.
+
+        :param timeout: The maximum number of seconds to wait for the
+                        background thread to exit, or None to wait
+                        indefinitely.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        thread.join(timeout)
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def _run(self):
+        """
+        Run the scheduler thread until stopped. Each host is polled once per
+        interval in its own slot, with polls handed to a pool of workers as
+        they fall due. Results are batched and published at most once every
+        `publish_interval` seconds.
+        """
+        identities = self.identities
+        if not identities:
+            return
+        slot = self.interval / len(identities)
+        start = time.monotonic()
+        # (due time, index, round); each host's polls stay aligned to its slot
+        # however long requests take, so the load stays evenly spread
+        schedule = [(start + index * slot + self._delay(), index, 0)
+                    for index in range(len(identities))]
+        heapq.heapify(schedule)
+        last_published = start
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            while True:
+                with self._condition:
+                    if self._stopping:
+                        break
+                    now = time.monotonic()
+                    while schedule[0][0] <= now:
+                        _, index, round_ = heapq.heappop(schedule)
+                        heapq.heappush(schedule, (
+                            start + index * slot +
+                            (round_ + 1) * self.interval + self._delay(),
+                            index, round_ + 1))
+                        # a host still being polled from the previous round
+                        # misses this one, rather than requests piling up
+                        if index not in self._in_flight:
+                            self._in_flight.add(index)
+                            executor.submit(self._poll_one, identities, index)
+                    pending = []
+                    wake = schedule[0][0]
+                    if self._pending:
+                        if now >= last_published + self.publish_interval:
+                            pending, self._pending = self._pending, []
+                            last_published = now
+                        else:
+                            wake = min(wake,
+                                       last_published + self.publish_interval)
+                    if not pending:
+                        self._condition.wait(max(0, wake - now))
+                if pending:
+                    self._publish(pending)
+
+    def _delay(self):
+        """
+        Choose a random delay to add to a poll.
+
+        :return: The delay in seconds.
+        """
+        return random.uniform(0, self.jitter * self.interval)
+
+    def _request(self, identity):
+        """
+        Retrieve a host, reusing the host in the snapshot if its response has
+        not changed.
+
+        :param identity: The identity of the host.
+        :return: The host.
+        """
+        return Host.request_from_identity(
+            identity, self._fields, previous=self._snapshot.get(identity))
+
+    def _poll_one(self, identities, index):
+        """
+        Poll a host on a worker thread, queueing the result for the scheduler
+        thread to publish. Failures are queued rather than raised.
+
+        :param identities: The identities being polled.
+        :param index: The index of the host to poll in `identities`.
+        """
+        identity = identities[index]
+        try:
+            result = self._fetch(identity)
+        except Exception as e:
+            result = e
+        with self._condition:
+            self._in_flight.discard(index)
+            self._pending.append((identity, result, time.time()))
+            self._condition.notify()
+
+    def _publish(self, results):
+        """
+        Replace the snapshot with one including some poll results, then notify
+        subscribers of any state changes.
+
+        :param results: A list of `(identity, host or exception, time)`
+                        tuples.
+        :return: The new snapshot.
+        """
+        changes = []
+        diffs = []
+        with self._publish_lock:
+            previous = self._snapshot
+            hosts = dict(previous._hosts)
+            errors = dict(previous._errors)
+            updated = dict(previous._updated)
+            current = Snapshot(hosts, errors, updated)
+            for identity, result, at in results:
+                before = current.state(identity)
+                if isinstance(result, Exception):
+                    errors[identity] = result
+                else:
+                    last = hosts.get(identity)
+                    # unchanged hosts are reused, so are not compared
+                    if last is not None and last is not result and \
+                            self._watchers:
+                        diff = result.diff(last)
+                        if diff:
+                            diffs.append((identity, diff))
+                    hosts[identity] = result
+                    errors.pop(identity, None)
+                updated[identity] = at
+                after = current.state(identity)
+                if before is not None and after is not None and \
+                        before != after:
+                    changes.append((identity, before, after))
+            self._snapshot = current
+            subscribers = self._subscribers
+            watchers = self._watchers
+        for callbacks, events in ((subscribers, changes), (watchers, diffs)):
+            for event in events:
+                for callback in callbacks:
+                    try:
+                        callback(*event)
+                    except Exception:
+                        pass
+        return current
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division
+
+import asyncio
+import collections
+import re
+import threading
+import time
+
+
+# the number of seconds in each unit a rate can be expressed per
+_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60
+}
+
+_RATE = re.compile(r'\s*(\d+(?:\.\d*)?|\.\d+)\s*(?:/\s*([smh]))?\s*\Z')
+
+
+def parse_rate(value):
+    """
+    Parse a request rate, e.g. '10/s', '600/m' or '5', which is per second.
+
+    :param value: The string to parse.
+    :return: The rate in requests per second.
+    :raises ValueError: If the string is not a valid, positive rate.
+    """
+    match = _RATE.match(value)
+    if match is None:
+        raise ValueError('Not a rate: {0}'.format(value))
+    rate = float(match.group(1)) / _UNITS[match.group(2) or 's']
+    if rate <= 0:
+        raise ValueError('Rate must be positive')
+    return rate
+
+
+class AdaptiveLimiter(object):
+    """
+    Limits the rate of requests with a token bucket, and the number in flight
+    at once, adjusting both to what a server can sustain. Each request that
+    succeeds promptly increases the limits additively, up to their configured
+    maximums; each error or markedly slow response halves them (AIMD).
+
+    Usable from both threads and coroutines.
+    """
+
+    # the fraction of the maximum rate restored by each prompt success
+    _RATE_INCREASE = 0.05
+
+    # the factor limits are multiplied by on congestion
+    _DECREASE = 0.5
+
+    # the smallest fraction of the maximum rate the limiter will back off to
+    _MIN_RATE_FRACTION = 1 / 16
+
+    # a response is slow if it takes longer than this multiple of the average
+    _SLOW_FACTOR = 2
+
+    # the weight of each new latency in the moving average
+    _LATENCY_WEIGHT = 0.2
+
+    # responses with these statuses indicate the server is overloaded
+    CONGESTION_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(self, rate=None, max_in_flight=None, clock=time.monotonic):
+        """
+        Initialise a new limiter.
+
+        :param rate: The maximum number of requests to start per second, or
+                     None for no rate limit.
+        :param max_in_flight: The maximum number of requests in progress at
+                              once, or None for no limit.
+        :param clock: A function returning the current time in seconds.
+        :raises ValueError: If either limit is out of range.
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError('Rate must be positive')
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError('At least one request must be allowed in flight')
+
+        self.max_rate = rate
+        self.max_in_flight = max_in_flight
+        self._clock = clock
+        self._lock = threading.Lock()
+        # the current limits, which adapt below the maximums
+        self._rate = rate
+        self._limit = max_in_flight
+        # allow a second's worth of requests to start at once
+        self._tokens = max(1, rate) if rate is not None else 0
+        self._updated = clock()
+        self._in_flight = 0
+        # functions waking callers waiting for a request slot, in order
+        self._waiters = collections.deque()
+        self._latency = None
+
+    @property
+    def rate(self):
+        """
+        Retrieve the current rate limit.
+
+        :return: The requests allowed per second, or None if unlimited.
+        """
+        return self._rate
+
+    @property
+    def limit(self):
+        """
+        Retrieve the current limit on requests in flight.
+
+        :return: The number of requests allowed at once, or None if unlimited.
+        """
+        return None if self._limit is None else int(self._limit)
+
+    def _reserve(self):
+        """
+        Take a token from the bucket, going into debt if it is empty.
+
+        :return: The number of seconds to wait before starting the request.
+        """
+        if self._rate is None:
+            return 0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(max(1, self._rate),
+                               self._tokens +
+                               (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0 if self._tokens >= 0 else -self._tokens / self._rate
+
+    def _try_enter(self, wake):
+        """
+        Take a request slot if one is free, otherwise queue to be given one.
+
+        :param wake: The function to call once a slot has been given to the
+                     caller.
+        :return: True if a slot was taken, false if the caller was queued.
+        """
+        with self._lock:
+            if self._limit is None or \
+                    (not self._waiters and self._in_flight < int(self._limit)):
+                self._in_flight += 1
+                return True
+            self._waiters.append(wake)
+            return False
+
+    def _grant(self):
+        """
+        Give free slots to queued callers. Must be called with the lock held.
+        """
+        while self._waiters and (self._limit is None or
+                                 self._in_flight < int(self._limit)):
+            self._in_flight += 1
+            self._waiters.popleft()()
+
+    def acquire(self):
+        """
+        Block until a request may start. Every call must be followed by a call
+        to `release()`.
+        """
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+        event = threading.Event()
+        if not self._try_enter(event.set):
+            event.wait()
+
+    async def aacquire(self):
+        """
+        Wait until a request may start, without blocking the event loop.
+        Every call must be followed by a call to `release()`.
+        """
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(
+                lambda: future.done() or future.set_result(None))
+
+        if self._try_enter(wake):
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(wake)
+                    wake = None
+                except ValueError:
+                    pass
+            if wake is not None:
+                # a slot was given to this caller just as it was cancelled
+                self.release()
+            raise
+
+    def release(self, latency=None, congested=False):
+        """
+        Record the outcome of a request, adapting the limits, and free its
+        slot.
+
+        :param latency: The number of seconds the request took, or None if it
+                        was abandoned before completing, in which case the
+                        limits are left unchanged.
+        :param congested: Whether the request failed in a way indicating the
+                          server is overloaded, e.g. an error status or a
+                          timeout.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if latency is None:
+                self._grant()
+                return
+            slow = self._latency is not None and \
+                latency > self._SLOW_FACTOR * self._latency
+            self._latency = latency if self._latency is None else \
+                self._latency + self._LATENCY_WEIGHT * (latency -
+                                                        self._latency)
+            if congested or slow:
+                if self._rate is not None:
+                    self._rate = max(self.max_rate * self._MIN_RATE_FRACTION,
+                                     self._rate * self._DECREASE)
+                if self._limit is not None:
+                    self._limit = max(1, self._limit * self._DECREASE)
+            else:
+                if self._rate is not None:
+                    self._rate = min(self.max_rate,
+                                     self._rate +
+                                     self.max_rate * self._RATE_INCREASE)
+                if self._limit is not None:
+                    # grows by about one per limit's worth of successes
+                    self._limit = min(self.max_in_flight,
+                                      self._limit + 1 / self._limit)
+            self._grant()
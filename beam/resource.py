@@ -11,6 +11,38 @@ class Resource(object):
     concept of scarcity.
     """
 
+    # instances are held for every host in a fleet, so avoid a __dict__ each
+    __slots__ = ('used_bytes', 'free_bytes')
+
+    @property
+    def total_bytes(self):
+        """
+        Find the total number of bytes of this resource.
+
+        :return: The number of bytes used plus the number free.
+        """
+        return self.used_bytes + self.free_bytes
+
+    @property
+    def used_percentage(self):
+        """
+        Find the proportion of this resource that is used. If the total number
+        of bytes is 0, 100% usage is indicated for safety.
+
+        :return: The proportion used, between 0 and 1.
+        """
+        total_bytes = self.total_bytes
+        return 1 if not total_bytes else self.used_bytes / total_bytes
+
+    @property
+    def free_percentage(self):
+        """
+        Find the proportion of this resource that is free.
+
+        :return: The proportion free, between 0 and 1.
+        """
+        return 1 - self.used_percentage
+
     def __init__(self, used_bytes, free_bytes):
         """
         Initialise a new resource instance. If the total number of bytes is 0,
@@ -21,10 +53,6 @@ class Resource(object):
         """
         self.used_bytes = used_bytes
         self.free_bytes = free_bytes
-        self.total_bytes = used_bytes + free_bytes
-        self.used_percentage = 1 if not self.total_bytes else \
-            used_bytes / self.total_bytes
-        self.free_percentage = 1 - self.used_percentage
 
     @staticmethod
     def from_response(response):
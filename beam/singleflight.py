@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+
+
+class _Call(object):
+    """
+    A synchronous call in progress, shared by its caller and everyone waiting
+    on it. `done` is set once the call completes, after which exactly one of
+    `result` and `error` is meaningful: `error` is the exception the function
+    raised, or None if it returned `result`.
+    """
+
+    def __init__(self):
+        """
+        Initialise a new call that has not yet completed.
+        """
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key, so only the first is
+    executed and the rest wait for and share its result or exception. Calls
+    made after it completes execute again.
+    """
+
+    def __init__(self):
+        """
+        Initialise a new group with no calls in progress.
+        """
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Find the number of calls in progress.
+
+        :return: The number of distinct keys being executed.
+        """
+        return len(self._calls) + len(self._tasks)
+
+    def do(self, key, func):
+        """
+        Call a function, unless a call with the same key is already in
+        progress, in which case wait for that call to complete instead.
+
+        :param key: Identifies equivalent calls.
+        :param func: A function taking no arguments.
+        :return: The function's return value.
+        :raises Exception: Any exception raised by the function.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key, func):
+        """
+        Await a coroutine function, unless a call with the same key is already
+        in progress on the running event loop, in which case await that call
+        instead. Cancelling one caller does not cancel the call for the others.
+
+        :param key: Identifies equivalent calls.
+        :param func: A coroutine function taking no arguments.
+        :return: The coroutine's return value.
+        :raises Exception: Any exception raised by the coroutine.
+        """
+        # only imported once needed, so a CLI query answered by a daemon does
+        # not pay for it; anything making requests through a vendor imports
+        # it regardless
+        import asyncio
+
+        # tasks cannot be awaited from other loops
+        key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.ensure_future(func())
+                self._tasks[key] = task
+                task.add_done_callback(
+                    lambda _: self._complete(key, task))
+        return await asyncio.shield(task)
+
+    def _complete(self, key, task):
+        """
+        Forget a completed asynchronous call.
+
+        :param key: The key of the call, including its event loop.
+        :param task: The completed task.
+        """
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        if not task.cancelled():
+            # mark the exception retrieved, in case every caller was cancelled
+            task.exception()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division
+
+import array
+import heapq
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from beam.resource import Resource
+
+
+class ResourceTable(object):
+    """
+    The state of one resource, e.g. memory, across many hosts, stored as
+    columns so fleet-wide figures can be computed without visiting each host.
+    Columns are NumPy arrays if NumPy is installed, otherwise `array.array`s.
+    """
+
+    # the columns that can be filtered, sorted and summarised
+    COLUMNS = ('used_bytes', 'free_bytes', 'total_bytes', 'used_percentage',
+               'free_percentage')
+
+    def __init__(self, identities, used_bytes, free_bytes):
+        """
+        Initialise a new table. Use `from_hosts()` to build one from retrieved
+        hosts.
+
+        :param identities: The identity of the host in each row.
+        :param used_bytes: The number of bytes used by each host.
+        :param free_bytes: The number of bytes free on each host.
+        :raises ValueError: If the columns differ in length.
+        """
+        if not len(identities) == len(used_bytes) == len(free_bytes):
+            raise ValueError('Columns must be the same length')
+        self.identities = list(identities)
+        if numpy is None:
+            self.used_bytes = array.array('q', used_bytes)
+            self.free_bytes = array.array('q', free_bytes)
+            self.total_bytes = array.array(
+                'q', [used + free for used, free in zip(self.used_bytes,
+                                                        self.free_bytes)])
+            self.used_percentage = array.array(
+                'd', [used / total if total else 1
+                      for used, total in zip(self.used_bytes,
+                                             self.total_bytes)])
+            self.free_percentage = array.array(
+                'd', [1 - used for used in self.used_percentage])
+        else:
+            self.used_bytes = numpy.asarray(used_bytes, dtype=numpy.int64)
+            self.free_bytes = numpy.asarray(free_bytes, dtype=numpy.int64)
+            self.total_bytes = self.used_bytes + self.free_bytes
+            # 100% usage for empty resources, as for `Resource`
+            self.used_percentage = numpy.divide(
+                self.used_bytes, self.total_bytes,
+                out=numpy.ones(len(self.identities)),
+                where=self.total_bytes != 0)
+            self.free_percentage = 1 - self.used_percentage
+
+    @classmethod
+    def from_hosts(cls, hosts, resource):
+        """
+        Build a table from retrieved hosts. Hosts without the resource, e.g.
+        because it was not requested, are omitted.
+
+        :param hosts: The hosts to include.
+        :param resource: The name of the resource attribute, one of 'memory',
+                         'storage' or 'bandwidth'.
+        :return: The table.
+        :raises ValueError: If the resource is unknown.
+        """
+        if resource not in ('memory', 'storage', 'bandwidth'):
+            raise ValueError('Unknown resource: {0}'.format(resource))
+        identities = []
+        used_bytes = []
+        free_bytes = []
+        for host in hosts:
+            value = getattr(host, resource)
+            if value is not None:
+                identities.append(host)
+                used_bytes.append(value.used_bytes)
+                free_bytes.append(value.free_bytes)
+        return cls(identities, used_bytes, free_bytes)
+
+    def __len__(self):
+        """
+        Find the number of hosts in this table.
+
+        :return: The number of rows.
+        """
+        return len(self.identities)
+
+    def _column(self, column):
+        """
+        Retrieve a column by name.
+
+        :param column: The name of the column, one of `COLUMNS`.
+        :return: The column.
+        :raises ValueError: If the column is unknown.
+        """
+        if column not in self.COLUMNS:
+            raise ValueError('Unknown column: {0}'.format(column))
+        return getattr(self, column)
+
+    def _take(self, indices):
+        """
+        Build a table containing a subset of this table's rows.
+
+        :param indices: The indices of the rows to include, in order.
+        :return: The new table.
+        """
+        if numpy is None:
+            return ResourceTable([self.identities[i] for i in indices],
+                                 [self.used_bytes[i] for i in indices],
+                                 [self.free_bytes[i] for i in indices])
+        indices = numpy.asarray(indices, dtype=numpy.intp)
+        return ResourceTable([self.identities[i] for i in indices],
+                             self.used_bytes[indices],
+                             self.free_bytes[indices])
+
+    def total(self):
+        """
+        Sum the resource across all hosts.
+
+        :return: A `Resource` of the total bytes used and free.
+        """
+        return Resource(int(sum(self.used_bytes)) if numpy is None
+                        else int(self.used_bytes.sum()),
+                        int(sum(self.free_bytes)) if numpy is None
+                        else int(self.free_bytes.sum()))
+
+    def by_vendor(self):
+        """
+        Sum the resource across the hosts of each vendor.
+
+        :return: A dictionary mapping each vendor to a `Resource` of the total
+                 bytes used and free on its hosts.
+        """
+        vendors = {}
+        codes = [vendors.setdefault(identity.vendor, len(vendors))
+                 for identity in self.identities]
+        if numpy is None:
+            used = [0] * len(vendors)
+            free = [0] * len(vendors)
+            for code, used_bytes, free_bytes in zip(codes, self.used_bytes,
+                                                    self.free_bytes):
+                used[code] += used_bytes
+                free[code] += free_bytes
+        else:
+            codes = numpy.asarray(codes, dtype=numpy.intp)
+            used = numpy.zeros(len(vendors), dtype=numpy.int64)
+            free = numpy.zeros(len(vendors), dtype=numpy.int64)
+            numpy.add.at(used, codes, self.used_bytes)
+            numpy.add.at(free, codes, self.free_bytes)
+        return {vendor: Resource(int(used[code]), int(free[code]))
+                for vendor, code in vendors.items()}
+
+    def above(self, threshold, column='used_percentage'):
+        """
+        Select the hosts whose value in a column exceeds a threshold, e.g.
+        hosts using over 90% of their disk.
+
+        :param threshold: The value to exceed.
+        :param column: The name of the column to compare, one of `COLUMNS`.
+        :return: A table of the matching hosts, in the same order.
+        :raises ValueError: If the column is unknown.
+        """
+        values = self._column(column)
+        if numpy is None:
+            return self._take([i for i, value in enumerate(values)
+                               if value > threshold])
+        return self._take(numpy.flatnonzero(values > threshold))
+
+    def below(self, threshold, column='free_bytes'):
+        """
+        Select the hosts whose value in a column is under a threshold, e.g.
+        hosts with less than 10 GiB of disk left.
+
+        :param threshold: The value to be under.
+        :param column: The name of the column to compare, one of `COLUMNS`.
+        :return: A table of the matching hosts, in the same order.
+        :raises ValueError: If the column is unknown.
+        """
+        values = self._column(column)
+        if numpy is None:
+            return self._take([i for i, value in enumerate(values)
+                               if value < threshold])
+        return self._take(numpy.flatnonzero(values < threshold))
+
+    def sort(self, column='used_percentage', descending=False):
+        """
+        Order the hosts by their value in a column. Hosts with equal values
+        keep their relative order.
+
+        :param column: The name of the column to sort by, one of `COLUMNS`.
+        :param descending: Whether to put the highest values first.
+        :return: A sorted table.
+        :raises ValueError: If the column is unknown.
+        """
+        values = self._column(column)
+        if numpy is None:
+            indices = sorted(range(len(values)), key=values.__getitem__,
+                             reverse=descending)
+        elif descending:
+            # negating would overflow the minimum integer, so reverse a
+            # stable sort of the reversed column to keep ties in order
+            reverse = numpy.argsort(values[::-1], kind='stable')[::-1]
+            indices = len(values) - 1 - reverse
+        else:
+            indices = numpy.argsort(values, kind='stable')
+        return self._take(indices)
+
+    def top(self, n, column='used_bytes'):
+        """
+        Find the hosts with the highest values in a column, e.g. the largest
+        bandwidth consumers.
+
+        :param n: The maximum number of hosts to return.
+        :param column: The name of the column to rank by, one of `COLUMNS`.
+        :return: A table of at most n hosts, highest first.
+        :raises ValueError: If the column is unknown or n is negative.
+        """
+        if n < 0:
+            raise ValueError('Cannot select a negative number of hosts')
+        values = self._column(column)
+        if numpy is None:
+            return self._take(heapq.nlargest(n, range(len(values)),
+                                             key=values.__getitem__))
+        if n < len(values):
+            # only fully sort the n candidates
+            candidates = numpy.argpartition(values, len(values) - n)[-n:] \
+                if n else numpy.array([], dtype=numpy.intp)
+            return self._take(numpy.sort(candidates)).sort(column,
+                                                           descending=True)
+        return self.sort(column, descending=True)
+
+    def percentile(self, q, column='used_percentage'):
+        """
+        Compute a percentile of a column, interpolating linearly between
+        values.
+
+        :param q: The percentile, between 0 and 100, e.g. 95.
+        :param column: The name of the column, one of `COLUMNS`.
+        :return: The value at the percentile.
+        :raises ValueError: If the table is empty, the column is unknown or q
+                            is out of range.
+        """
+        if not 0 <= q <= 100:
+            raise ValueError('Percentile must be between 0 and 100')
+        if not self.identities:
+            raise ValueError('Cannot compute a percentile of no hosts')
+        values = self._column(column)
+        if numpy is not None:
+            return float(numpy.percentile(values, q))
+        ordered = sorted(values)
+        position = (len(ordered) - 1) * q / 100
+        lower = int(math.floor(position))
+        upper = min(lower + 1, len(ordered) - 1)
+        return float(ordered[lower] +
+                     (ordered[upper] - ordered[lower]) * (position - lower))
+
+
+class FleetStats(object):
+    """
+    Tables of memory, storage and bandwidth across a fleet of hosts.
+    """
+
+    def __init__(self, hosts):
+        """
+        Initialise new fleet statistics.
+
+        :param hosts: The hosts to include, e.g. from `beam.hosts()` or a
+                      `Poller` snapshot.
+        """
+        hosts = list(hosts)
+        self.memory = ResourceTable.from_hosts(hosts, 'memory')
+        """ The `ResourceTable` of the hosts' memory. """
+        self.storage = ResourceTable.from_hosts(hosts, 'storage')
+        """ The `ResourceTable` of the hosts' storage. """
+        self.bandwidth = ResourceTable.from_hosts(hosts, 'bandwidth')
+        """ The `ResourceTable` of the hosts' bandwidth. """
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+class FakeClock(object):
+    """
+    A clock that only moves when told to, for classes taking a function
+    returning the current time, e.g. `time.monotonic`.
+    """
+
+    def __init__(self, now=0):
+        """
+        Initialise a new clock.
+
+        :param now: The time to start at, in seconds.
+        """
+        self.now = now
+
+    def __call__(self):
+        """
+        Retrieve the current time.
+
+        :return: The time in seconds, as last set.
+        """
+        return self.now
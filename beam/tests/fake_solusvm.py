@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import random
+import threading
+import time
+# noinspection PyUnresolvedReferences
+from six.moves import BaseHTTPServer, socketserver
+# noinspection PyUnresolvedReferences
+from six.moves.urllib.parse import urlsplit, parse_qs
+
+
+class FakeSolusVM(object):
+    """
+    A local HTTP server imitating SolusVM's client API. Info requests for a
+    registered hash are answered with that host's response body; actions
+    against a registered hash succeed. Responses can be delayed and failed at
+    random, to imitate a slow or overloaded control panel.
+    """
+
+    ENDPOINT = '/api/client/command.php'
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, seed=None):
+        """
+        Initialise a new server. It does not listen until started.
+
+        :param latency: The minimum number of seconds to delay each response
+                        by.
+        :param jitter: The maximum number of seconds added to the latency at
+                       random.
+        :param error_rate: The proportion of requests answered with a 503
+                           status, between 0 and 1.
+        :param seed: Seeds the random delays and errors, for repeatable runs.
+        """
+        self.bodies = {}
+        self.requests = []
+        self.connections = 0
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            # keeps connections alive, like SolusVM's web server
+            protocol_version = 'HTTP/1.1'
+            # the headers and body are written separately, so Nagle's
+            # algorithm would hold the body back until the client's delayed
+            # ACK of the headers on a kept-alive connection
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                self._respond(parts.path, parse_qs(parts.query))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self._respond(urlsplit(self.path).path,
+                              parse_qs(self.rfile.read(length).decode('ascii')))
+
+            def _respond(self, path, query):
+                params = {k: v[0] for k, v in query.items()}
+                with fake._lock:
+                    fake.requests.append((self.command, params))
+                    delay = fake.latency + fake._random.uniform(0, fake.jitter)
+                    failed = fake._random.random() < fake.error_rate
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    status, body = 503, 'Service Unavailable'
+                else:
+                    status, body = fake.handle(path, params)
+                encoded = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, *_):
+                pass
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+            # benchmarks open many connections at once
+            request_queue_size = 128
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Retrieve the base URL of the server, suitable for use as a vendor
+        endpoint.
+
+        :return: The server's URL.
+        """
+        return 'http://127.0.0.1:{0}'.format(self._server.server_address[1])
+
+    def handle(self, path, params):
+        """
+        Produce a response to a request.
+
+        :param path: The request path.
+        :param params: The request parameters.
+        :return: A `(status, body)` tuple.
+        """
+        if path != self.ENDPOINT:
+            return 404, ''
+        body = self.bodies.get(params.get('hash'))
+        if body is None:
+            return 200, '<status>error</status>' \
+                        '<statusmsg>Invalid key or hash</statusmsg>'
+        if params.get('action') == 'info':
+            return 200, body
+        return 200, '<status>success</status><statusmsg>{0}ed</statusmsg>' \
+            .format(params.get('action'))
+
+    def start(self):
+        """
+        Start serving requests on a background thread.
+
+        :return: This server, for chaining.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving requests, waiting for the background thread to exit, and
+        close the listening socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        """
+        Start the server; see `start()`.
+
+        :return: This server.
+        """
+        return self.start()
+
+    def __exit__(self, *_):
+        """
+        Stop the server; see `stop()`.
+        """
+        self.stop()
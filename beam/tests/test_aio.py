@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import asyncio
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import beam
+from beam import aio
+from beam.config import Config
+from beam.host import Host, HostIdentity
+from beam.transport import Response, StreamTransport, content_charset
+from beam.vendor import Vendor
+from beam.tests.fake_solusvm import FakeSolusVM
+from beam.tests.test_host import TestHost
+
+
+class TestContentCharset(unittest.TestCase):
+
+    def test_declared(self):
+        self.assertEqual(
+            content_charset({'content-type': 'text/xml; Charset="Latin-1"'}),
+            'iso8859-1')
+
+    def test_undeclared(self):
+        self.assertEqual(content_charset({'content-type': 'text/xml'}),
+                         'utf-8')
+
+    def test_unknown(self):
+        self.assertEqual(
+            content_charset({'content-type': 'text/xml; charset=nonsense'}),
+            'utf-8')
+
+    def test_no_headers(self):
+        self.assertEqual(content_charset(None), 'utf-8')
+
+
+class TestStreamTransport(unittest.IsolatedAsyncioTestCase):
+
+    @staticmethod
+    async def _read(raw, eof=True):
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        if eof:
+            reader.feed_eof()
+        return await StreamTransport._read_response(reader)
+
+    async def test_read_content_length(self):
+        self.assertEqual(
+            await self._read(b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\n'
+                             b'bodyextra', eof=False),
+            (Response(200, b'body', {'content-length': '4'}), True))
+
+    async def test_read_chunked(self):
+        self.assertEqual(
+            await self._read(b'HTTP/1.1 200 OK\r\n'
+                             b'Transfer-Encoding: chunked\r\n\r\n'
+                             b'2\r\nbo\r\n2;ext\r\ndy\r\n0\r\n\r\n',
+                             eof=False),
+            (Response(200, b'body', {'transfer-encoding': 'chunked'}), True))
+
+    async def test_read_until_close(self):
+        self.assertEqual(
+            await self._read(b'HTTP/1.1 200 OK\r\nA: b\r\n\r\nbody'),
+            (Response(200, b'body', {'a': 'b'}), False))
+
+    async def test_read_connection_close(self):
+        self.assertEqual(
+            await self._read(b'HTTP/1.1 200 OK\r\nConnection: close\r\n'
+                             b'Content-Length: 0\r\n\r\n', eof=False),
+            (Response(200, b'', {'connection': 'close',
+                                 'content-length': '0'}), False))
+
+    async def test_read_charset(self):
+        response, _ = await self._read(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/html; charset="ISO-8859-1"\r\n'
+            b'Content-Length: 2\r\n\r\n\xa3\xe9')
+        self.assertEqual(response.text, '\xa3\xe9')
+
+    async def test_read_no_charset(self):
+        response, _ = await self._read(
+            b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n'
+            b'Content-Length: 2\r\n\r\n\xc2\xa3')
+        self.assertEqual(response.text, '\xa3')
+
+    async def test_read_http_1_0(self):
+        self.assertFalse((await self._read(
+            b'HTTP/1.0 200 OK\r\nContent-Length: 0\r\n\r\n'))[1])
+        self.assertTrue((await self._read(
+            b'HTTP/1.0 200 OK\r\nConnection: keep-alive\r\n'
+            b'Content-Length: 0\r\n\r\n', eof=False))[1])
+
+    async def test_read_malformed(self):
+        with self.assertRaises(RuntimeError):
+            await self._read(b'garbage\r\n\r\n')
+
+    async def test_read_bad_status(self):
+        with self.assertRaises(RuntimeError):
+            await self._read(b'HTTP/1.0 OK\r\n\r\n')
+
+    async def test_read_truncated(self):
+        with self.assertRaises(asyncio.IncompleteReadError):
+            await self._read(b'HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\n'
+                             b'body')
+
+    def test_invalid_pool_size(self):
+        with self.assertRaises(ValueError):
+            StreamTransport(pool_size=0)
+
+
+class TestStreamTransportPool(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = FakeSolusVM().start()
+        self.addCleanup(self.server.stop)
+        self.server.bodies['hash'] = TestHost._XML_VALID
+        self.url = self.server.url + FakeSolusVM.ENDPOINT
+
+    async def _info(self, transport):
+        return await transport.request('GET', self.url,
+                                       {'hash': 'hash', 'action': 'info'})
+
+    async def test_reuses_connection(self):
+        transport = StreamTransport()
+        for _ in range(3):
+            self.assertEqual((await self._info(transport)).status_code, 200)
+        await transport.request('POST', self.url,
+                                {'hash': 'hash', 'action': 'reboot'})
+        transport.close()
+        self.assertEqual(len(self.server.requests), 4)
+        # actions always use a new connection
+        self.assertEqual(self.server.connections, 2)
+
+    async def test_concurrent_requests(self):
+        transport = StreamTransport(pool_size=2)
+        for _ in range(2):
+            await asyncio.gather(*[self._info(transport) for _ in range(4)])
+        transport.close()
+        # the second batch reuses the two connections kept idle
+        self.assertEqual(self.server.connections, 6)
+
+    async def test_keep_alive_disabled(self):
+        transport = StreamTransport(keep_alive=False)
+        for _ in range(2):
+            await self._info(transport)
+        self.assertEqual(self.server.connections, 2)
+
+    async def test_stale_connection(self):
+        transport = StreamTransport()
+        await self._info(transport)
+        # the server closes the idle connection just as it is reused
+        reader = asyncio.StreamReader()
+        writer = mock.Mock()
+        writer.is_closing.return_value = False
+        writer.write.side_effect = lambda _: reader.feed_eof()
+        writer.drain = mock.AsyncMock()
+        key = next(iter(transport._idle))
+        transport._idle[key][0][1].close()
+        transport._idle[key] = [(reader, writer)]
+        self.assertEqual((await self._info(transport)).status_code, 200)
+        writer.close.assert_called_once_with()
+        transport.close()
+        self.assertEqual(self.server.connections, 2)
+
+
+class TestAio(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = FakeSolusVM().start()
+        self.addCleanup(self.server.stop)
+        vendor = Vendor('fake', self.server.url)
+        self.identities = [HostIdentity('host-{0}'.format(i),
+                                        'key-{0}'.format(i),
+                                        'hash-{0}'.format(i),
+                                        vendor)
+                           for i in range(4)]
+        for identity in self.identities[:3]:
+            self.server.bodies[identity.hash] = TestHost._XML_VALID
+        patcher = mock.patch.object(beam, '_config',
+                                    Config(self.identities))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        aio.close()
+
+    async def test_close(self):
+        await aio.host('host-0')
+        await aio.host('host-1')
+        aio.close()
+        await aio.host('host-2')
+        self.assertEqual(self.server.connections, 2)
+
+    async def test_arequest_from_identity(self):
+        host = await Host.arequest_from_identity(self.identities[0])
+        self.assertEqual(host.fqdn, TestHost.HOST.fqdn)
+        self.assertEqual(host.ip_addresses, TestHost.HOST.ip_addresses)
+        self.assertEqual(self.server.requests[0][1]['action'], 'info')
+
+    async def test_arequest_from_identity_failure(self):
+        with self.assertRaises(RuntimeError):
+            await Host.arequest_from_identity(self.identities[3])
+
+    async def test_arequest_from_identity_transport(self):
+        transport = mock.Mock()
+        transport.request = mock.AsyncMock(
+            return_value=Response(403, b'denied'))
+        with self.assertRaises(RuntimeError):
+            await Host.arequest_from_identity(self.identities[0], transport)
+        transport.request.assert_awaited_once()
+
+    async def test_areboot(self):
+        host = await aio.host('host-1')
+        await host.areboot()
+        self.assertEqual(self.server.requests[-1],
+                         ('POST', {'key': 'key-1',
+                                   'hash': 'hash-1',
+                                   'action': 'reboot',
+                                   'status': 'true'}))
+
+    async def test_aaction_invalid(self):
+        host = await aio.host('host-1')
+        with self.assertRaises(ValueError):
+            await host.aaction('invalid')
+
+    async def test_hosts(self):
+        results = [result async for result in
+                   aio.hosts(per_vendor=2, return_exceptions=True)]
+        self.assertEqual(len(results), 4)
+        by_name = {identity.name: host for identity, host in results}
+        self.assertIsInstance(by_name['host-3'], RuntimeError)
+        self.assertEqual(by_name['host-0'].fqdn, TestHost.HOST.fqdn)
+
+    async def test_hosts_raises(self):
+        with self.assertRaises(RuntimeError):
+            async for _ in aio.hosts():
+                pass
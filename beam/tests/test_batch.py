@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import time
+import unittest
+import responses
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from beam import batch, wait
+from beam.batch import ActionReport, ActionResult
+from beam.host import HostIdentity
+from beam.vendor import Vendor
+
+_ENDPOINT = 'https://vpscp.ramnode.com'
+_URL = _ENDPOINT + '/api/client/command.php'
+_VENDOR = Vendor('ramnode', _ENDPOINT)
+_IDENTITIES = [HostIdentity('host-{0}'.format(i), 'key-{0}'.format(i),
+                            'hash-{0}'.format(i), _VENDOR)
+               for i in range(4)]
+
+
+def _action_callback(request):
+    if 'hash=hash-2' in request.body:
+        return 200, {}, '<status>error</status>'
+    return 200, {}, '<status>success</status>'
+
+
+class TestActionReport(unittest.TestCase):
+
+    def setUp(self):
+        self.report = ActionReport('reboot', [
+            ActionResult(_IDENTITIES[0], ActionResult.SUCCEEDED),
+            ActionResult(_IDENTITIES[1], ActionResult.FAILED,
+                         RuntimeError('oops')),
+            ActionResult(_IDENTITIES[2], ActionResult.SKIPPED)
+        ])
+
+    def test_partitions(self):
+        self.assertEqual(len(self.report.succeeded), 1)
+        self.assertEqual(len(self.report.failed), 1)
+        self.assertEqual(len(self.report.skipped), 1)
+
+    def test_ok(self):
+        self.assertFalse(self.report.ok)
+        self.assertTrue(ActionReport('boot', self.report.succeeded).ok)
+
+    def test_str(self):
+        self.assertEqual(str(self.report), 'ActionReport(reboot: 1 '
+                                           'succeeded, 1 failed, 1 skipped)')
+
+    def test_result_str(self):
+        self.assertEqual(str(self.report.results[1]),
+                         'host-1: failed: oops')
+
+
+class TestExecute(unittest.TestCase):
+
+    def test_invalid_action(self):
+        with self.assertRaises(ValueError):
+            batch.execute(_IDENTITIES, 'explode')
+
+    def test_invalid_rolling(self):
+        with self.assertRaises(ValueError):
+            batch.execute(_IDENTITIES, 'boot', rolling=0)
+
+    def test_invalid_rate_limit(self):
+        with self.assertRaises(ValueError):
+            batch.execute(_IDENTITIES, 'boot', rate_limit=0)
+
+    @responses.activate
+    def test_execute(self):
+        responses.add_callback(responses.POST, _URL,
+                               callback=_action_callback)
+        report = batch.execute(_IDENTITIES, 'reboot', workers=4)
+        self.assertListEqual([result.identity for result in report],
+                             _IDENTITIES)
+        self.assertListEqual([result.status for result in report],
+                             [ActionResult.SUCCEEDED,
+                              ActionResult.SUCCEEDED,
+                              ActionResult.FAILED,
+                              ActionResult.SUCCEEDED])
+        self.assertIsInstance(report.results[2].error, RuntimeError)
+        # hosts are not queried before being acted on
+        self.assertEqual(len(responses.calls), 4)
+
+    @responses.activate
+    def test_execute_rate_limit(self):
+        responses.add(responses.POST, _URL, body='<status>success</status>')
+        start = time.monotonic()
+        batch.execute(_IDENTITIES[:3], 'boot', rate_limit=50)
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    @responses.activate
+    def test_execute_rolling(self):
+        responses.add_callback(responses.POST, _URL,
+                               callback=_action_callback)
+        with mock.patch.object(batch, '_wait_for_state') as wait_for_state:
+            report = batch.execute(_IDENTITIES, 'shutdown', rolling=1,
+                                   timeout=10, poll_interval=1)
+        self.assertListEqual([result.status for result in report],
+                             [ActionResult.SUCCEEDED,
+                              ActionResult.SUCCEEDED,
+                              ActionResult.FAILED,
+                              ActionResult.SKIPPED])
+        wait_for_state.assert_called_with(mock.ANY, _IDENTITIES[1],
+                                          wait.OFFLINE, 10)
+
+    @responses.activate
+    def test_execute_rolling_reboot(self):
+        # each host is still reported online just after its reboot
+        statuses = dict((identity.hash, iter(['online', 'offline', 'online']))
+                        for identity in _IDENTITIES[:2])
+        events = []
+
+        def info(request):
+            hash_ = request.params['hash']
+            status = next(statuses[hash_])
+            events.append((hash_, status))
+            return 200, {}, '<status>success</status><hostname>a</hostname>' \
+                            '<ipaddress>b</ipaddress><vmstat>{0}</vmstat>' \
+                .format(status)
+
+        def action(request):
+            events.append(('reboot', 'hash=hash-1' in request.body))
+            return 200, {}, '<status>success</status>'
+
+        responses.add_callback(responses.GET, _URL, callback=info)
+        responses.add_callback(responses.POST, _URL, callback=action)
+        report = batch.execute(_IDENTITIES[:2], 'reboot', rolling=1,
+                               timeout=5, poll_interval=0.001)
+        self.assertTrue(report.ok)
+        # the second host is only rebooted once the first is back up
+        self.assertListEqual(events[:5], [
+            ('reboot', False),
+            ('hash-0', 'online'),
+            ('hash-0', 'offline'),
+            ('hash-0', 'online'),
+            ('reboot', True)])
+
+    @responses.activate
+    def test_wait_for_state(self):
+        responses.add(responses.GET, _URL,
+                      body='<status>success</status><hostname>a</hostname>'
+                           '<ipaddress>b</ipaddress><vmstat>offline</vmstat>')
+        responses.add(responses.GET, _URL,
+                      body='<status>success</status><hostname>a</hostname>'
+                           '<ipaddress>b</ipaddress><vmstat>online</vmstat>')
+        batch._wait_for_state(wait.Waiter(0.001, 0.001), _IDENTITIES[0],
+                              wait.ONLINE, 1)
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(responses.calls[0].request.params['status'], 'true')
+        self.assertNotIn('hdd', responses.calls[0].request.params)
+
+    @responses.activate
+    def test_wait_for_state_timeout(self):
+        responses.add(responses.GET, _URL,
+                      body='<status>success</status><hostname>a</hostname>'
+                           '<ipaddress>b</ipaddress><vmstat>offline</vmstat>')
+        with self.assertRaises(RuntimeError):
+            batch._wait_for_state(wait.Waiter(0.01, 0.01), _IDENTITIES[0],
+                                  wait.ONLINE, 0.02)
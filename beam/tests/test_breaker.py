@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import unittest
+
+from beam.breaker import CircuitBreaker, CircuitOpenError
+from beam.tests.fake_clock import FakeClock
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(threshold=3, reset_timeout=10,
+                                      clock=self.clock)
+
+    def _fail(self, times):
+        for _ in range(times):
+            self.breaker.allow()
+            self.breaker.record(True)
+
+    def test_init_invalid_threshold(self):
+        with self.assertRaises(ValueError):
+            CircuitBreaker(threshold=0)
+
+    def test_init_invalid_reset_timeout(self):
+        with self.assertRaises(ValueError):
+            CircuitBreaker(reset_timeout=0)
+
+    def test_closed(self):
+        self._fail(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.allow()
+
+    def test_success_resets_failures(self):
+        self._fail(2)
+        self.breaker.allow()
+        self.breaker.record(False)
+        self._fail(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_opens(self):
+        self._fail(3)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+
+    def test_open_error_is_runtime_error(self):
+        self.assertTrue(issubclass(CircuitOpenError, RuntimeError))
+
+    def test_half_open_single_trial(self):
+        self._fail(3)
+        self.clock.now = 10
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.allow()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+
+    def test_trial_success_closes(self):
+        self._fail(3)
+        self.clock.now = 10
+        self.breaker.allow()
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_trial_failure_reopens(self):
+        self._fail(3)
+        self.clock.now = 10
+        self._fail(1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.now = 19
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+
+    def test_trial_abandoned(self):
+        self._fail(3)
+        self.clock.now = 10
+        self.breaker.allow()
+        self.breaker.record(None)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.allow()
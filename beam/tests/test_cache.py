@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import asyncio
+import threading
+import unittest
+
+from beam.cache import HostCache
+from beam.tests.fake_clock import FakeClock
+
+
+class TestHostCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = HostCache(10, max_size=2, stale_ttl=5, clock=self.clock)
+
+    def test_init_invalid_ttl(self):
+        with self.assertRaises(ValueError):
+            HostCache(0)
+
+    def test_init_invalid_max_size(self):
+        with self.assertRaises(ValueError):
+            HostCache(1, max_size=0)
+
+    def test_init_invalid_stale_ttl(self):
+        with self.assertRaises(ValueError):
+            HostCache(1, stale_ttl=-1)
+
+    def test_lookup_miss(self):
+        self.assertEqual(self.cache.lookup('a'), (None, HostCache.MISS))
+
+    def test_lookup_fresh(self):
+        self.cache.store('a', 1)
+        self.clock.now = 9
+        self.assertEqual(self.cache.lookup('a'), (1, HostCache.FRESH))
+
+    def test_lookup_stale(self):
+        self.cache.store('a', 1)
+        self.clock.now = 10
+        self.assertEqual(self.cache.lookup('a'), (1, HostCache.STALE))
+
+    def test_lookup_expired(self):
+        self.cache.store('a', 1)
+        self.clock.now = 15
+        self.assertEqual(self.cache.lookup('a'), (None, HostCache.MISS))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_store_evicts_least_recently_used(self):
+        self.cache.store('a', 1)
+        self.cache.store('b', 2)
+        self.cache.lookup('a')
+        self.cache.store('c', 3)
+        self.assertEqual(self.cache.lookup('b'), (None, HostCache.MISS))
+        self.assertEqual(self.cache.lookup('a'), (1, HostCache.FRESH))
+
+    def test_invalidate(self):
+        self.cache.store('a', 1)
+        self.cache.invalidate('a')
+        self.assertEqual(self.cache.lookup('a'), (None, HostCache.MISS))
+
+    def test_clear(self):
+        self.cache.store('a', 1)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_get_loads_once(self):
+        calls = []
+
+        def loader():
+            calls.append(None)
+            return 1
+
+        self.assertEqual(self.cache.get('a', loader), 1)
+        self.assertEqual(self.cache.get('a', loader), 1)
+        self.assertEqual(len(calls), 1)
+
+
+    def test_get_stale_refreshes_in_background(self):
+        self.cache.store('a', 1)
+        self.clock.now = 12
+        loaded = threading.Event()
+
+        def loader():
+            loaded.set()
+            return 2
+
+        self.assertEqual(self.cache.get('a', loader), 1)
+        self.assertTrue(loaded.wait(1))
+        for _ in range(100):
+            if self.cache.lookup('a')[0] == 2:
+                break
+            loaded.wait(0.01)
+        self.assertEqual(self.cache.lookup('a'), (2, HostCache.FRESH))
+
+    def test_get_invalidated_during_load(self):
+        def loader():
+            self.cache.invalidate('a')
+            return 1
+
+        self.assertEqual(self.cache.get('a', loader), 1)
+        self.assertEqual(self.cache.lookup('a'), (None, HostCache.MISS))
+
+
+class TestHostCacheAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def test_aget_loads_once(self):
+        cache = HostCache(10)
+        calls = []
+
+        async def loader():
+            calls.append(None)
+            return 1
+
+        self.assertEqual(await cache.aget('a', loader), 1)
+        self.assertEqual(await cache.aget('a', loader), 1)
+        self.assertEqual(len(calls), 1)
+
+    async def test_aget_stale_refresh_held(self):
+        clock = FakeClock()
+        cache = HostCache(10, stale_ttl=5, clock=clock)
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return 2
+
+        cache.store('a', 1)
+        clock.now = 12
+        self.assertEqual(await cache.aget('a', loader), 1)
+        # referenced until complete, so it cannot be garbage collected
+        self.assertEqual(len(cache._tasks), 1)
+        release.set()
+        await asyncio.gather(*cache._tasks)
+        await asyncio.sleep(0)
+        self.assertEqual(len(cache._tasks), 0)
+        self.assertEqual(cache.lookup('a'), (2, HostCache.FRESH))
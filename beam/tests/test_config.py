@@ -2,12 +2,15 @@
 from __future__ import unicode_literals
 import unittest
 import os
+import shutil
+import tempfile
 import six
 try:
     from unittest import mock
 except ImportError:
     import mock
 
+from beam import config as beam_config
 # noinspection PyProtectedMember
 from beam.config import Config, _DictConfigParser as DictConfigParser
 from beam.host import HostIdentity
@@ -22,6 +25,8 @@ def _config_path(name):
 _VALID_INI = _config_path('valid.ini')
 _IMPLICIT_DEFAULT_VENDOR_INI = _config_path('implicit_default_vendor.ini')
 _EXPLICIT_VENDOR_INI = _config_path('explicit_vendor.ini')
+_VENDOR_OPTIONS_INI = _config_path('vendor_options.ini')
+_TAGS_INI = _config_path('tags.ini')
 
 # invalid examples
 _EMPTY_INI = _config_path('empty.ini')
@@ -35,6 +40,9 @@ _MISSING_HOSTS_INI = _config_path('missing_hosts.ini')
 _MISSING_HOST_KEY_INI = _config_path('missing_host_key.ini')
 _MISSING_HOST_HASH_INI = _config_path('missing_host_hash.ini')
 _HOST_VENDOR_UNDEFINED_INI = _config_path('host_vendor_undefined.ini')
+_VENDOR_OPTION_UNKNOWN_INI = _config_path('vendor_option_unknown.ini')
+_VENDOR_OPTION_INVALID_INI = _config_path('vendor_option_invalid.ini')
+_VENDOR_OPTION_UNDEFINED_INI = _config_path('vendor_option_undefined.ini')
 
 
 class TestDictConfigParser(unittest.TestCase):
@@ -110,6 +118,17 @@ class TestConfig(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.config.find_host('unknown')
 
+    def test_select_identifier(self):
+        self.assertListEqual(self.config.select(self._HOST_A_KEY),
+                             [self._HOST_A])
+
+    def test_select_glob(self):
+        six.assertCountEqual(self, self.config.select('[ab]'), self._HOSTS)
+
+    def test_select_glob_no_match(self):
+        with self.assertRaises(ValueError):
+            self.config.select('c*')
+
     def test_from_ini_empty(self):
         with self.assertRaises(ValueError):
             Config.from_ini(_EMPTY_INI)
@@ -163,6 +182,33 @@ class TestConfig(unittest.TestCase):
             config.find_host(self._HOST_A_NAME).vendor,
             self._HOST_B_VENDOR)
 
+    def test_from_ini_vendor_options(self):
+        vendor = Config.from_ini(_VENDOR_OPTIONS_INI).find_host('a').vendor
+        self.assertEqual(vendor.endpoint, 'a_vendor_endpoint')
+        self.assertEqual(vendor.pool_size, 20)
+        self.assertFalse(vendor.keep_alive)
+        self.assertEqual(vendor.connect_timeout, 1.5)
+        self.assertEqual(vendor.timeout, 2.5)
+        self.assertEqual(vendor.retries, 3)
+        self.assertEqual(vendor.backoff, 0.5)
+        self.assertEqual(vendor.hedge_after, 0.25)
+        self.assertIsNone(vendor.breaker)
+        self.assertEqual(vendor.rate, 10)
+        self.assertEqual(vendor.max_in_flight, 4)
+
+    def test_from_ini_vendor_option_unknown(self):
+        with six.assertRaisesRegex(self, ValueError, 'Unknown option colour'):
+            Config.from_ini(_VENDOR_OPTION_UNKNOWN_INI)
+
+    def test_from_ini_vendor_option_invalid(self):
+        with six.assertRaisesRegex(self, ValueError, 'Invalid value for'):
+            Config.from_ini(_VENDOR_OPTION_INVALID_INI)
+
+    def test_from_ini_vendor_option_undefined(self):
+        with six.assertRaisesRegex(self, ValueError,
+                                   'Options specified for undefined vendor'):
+            Config.from_ini(_VENDOR_OPTION_UNDEFINED_INI)
+
     # @unittest.skip('Not implemented')
     # def test_resolve_in_pwd(self, mock_os, mock_path):
     #     # TODO implement
@@ -178,3 +224,149 @@ class TestConfig(unittest.TestCase):
         mock_path.isfile.return_value = False
         with self.assertRaises(RuntimeError):
             Config.resolve()
+
+
+class TestConfigSelect(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config.from_ini(_TAGS_INI)
+
+    def _select(self, pattern):
+        return [host.name for host in self.config.select(pattern)]
+
+    def test_is_pattern(self):
+        self.assertTrue(Config.is_pattern('nyc-*'))
+        self.assertTrue(Config.is_pattern('tag:web'))
+        self.assertTrue(Config.is_pattern('vendor:ramnode'))
+        self.assertFalse(Config.is_pattern('nyc-1'))
+
+    def test_tags(self):
+        self.assertEqual(self.config.find_host('nyc-1').tags,
+                         frozenset(['web', 'db']))
+        self.assertEqual(self.config.find_host('nyc-10').tags, frozenset())
+
+    def test_select_prefix(self):
+        self.assertListEqual(self._select('nyc-1*'), ['nyc-1', 'nyc-10'])
+
+    def test_select_substring(self):
+        self.assertListEqual(self._select('*-1*'),
+                             ['nyc-1', 'nyc-10', 'ams-1'])
+
+    def test_select_glob(self):
+        self.assertListEqual(self._select('nyc-?'), ['nyc-1', 'nyc-2'])
+        self.assertListEqual(self._select('?ms-[0-9]'), ['ams-1'])
+
+    def test_select_vendor(self):
+        self.assertListEqual(self._select('vendor:fliphost'), ['ams-1'])
+
+    def test_select_tag(self):
+        self.assertListEqual(self._select('tag:db'), ['nyc-1', 'ams-1'])
+
+    def test_select_unknown_tag(self):
+        with self.assertRaises(ValueError):
+            self.config.select('tag:cache')
+
+    def test_find_host_suggestions(self):
+        with six.assertRaisesRegex(self, ValueError, 'did you mean ams-1'):
+            self.config.find_host('ams1')
+
+
+class TestConfigSelectCompiled(TestConfigSelect):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': directory}):
+            Config.load(_TAGS_INI)
+            self.config = Config.load(_TAGS_INI)
+        self.assertEqual(self.config.__class__.__name__, '_CompiledConfig')
+
+
+class TestConfigCompiled(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch.dict(os.environ, {
+            'XDG_CACHE_HOME': os.path.join(self.directory, 'cache')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ini = os.path.join(self.directory, 'inventory.ini')
+        shutil.copy(_VENDOR_OPTIONS_INI, self.ini)
+
+    def test_cache_directory(self):
+        self.assertEqual(beam_config.cache_directory(),
+                         os.path.join(self.directory, 'cache', 'beam'))
+
+    def test_load_compiles(self):
+        Config.load(self.ini)
+        self.assertTrue(os.path.isfile(Config._compiled_path(self.ini)))
+
+    def test_load_uses_compiled(self):
+        expected = Config.load(self.ini)
+        with mock.patch.object(Config, 'from_ini') as from_ini:
+            config = Config.load(self.ini)
+        from_ini.assert_not_called()
+        six.assertCountEqual(self, config.hosts, expected.hosts)
+        vendor = config.find_host('a').vendor
+        self.assertEqual(vendor.endpoint, 'a_vendor_endpoint')
+        self.assertEqual(vendor.pool_size, 20)
+        self.assertFalse(vendor.keep_alive)
+        self.assertEqual(vendor.limiter.rate, 10)
+        self.assertEqual(vendor.limiter.limit, 4)
+
+    def test_load_compiled_find_host_fail(self):
+        Config.load(self.ini)
+        with self.assertRaises(ValueError):
+            Config.load(self.ini).find_host('unknown')
+
+    def test_load_compiled_identities_reused(self):
+        Config.load(self.ini)
+        config = Config.load(self.ini)
+        self.assertIs(config.find_host('a'), config.find_host('a_hash'))
+
+    def test_load_recompiles_on_change(self):
+        Config.load(self.ini)
+        with open(self.ini, 'a') as f:
+            f.write('\n[b]\nkey = b_key\nhash = b_hash\n')
+        self.assertEqual(Config.load(self.ini).find_host('b').key, 'b_key')
+        with mock.patch.object(Config, 'from_ini') as from_ini:
+            Config.load(self.ini)
+        from_ini.assert_not_called()
+
+    def test_load_corrupt_compiled(self):
+        Config.load(self.ini)
+        with open(Config._compiled_path(self.ini), 'wb') as f:
+            f.write(b'garbage')
+        self.assertEqual(Config.load(self.ini).find_host('a').key, 'a_key')
+
+    def test_load_unwritable_cache(self):
+        with mock.patch.object(Config, '_compile', side_effect=OSError):
+            self.assertEqual(Config.load(self.ini).find_host('a').key,
+                             'a_key')
+
+    def test_load_missing(self):
+        with self.assertRaises(ValueError):
+            Config.load(os.path.join(self.directory, 'missing.ini'))
+
+    def test_file_signature_changes(self):
+        signature = Config.file_signature(self.ini)
+        self.assertEqual(signature[0], os.path.abspath(self.ini))
+        self.assertEqual(Config.file_signature(self.ini), signature)
+        with open(self.ini, 'a') as f:
+            f.write('\n')
+        self.assertNotEqual(Config.file_signature(self.ini), signature)
+
+    def test_locate(self):
+        missing = os.path.join(self.directory, 'missing')
+        os.rename(self.ini, os.path.join(self.directory, '.beam.ini'))
+        with mock.patch.object(Config, '_PLACES', [missing, self.directory]):
+            self.assertEqual(Config.locate(),
+                             os.path.join(self.directory, '.beam.ini'))
+        with mock.patch.object(Config, '_PLACES', [missing]):
+            self.assertIsNone(Config.locate())
+
+    def test_import_light(self):
+        # the CLI loads the configuration module before deciding whether it
+        # needs requests
+        self.assertFalse(hasattr(beam_config, 'Vendor'))
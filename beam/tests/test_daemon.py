@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+from beam import daemon
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'beam.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _start(self, handler):
+        server = daemon.Daemon(self.path, handler)
+        thread = threading.Thread(target=server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_request(self):
+        self._start(lambda query: [query['host'], 'ok'])
+        self.assertListEqual(daemon.request({'host': 'nyc-1'}, self.path),
+                             ['nyc-1', 'ok'])
+
+    def test_request_no_daemon(self):
+        self.assertIsNone(daemon.request({'host': 'nyc-1'}, self.path))
+
+    def test_request_handler_error(self):
+        def handler(_):
+            raise KeyError('host')
+        self._start(handler)
+        with self.assertRaises(RuntimeError):
+            daemon.request({}, self.path)
+
+    def test_socket_private(self):
+        self._start(lambda query: None)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_already_running(self):
+        self._start(lambda query: None)
+        with self.assertRaises(RuntimeError):
+            daemon.Daemon(self.path, lambda query: None)
+
+    def test_stale_socket(self):
+        with open(self.path, 'w'):
+            pass
+        self._start(lambda query: 1)
+        self.assertEqual(daemon.request({}, self.path), 1)
+
+    def test_close_removes_socket(self):
+        server = daemon.Daemon(self.path, lambda query: None)
+        server.server_close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_default_socket_path(self):
+        # the same for every environment the current user runs beam in
+        with mock.patch.dict(os.environ, {'BEAM_SOCKET': '',
+                                          'XDG_RUNTIME_DIR': '/run'}):
+            self.assertEqual(daemon.default_socket_path(),
+                             '/tmp/beam-{0}/beam.sock'.format(os.getuid()))
+
+    def test_default_socket_path_override(self):
+        with mock.patch.dict(os.environ, {'BEAM_SOCKET': '/run/beam.sock'}):
+            self.assertEqual(daemon.default_socket_path(), '/run/beam.sock')
+
+    def test_creates_private_directory(self):
+        path = os.path.join(self.directory, 'beam', 'beam.sock')
+        server = daemon.Daemon(path, lambda query: None)
+        server.server_close()
+        self.assertEqual(
+            os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+
+    def test_request_declined(self):
+        self._start(lambda query: None)
+        self.assertIsNone(daemon.request({}, self.path))
+
+    def test_request_other_user(self):
+        self._start(lambda query: 1)
+        with mock.patch('beam.daemon.os.getuid',
+                        return_value=os.getuid() + 1):
+            self.assertIsNone(daemon.request({}, self.path))
+
+    def test_request_writable_directory(self):
+        self._start(lambda query: 1)
+        os.chmod(self.directory, 0o777)
+        self.assertIsNone(daemon.request({}, self.path))
+
+    def test_request_sticky_directory(self):
+        self._start(lambda query: 1)
+        os.chmod(self.directory, 0o1777)
+        self.assertEqual(daemon.request({}, self.path), 1)
+
+    def test_request_not_socket(self):
+        with open(self.path, 'w'):
+            pass
+        self.assertIsNone(daemon.request({}, self.path))
+
+    def test_writable_directory(self):
+        os.chmod(self.directory, 0o777)
+        with self.assertRaises(RuntimeError):
+            daemon.Daemon(self.path, lambda query: None)
+
+    def test_other_user_socket(self):
+        with open(self.path, 'w'):
+            pass
+        with mock.patch('beam.daemon.os.getuid',
+                        return_value=os.getuid() + 1):
+            with self.assertRaises(RuntimeError):
+                daemon.Daemon(self.path, lambda query: None)
+        self.assertTrue(os.path.exists(self.path))
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import responses
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from beam.diskcache import DiskCache
+from beam.host import Host
+from beam.tests.fake_clock import FakeClock
+from beam.tests.test_host import TestHost
+
+_HASH = TestHost.IDENTITY.hash
+_FIELDS = frozenset(Host.FIELDS)
+_BODY = TestHost._XML_VALID.encode('utf-8')
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.clock = FakeClock(1000.)
+        self.cache = DiskCache(30, self.directory, self.clock)
+
+    def test_invalid_ttl(self):
+        with self.assertRaises(ValueError):
+            DiskCache(0, self.directory)
+
+    def test_default_directory(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.directory}):
+            cache = DiskCache(30)
+        self.assertEqual(cache.directory,
+                         os.path.join(self.directory, 'beam', 'hosts'))
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_round_trip(self):
+        self.cache.store(_HASH, _FIELDS, _BODY)
+        self.assertEqual(self.cache.load(_HASH, _FIELDS), _BODY)
+
+    def test_shared_between_instances(self):
+        self.cache.store(_HASH, _FIELDS, _BODY)
+        other = DiskCache(30, self.directory, self.clock)
+        self.assertEqual(other.load(_HASH, _FIELDS), _BODY)
+
+    def test_expiry(self):
+        self.cache.store(_HASH, _FIELDS, _BODY)
+        self.clock.now += 29
+        self.assertIsNotNone(self.cache.load(_HASH, _FIELDS))
+        self.clock.now += 1
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_stored_in_future(self):
+        self.cache.store(_HASH, _FIELDS, _BODY)
+        self.clock.now -= 1
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_fields_subset(self):
+        self.cache.store(_HASH, ['memory', 'is_online'], _BODY)
+        self.assertEqual(self.cache.load(_HASH, frozenset(['memory'])), _BODY)
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_corrupt(self):
+        self.cache.store(_HASH, _FIELDS, _BODY)
+        with open(self.cache._path(_HASH), 'wb') as f:
+            f.write(b'\xff\x00')
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_invalidate(self):
+        self.cache.store(_HASH, _FIELDS, _BODY)
+        self.cache.invalidate(_HASH)
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+        # absent entries are ignored
+        self.cache.invalidate(_HASH)
+
+    def test_store_after_invalidate(self):
+        # a response requested before an invalidation may describe the state
+        # the invalidation discarded
+        started = self.cache.time()
+        self.clock.now += 1
+        self.cache.invalidate(_HASH)
+        self.clock.now += 1
+        self.cache.store(_HASH, _FIELDS, _BODY, started)
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_store_after_clear(self):
+        started = self.cache.time()
+        self.cache.clear()
+        self.cache.store(_HASH, _FIELDS, _BODY, started)
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_store_requested_after_invalidate(self):
+        self.cache.invalidate(_HASH)
+        self.clock.now += 1
+        self.cache.store(_HASH, _FIELDS, _BODY, self.cache.time())
+        self.assertEqual(self.cache.load(_HASH, _FIELDS), _BODY)
+
+    def test_invalidate_during_store(self):
+        started = self.cache.time()
+        replace = os.replace
+
+        def invalidate_after(source, destination):
+            replace(source, destination)
+            # lands just after the entry is written
+            self.cache.invalidate(_HASH)
+
+        with mock.patch('beam.diskcache.os.replace', invalidate_after):
+            self.cache.store(_HASH, _FIELDS, _BODY, started)
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_invalidate_shared_between_instances(self):
+        started = self.cache.time()
+        DiskCache(30, self.directory, self.clock).invalidate(_HASH)
+        self.cache.store(_HASH, _FIELDS, _BODY, started)
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+
+    def test_clear(self):
+        self.cache.store(_HASH, _FIELDS, _BODY)
+        self.cache.store('other-hash', _FIELDS, _BODY)
+        self.cache.clear()
+        self.assertIsNone(self.cache.load(_HASH, _FIELDS))
+        self.assertIsNone(self.cache.load('other-hash', _FIELDS))
+
+    def test_clear_missing_directory(self):
+        DiskCache(30, os.path.join(self.directory, 'missing')).clear()
+
+    def test_concurrent_writers(self):
+        bodies = [_BODY * i for i in range(1, 5)]
+        loaded = []
+
+        def write(body):
+            for _ in range(50):
+                self.cache.store(_HASH, _FIELDS, body)
+                loaded.append(self.cache.load(_HASH, _FIELDS))
+
+        threads = [threading.Thread(target=write, args=(body,))
+                   for body in bodies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # readers only ever see complete entries
+        self.assertTrue(set(loaded) <= set(bodies))
+        self.assertListEqual([name for name in os.listdir(self.directory)
+                              if not name.endswith('.info')], [])
+
+
+class TestHostDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        Host.disk_cache = DiskCache(30, directory)
+        self.addCleanup(setattr, Host, 'disk_cache', None)
+
+    @responses.activate
+    def test_request_from_identity(self):
+        TestHost.add_response()
+        first = Host.request_from_identity(TestHost.IDENTITY)
+        second = Host.request_from_identity(TestHost.IDENTITY, ['memory'])
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(second.memory, first.memory)
+        self.assertIsNone(second.storage)
+
+    @responses.activate
+    def test_request_from_identity_uncached(self):
+        TestHost.add_response()
+        Host.request_from_identity(TestHost.IDENTITY)
+        Host.request_from_identity(TestHost.IDENTITY, cached=False)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_failure_not_cached(self):
+        TestHost.add_response(status=500)
+        TestHost.add_response()
+        with self.assertRaises(RuntimeError):
+            Host.request_from_identity(TestHost.IDENTITY)
+        Host.request_from_identity(TestHost.IDENTITY)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_action_during_request(self):
+        def respond(_):
+            # another thread or process acts on the host meanwhile
+            Host._invalidate(TestHost.IDENTITY)
+            return 200, {}, TestHost._XML_VALID
+
+        responses.add_callback(
+            responses.GET,
+            TestHost._VENDOR_ENDPOINT + '/api/client/command.php',
+            callback=respond)
+        Host.request_from_identity(TestHost.IDENTITY)
+        self.assertIsNone(Host.disk_cache.load(_HASH, _FIELDS))
+
+    @responses.activate
+    def test_action_invalidates(self):
+        TestHost.add_response()
+        TestHost.add_response(responses.POST,
+                              body='<status>success</status>')
+        Host.request_from_identity(TestHost.IDENTITY)
+        Host.action_on_identity(TestHost.IDENTITY, 'reboot')
+        self.assertIsNone(Host.disk_cache.load(_HASH, _FIELDS))
+
+
+class TestHostDiskCacheAsync(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        Host.disk_cache = DiskCache(30, directory)
+        self.addCleanup(setattr, Host, 'disk_cache', None)
+
+    async def test_arequest_from_identity(self):
+        Host.disk_cache.store(_HASH, _FIELDS, _BODY)
+        transport = mock.Mock()
+        host = await Host.arequest_from_identity(TestHost.IDENTITY, transport)
+        self.assertEqual(host.fqdn, TestHost.HOST.fqdn)
+        transport.request.assert_not_called()
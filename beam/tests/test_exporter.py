@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+import requests
+
+from beam import exporter, instrument
+from beam.exporter import Exporter, ExporterServer, Histogram
+from beam.host import Host, HostIdentity
+from beam.resource import Resource
+from beam.vendor import Vendor
+
+_VENDOR = Vendor('ramnode', 'https://vpscp.ramnode.com')
+_IDENTITIES = [HostIdentity('nyc-1', 'key-1', 'hash-1', _VENDOR),
+               HostIdentity('ams-"1"', 'key-2', 'hash-2', _VENDOR)]
+
+
+def _fetch(identity, previous=None):
+    if identity is _IDENTITIES[1]:
+        raise RuntimeError('unreachable')
+    return Host(identity, 'nyc-1.example.com', '192.0.2.1', True,
+                Resource(25, 75), None, None, [])
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_invalid_buckets(self):
+        with self.assertRaises(ValueError):
+            Histogram('h', 'help', buckets=(1, 0.5))
+
+    def test_invalid_labels(self):
+        with self.assertRaises(ValueError):
+            Histogram('h', 'help', ['vendor']).observe(1)
+
+    def test_render(self):
+        histogram = Histogram('h', 'A histogram.', ['vendor'], (0.1, 1))
+        histogram.observe(0.05, 'a')
+        histogram.observe(0.5, 'a')
+        histogram.observe(2, 'a')
+        self.assertListEqual(histogram.render(), [
+            '# HELP h A histogram.',
+            '# TYPE h histogram',
+            'h_bucket{vendor="a",le="0.1"} 1',
+            'h_bucket{vendor="a",le="1"} 2',
+            'h_bucket{vendor="a",le="+Inf"} 3',
+            'h_sum{vendor="a"} 2.55',
+            'h_count{vendor="a"} 3'])
+
+    def test_render_bucket_bound_inclusive(self):
+        histogram = Histogram('h', 'help', buckets=(1,))
+        histogram.observe(1)
+        self.assertIn('h_bucket{le="1"} 1', histogram.render())
+
+
+class TestExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = Exporter(identities=_IDENTITIES)
+        patcher = mock.patch.object(Host, 'request_from_identity',
+                                    side_effect=_fetch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render_empty(self):
+        metrics = self.exporter.render()
+        self.assertNotIn('beam_online', metrics)
+        self.assertIn('beam_scrape_duration_seconds_count 1', metrics)
+
+    def test_render(self):
+        self.exporter.poller.poll()
+        lines = self.exporter.render().splitlines()
+        labels = '{host="nyc-1",vendor="ramnode"}'
+        self.assertIn('# TYPE beam_online gauge', lines)
+        self.assertIn('beam_online' + labels + ' 1', lines)
+        self.assertIn('beam_memory_used_bytes' + labels + ' 25', lines)
+        self.assertIn('beam_memory_total_bytes' + labels + ' 100', lines)
+        self.assertIn('beam_memory_used_ratio' + labels + ' 0.25', lines)
+        self.assertIn('beam_poll_success' + labels + ' 1', lines)
+        # resources that were not retrieved are omitted
+        self.assertFalse(any(line.startswith('beam_storage')
+                             for line in lines))
+
+    def test_render_failed_host(self):
+        self.exporter.poller.poll()
+        lines = self.exporter.render().splitlines()
+        self.assertIn('beam_poll_success{host="ams-\\"1\\"",'
+                      'vendor="ramnode"} 0', lines)
+        self.assertFalse(any(line.startswith('beam_online{host="ams')
+                             for line in lines))
+
+    def test_upstream_latency(self):
+        def fetch(identity, previous=None):
+            # as emitted when a request is made
+            with instrument.span(instrument.FETCH, host=identity.name,
+                                 vendor=identity.vendor.name):
+                return _fetch(identity, previous)
+
+        with mock.patch.object(Host, 'request_from_identity',
+                               side_effect=fetch):
+            self.exporter.poller.poll()
+        self.assertIn('beam_upstream_request_duration_seconds_count'
+                      '{vendor="ramnode"} 2', self.exporter.render())
+
+    def test_upstream_latency_cached(self):
+        # hosts from a cache make no request
+        self.exporter.poller.poll()
+        self.assertNotIn('beam_upstream_request_duration_seconds_count',
+                         self.exporter.render())
+
+    def test_upstream_latency_other_thread(self):
+        def request():
+            with instrument.span(instrument.FETCH, vendor='ramnode'):
+                pass
+
+        def fetch(identity, previous=None):
+            # a request made elsewhere while this host is being retrieved
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join()
+            return _fetch(identity, previous)
+
+        with mock.patch.object(Host, 'request_from_identity',
+                               side_effect=fetch):
+            self.exporter.poller.poll()
+        self.assertNotIn('beam_upstream_request_duration_seconds_count',
+                         self.exporter.render())
+
+    def test_start_does_not_wait(self):
+        with mock.patch.object(self.exporter.poller, 'poll') as poll, \
+                mock.patch.object(self.exporter.poller, 'start') as start:
+            self.exporter.start()
+        poll.assert_not_called()
+        start.assert_called_once_with()
+
+    def test_server(self):
+        self.exporter.poller.poll()
+        server = ExporterServer(('127.0.0.1', 0), self.exporter)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+        url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+
+        response = requests.get(url + '/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'],
+                         exporter.CONTENT_TYPE)
+        self.assertIn('beam_online{host="nyc-1",vendor="ramnode"} 1',
+                      response.text)
+        self.assertEqual(requests.get(url + '/').status_code, 404)
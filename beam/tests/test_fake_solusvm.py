@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import time
+import unittest
+import requests
+
+from beam.tests.fake_solusvm import FakeSolusVM
+
+
+class TestFakeSolusVM(unittest.TestCase):
+
+    def _get(self, server):
+        return requests.get(server.url + FakeSolusVM.ENDPOINT,
+                            params={'hash': 'hash', 'action': 'info'})
+
+    def test_info(self):
+        with FakeSolusVM() as server:
+            server.bodies['hash'] = '<status>success</status>'
+            response = self._get(server)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, '<status>success</status>')
+
+    def test_latency(self):
+        with FakeSolusVM(latency=0.05, jitter=0.05) as server:
+            start = time.monotonic()
+            self._get(server)
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_error_rate(self):
+        with FakeSolusVM(error_rate=1) as server:
+            self.assertEqual(self._get(server).status_code, 503)
+        self.assertEqual(len(server.requests), 1)
+
+    def test_seeded(self):
+        statuses = []
+        for _ in range(2):
+            with FakeSolusVM(error_rate=0.5, seed=1) as server:
+                statuses.append([self._get(server).status_code
+                                 for _ in range(10)])
+        self.assertEqual(statuses[0], statuses[1])
+        self.assertEqual(set(statuses[0]), set([200, 503]))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+import time
+import unittest
+
+from beam import fleet
+from beam.host import HostIdentity
+from beam.vendor import Vendor
+
+
+_VENDOR_A = Vendor('a', 'https://a.example.com')
+_VENDOR_B = Vendor('b', 'https://b.example.com')
+
+
+class TestFleet(unittest.TestCase):
+
+    _VENDOR_A = _VENDOR_A
+    _VENDOR_B = _VENDOR_B
+    _IDENTITIES = [HostIdentity('host-{0}'.format(i),
+                                'key-{0}'.format(i),
+                                'hash-{0}'.format(i),
+                                _VENDOR_A if i % 3 else _VENDOR_B)
+                   for i in range(12)]
+
+    def test_as_completed_no_workers(self):
+        with self.assertRaises(ValueError):
+            list(fleet.as_completed(lambda i: i, self._IDENTITIES, workers=0))
+
+    def test_as_completed_invalid_per_vendor(self):
+        with self.assertRaises(ValueError):
+            list(fleet.as_completed(lambda i: i, self._IDENTITIES,
+                                    per_vendor=0))
+
+    def test_map_identities_order(self):
+        def func(identity):
+            # finish in reverse order
+            time.sleep(0.001 * (12 - int(identity.key.split('-')[1])))
+            return identity.name
+
+        self.assertListEqual(
+            fleet.map_identities(func, self._IDENTITIES, workers=6),
+            [identity.name for identity in self._IDENTITIES])
+
+    def test_map_identities_per_vendor(self):
+        lock = threading.Lock()
+        in_flight = {self._VENDOR_A: 0, self._VENDOR_B: 0}
+        peaks = dict(in_flight)
+
+        def func(identity):
+            with lock:
+                in_flight[identity.vendor] += 1
+                peaks[identity.vendor] = max(peaks[identity.vendor],
+                                             in_flight[identity.vendor])
+            time.sleep(0.005)
+            with lock:
+                in_flight[identity.vendor] -= 1
+
+        fleet.map_identities(func, self._IDENTITIES, workers=8, per_vendor=2)
+        self.assertLessEqual(peaks[self._VENDOR_A], 2)
+        self.assertLessEqual(peaks[self._VENDOR_B], 2)
+
+    def test_map_identities_raises(self):
+        def func(identity):
+            if identity.name == 'host-4':
+                raise RuntimeError('failed')
+            return identity.name
+
+        with self.assertRaises(RuntimeError):
+            fleet.map_identities(func, self._IDENTITIES)
+
+    def test_map_identities_return_exceptions(self):
+        error = RuntimeError('failed')
+
+        def func(identity):
+            if identity.name == 'host-4':
+                raise error
+            return identity.name
+
+        results = fleet.map_identities(func, self._IDENTITIES,
+                                       return_exceptions=True)
+        self.assertIs(results[4], error)
+        self.assertEqual(results[5], 'host-5')
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from beam.history import History, Reading
+from beam.host import Host
+from beam.resource import Resource
+from beam.tests.test_host import TestHost
+
+
+def _host(free_bytes, is_online=True):
+    return Host(TestHost.IDENTITY, None, None, is_online, None, None,
+                Resource(1000 - free_bytes, free_bytes), None)
+
+
+class TestHistory(unittest.TestCase):
+
+    _HASH = TestHost.IDENTITY.hash
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.history = History(self.directory)
+
+    def _fill(self, times, free_bytes=None):
+        for i, at in enumerate(times):
+            self.history.append(_host(1000 - i if free_bytes is None
+                                      else free_bytes[i]), at)
+
+    def test_invalid_retention(self):
+        with self.assertRaises(ValueError):
+            History(self.directory, 0)
+
+    def test_no_history(self):
+        self.assertListEqual(self.history.range(self._HASH), [])
+
+    def test_round_trip(self):
+        self.history.append(TestHost.HOST, 10)
+        self.history.append(_host(5, None), 20)
+        self.assertListEqual(self.history.range(self._HASH), [
+            Reading(10, True, TestHost.HOST.memory, TestHost.HOST.storage,
+                    TestHost.HOST.bandwidth),
+            Reading(20, None, None, None, Resource(995, 5))])
+
+    def test_range(self):
+        self._fill(range(10))
+        self.assertListEqual(
+            [reading.time for reading in self.history.range(self._HASH, 3, 6)],
+            [3, 4, 5])
+
+    def test_range_ignores_partial_record(self):
+        self._fill(range(2))
+        with open(self.history._path(self._HASH), 'ab') as f:
+            f.write(b'\0\0\0')
+        self.assertEqual(len(self.history.range(self._HASH)), 2)
+
+    def test_not_history_file(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.history._path(self._HASH), 'wb') as f:
+            f.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            self.history.range(self._HASH)
+
+    def test_downsample(self):
+        self._fill([0, 1, 2, 10, 11, 35])
+        self.assertListEqual(
+            [reading.time for reading in
+             self.history.downsample(self._HASH, 0, 40, 10)],
+            [2, 11, 35])
+
+    def test_downsample_invalid_step(self):
+        with self.assertRaises(ValueError):
+            self.history.downsample(self._HASH, 0, 10, 0)
+
+    def test_forecast(self):
+        self._fill([0, 10, 20], [300, 200, 100])
+        self.assertAlmostEqual(self.history.forecast(self._HASH), 30)
+
+    def test_forecast_not_consumed(self):
+        self._fill([0, 10], [100, 100])
+        self.assertIsNone(self.history.forecast(self._HASH))
+
+    def test_forecast_too_few_readings(self):
+        self._fill([0])
+        self.assertIsNone(self.history.forecast(self._HASH))
+
+    def test_forecast_unknown_resource(self):
+        with self.assertRaises(ValueError):
+            self.history.forecast(self._HASH, 'fqdn')
+
+    def test_compact(self):
+        self._fill(range(10))
+        self.assertEqual(self.history.compact(5, now=10), 5)
+        self.assertListEqual(
+            [reading.time for reading in self.history.range(self._HASH)],
+            [5, 6, 7, 8, 9])
+        self._fill([10])
+        self.assertEqual(len(self.history.range(self._HASH)), 6)
+
+    def test_compact_everything(self):
+        self._fill(range(3))
+        self.assertEqual(self.history.compact(5, now=100), 3)
+        self.assertListEqual(os.listdir(self.directory), [])
+
+    def test_append_compacts(self):
+        history = History(self.directory, 10)
+        for at in range(15):
+            history.append(_host(5), at)
+        # not yet half a retention period beyond
+        self.assertEqual(len(history.range(self._HASH)), 15)
+        history.append(_host(5), 16)
+        self.assertListEqual(
+            [reading.time for reading in history.range(self._HASH)],
+            list(range(6, 15)) + [16])
+
+    def test_append_no_retention(self):
+        self._fill(range(100))
+        self.assertEqual(len(self.history.range(self._HASH)), 100)
+
+    def test_compact_no_retention(self):
+        with self.assertRaises(ValueError):
+            self.history.compact()
@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+import threading
+import time
 import unittest
+import six
 from mock import patch
 import responses
 
+from beam import wait
+from beam.cache import HostCache
 from beam.resource import Resource
 from beam.host import Host, HostIdentity
 from beam.vendor import Vendor
@@ -114,6 +119,33 @@ class TestHost(unittest.TestCase):
             self.host.shutdown()
         action.assert_called_once_with('shutdown')
 
+    def test_reboot_wait(self):
+        with patch.object(Host, 'action'), \
+                patch('beam.wait.wait_until') as wait_until:
+            self.host.reboot(wait=True, timeout=60)
+        wait_until.assert_called_once_with([self.host], ('offline', 'online'),
+                                           60)
+
+    @responses.activate
+    def test_reboot_wait_for_restart(self):
+        # still reported online just after the reboot is accepted
+        for status in ['online', 'online', 'offline', 'offline', 'online']:
+            self.add_response(body=self._XML.format(
+                '', 'success', self._FQDN, self._PRIMARY_IP, status))
+        self.add_response(responses.POST, body='<status>success</status>')
+        waiter = wait.Waiter(0.001, 0.001)
+        with patch.object(wait, '_waiter', waiter):
+            self.host.reboot(wait=True, timeout=5)
+        polls = [call for call in responses.calls
+                 if call.request.method == 'GET']
+        self.assertEqual(len(polls), 5)
+
+    def test_shutdown_wait(self):
+        with patch.object(Host, 'action_on_identity'), \
+                patch('beam.wait.wait_until') as wait_until:
+            self.host.action('shutdown', wait=True)
+        wait_until.assert_called_once_with([self.host], 'offline', 300)
+
     @responses.activate
     def test_request_from_identity_denied(self):
         self.add_response(status=403)
@@ -130,6 +162,126 @@ class TestHost(unittest.TestCase):
         self.assertEqual(Host.request_from_identity(self.IDENTITY),
                          self.host)
 
+    @responses.activate
+    def test_request_from_identity_charset(self):
+        responses.add(
+            responses.GET,
+            self._VENDOR_ENDPOINT + '/api/client/command.php',
+            status=200,
+            body=self._XML_VALID.replace(self._FQDN, 'h\xf4te.example.com')
+            .encode('latin-1'),
+            content_type='text/xml; charset=ISO-8859-1')
+        self.assertEqual(Host.request_from_identity(self.IDENTITY).fqdn,
+                         'h\xf4te.example.com')
+
+    @responses.activate
+    def test_request_from_identity_cached(self):
+        self.add_response()
+        with patch.object(Host, 'cache', HostCache(60)):
+            Host.request_from_identity(self.IDENTITY)
+            Host.request_from_identity(self.IDENTITY)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_request_from_identity_uncached(self):
+        self.add_response()
+        with patch.object(Host, 'cache', HostCache(60)):
+            Host.request_from_identity(self.IDENTITY)
+            Host.request_from_identity(self.IDENTITY, cached=False)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_request_from_identity_coalesced(self):
+        self.add_response()
+        release = threading.Event()
+        get = self.IDENTITY.vendor.get
+
+        def slow_get(*args, **kwargs):
+            release.wait(5)
+            return get(*args, **kwargs)
+
+        with patch.object(self.IDENTITY.vendor, 'get',
+                          side_effect=slow_get) as mock_get:
+            threads = [threading.Thread(target=Host.request_from_identity,
+                                        args=(self.IDENTITY,))
+                       for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.05)
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(mock_get.call_count, 1)
+
+    @responses.activate
+    def test_action_invalidates_cache(self):
+        self.add_response()
+        self.add_response(verb=responses.POST,
+                          body='<status>success</status>')
+        with patch.object(Host, 'cache', HostCache(60)):
+            host = Host.request_from_identity(self.IDENTITY)
+            host.reboot()
+            self.assertEqual(len(Host.cache), 0)
+            Host.request_from_identity(self.IDENTITY)
+        self.assertEqual(len(responses.calls), 3)
+
+    @responses.activate
+    def test_request_from_identity_fields(self):
+        self.add_response()
+        host = Host.request_from_identity(self.IDENTITY, ['memory'])
+        query = responses.calls[0].request.params
+        self.assertEqual(query['mem'], 'true')
+        for flag in ['ipaddr', 'hdd', 'bw', 'status']:
+            self.assertNotIn(flag, query)
+        self.assertEqual(host.memory, Resource(300, 300))
+        self.assertIsNone(host.storage)
+        self.assertEqual(host.fields, frozenset(['memory']))
+
+    def test_request_from_identity_unknown_field(self):
+        with self.assertRaises(ValueError):
+            Host.request_from_identity(self.IDENTITY, ['fqdn'])
+
+    @responses.activate
+    def test_request_from_identity_cached_fields(self):
+        self.add_response()
+        with patch.object(Host, 'cache', HostCache(60)):
+            Host.request_from_identity(self.IDENTITY, ['memory'])
+            Host.request_from_identity(self.IDENTITY, ['memory'])
+            self.assertEqual(len(responses.calls), 1)
+            # a partial host cannot satisfy a request for more
+            Host.request_from_identity(self.IDENTITY)
+            self.assertEqual(len(responses.calls), 2)
+            Host.request_from_identity(self.IDENTITY, ['storage'])
+            self.assertEqual(len(responses.calls), 2)
+
+    def test_fields_for(self):
+        self.assertEqual(
+            Host.fields_for(['memory.free_bytes', 'is_offline', 'fqdn']),
+            frozenset(['memory', 'is_online']))
+
+    def test_fields_for_none(self):
+        self.assertEqual(Host.fields_for([]), frozenset())
+
+    def test_is_offline_unknown(self):
+        self.assertIsNone(self._make_host(is_online=None).is_offline)
+
+    def test_from_response_fields(self):
+        host = Host.from_response('<status>success</status>'
+                                  '<hostname>a</hostname>'
+                                  '<ipaddress>b</ipaddress>'
+                                  '<vmstat>offline</vmstat>',
+                                  self.IDENTITY, ['is_online'])
+        self.assertFalse(host.is_online)
+        self.assertIsNone(host.memory)
+        self.assertIsNone(host.ip_addresses)
+
+    def test_from_response_fields_missing(self):
+        with self.assertRaises(ValueError):
+            Host.from_response('<status>success</status>'
+                               '<hostname>a</hostname>'
+                               '<ipaddress>b</ipaddress>',
+                               self.IDENTITY, ['memory'])
+
     def test_is_offline_false(self):
         self.assertFalse(self.host.is_offline)
 
@@ -163,6 +315,90 @@ class TestHost(unittest.TestCase):
             Host.from_response(self._XML_VALID, self.IDENTITY),
             self.host)
 
+    def test_from_response_bytes(self):
+        host = Host.from_response(self._XML_VALID.encode('utf-8'),
+                                  self.IDENTITY)
+        self.assertEqual(host.fqdn, self._FQDN)
+        self.assertEqual(host.ip_addresses, self._IP_ADDRESSES)
+
+    def test_from_response_chunks(self):
+        body = self._XML_VALID.encode('utf-8')
+        host = Host.from_response(iter([body[:7], body[7:50], body[50:]]),
+                                  self.IDENTITY)
+        self.assertEqual(host.primary_ip, self._PRIMARY_IP)
+        self.assertEqual(host.storage, Resource(100, 100))
+
+    def test_from_response_malformed_chunks(self):
+        with self.assertRaises(ValueError):
+            Host.from_response(iter([b'<status>', b'</hostname>']),
+                               self.IDENTITY)
+
+    def test_from_response_api_failure_message(self):
+        with six.assertRaisesRegex(self, RuntimeError, 'Invalid key'):
+            Host.from_response('<status>error</status>'
+                               '<statusmsg>Invalid key</statusmsg>',
+                               self.IDENTITY)
+
+    def test_from_response_nested_ignored(self):
+        host = Host.from_response(
+            '<extra><hostname>nested</hostname></extra>' + self._XML_VALID,
+            self.IDENTITY)
+        self.assertEqual(host.fqdn, self._FQDN)
+
+    def test_from_response_entities(self):
+        host = Host.from_response(
+            self._XML_VALID.replace(self._FQDN, 'a&amp;b'), self.IDENTITY)
+        self.assertEqual(host.fqdn, 'a&b')
+
+    def test_from_response_unchanged(self):
+        previous = Host.from_response(self._XML_VALID, self.IDENTITY)
+        with patch.object(Host, '_parse_fields') as parse:
+            host = Host.from_response(self._XML_VALID.encode('utf-8'),
+                                      self.IDENTITY, previous=previous)
+        self.assertIs(host, previous)
+        parse.assert_not_called()
+
+    def test_from_response_changed(self):
+        previous = Host.from_response(self._XML_VALID, self.IDENTITY)
+        host = Host.from_response(self._XML_VALID.replace('online', 'offline'),
+                                  self.IDENTITY, previous=previous)
+        self.assertIsNot(host, previous)
+        self.assertFalse(host.is_online)
+
+    def test_from_response_unchanged_other_fields(self):
+        previous = Host.from_response(self._XML_VALID, self.IDENTITY,
+                                      ['memory'])
+        host = Host.from_response(self._XML_VALID, self.IDENTITY,
+                                  previous=previous)
+        self.assertIsNot(host, previous)
+        self.assertIsNotNone(host.storage)
+
+    def test_from_response_unchanged_other_identity(self):
+        previous = Host.from_response(self._XML_VALID, self.IDENTITY)
+        identity = HostIdentity(self.IDENTITY.name, self.IDENTITY.key,
+                                self.IDENTITY.hash, self.IDENTITY.vendor,
+                                ['web'])
+        host = Host.from_response(self._XML_VALID, identity,
+                                  previous=previous)
+        self.assertIsNot(host, previous)
+        self.assertEqual(host.tags, frozenset(['web']))
+
+    def test_from_response_chunks_not_fingerprinted(self):
+        body = self._XML_VALID.encode('utf-8')
+        self.assertIsNone(Host.from_response(iter([body]),
+                                             self.IDENTITY).fingerprint)
+
+    def test_diff(self):
+        previous = self._make_host(is_online=False, memory=Resource(50, 150),
+                                   bandwidth=None)
+        self.assertDictEqual(self.host.diff(previous), {
+            'is_online': (False, True),
+            'memory': (Resource(50, 150), self._MEMORY)})
+
+    def test_diff_unchanged(self):
+        self.assertDictEqual(self.host.diff(self._make_host()), {})
+        self.assertDictEqual(self.host.diff(self.host), {})
+
     def test_str(self):
         self.assertEqual(str(self.host),
                          '{0}({1})'.format(Host.__name__, self._FQDN))
@@ -1,21 +1,143 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, division
+import os
+import shutil
+import tempfile
 import unittest
 import responses
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 import beam
+from beam.config import Config
+from beam.host import Host
 from beam.tests.test_host import TestHost
 
 
 class TestInit(unittest.TestCase):
 
+    def setUp(self):
+        # keep compiled inventories out of the user's cache directory
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        patcher = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': directory})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @responses.activate
     def test_host(self):
         TestHost.add_response()
         self.assertEqual(beam.host(TestHost.IDENTITY.name),
                          TestHost.HOST)
 
+    @responses.activate
+    def test_stats(self):
+        TestHost.add_response()
+        beam.instrument.collector.reset()
+        vendor = beam.host(TestHost.IDENTITY.name).vendor.name
+        stats = beam.stats()
+        self.assertEqual(set(stats), set([('fetch', vendor),
+                                          ('request', vendor),
+                                          ('parse', vendor)]))
+        self.assertEqual(stats['fetch', vendor].count, 1)
+        self.assertEqual(stats['fetch', vendor].errors, 0)
+
     @responses.activate
     def test_hosts(self):
         TestHost.add_response()
         self.assertEqual(beam.hosts(), [TestHost.HOST])
+
+    @responses.activate
+    def test_hosts_return_exceptions(self):
+        TestHost.add_response(status=500)
+        results = beam.hosts(return_exceptions=True)
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0], RuntimeError)
+
+    def test_enable_cache(self):
+        self.addCleanup(beam.disable_cache)
+        cache = beam.enable_cache(30, max_size=5, stale_ttl=10)
+        self.assertIs(Host.cache, cache)
+        self.assertEqual(cache.max_size, 5)
+
+    def test_disable_cache(self):
+        beam.enable_cache(30)
+        beam.disable_cache()
+        self.assertIsNone(Host.cache)
+
+    def test_get_config_resolves_once(self):
+        self.addCleanup(beam.configure, None)
+        beam.configure(None)
+        with mock.patch.object(Config, 'resolve',
+                               return_value=mock.sentinel.config) as resolve:
+            self.assertIs(beam._get_config(), mock.sentinel.config)
+            self.assertIs(beam._get_config(), mock.sentinel.config)
+        resolve.assert_called_once_with()
+
+    def test_configure_path(self):
+        self.addCleanup(beam.configure, None)
+        path = os.path.join(os.path.dirname(__file__), 'configs', 'valid.ini')
+        config = beam.configure(path)
+        self.assertIs(beam._get_config(), config)
+        self.assertEqual(config.find_host('nyc-1').key, 'nyc-1_key')
+
+    def test_configure_config(self):
+        self.addCleanup(beam.configure, None)
+        config = Config([TestHost.IDENTITY])
+        beam.configure(config)
+        self.assertIs(beam._get_config(), config)
+
+    @responses.activate
+    def test_actions(self):
+        TestHost.add_response(verb=responses.POST,
+                              body='<status>success</status>')
+        report = beam.actions([TestHost.IDENTITY.name], 'boot')
+        self.assertTrue(report.ok)
+
+    def test_actions_undefined_host(self):
+        with self.assertRaises(ValueError):
+            beam.actions(['undefined'], 'boot')
+
+    def test_identities_all(self):
+        self.assertListEqual(beam.identities(), [TestHost.IDENTITY])
+
+    def test_identities_deduplicated(self):
+        self.assertListEqual(beam.identities(['host-*', 'host-name']),
+                             [TestHost.IDENTITY])
+
+    @responses.activate
+    def test_enable_history(self):
+        self.addCleanup(beam.disable_history)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        history = beam.enable_history(directory)
+        self.assertIs(Host.history, history)
+        TestHost.add_response()
+        host = beam.host(TestHost.IDENTITY.name)
+        readings = history.range(TestHost.IDENTITY.hash)
+        self.assertEqual(len(readings), 1)
+        self.assertEqual(readings[0].memory, host.memory)
+
+    def test_disable_history(self):
+        beam.enable_history(tempfile.gettempdir())
+        beam.disable_history()
+        self.assertIsNone(Host.history)
+
+    @responses.activate
+    def test_enable_disk_cache(self):
+        self.addCleanup(beam.disable_disk_cache)
+        cache = beam.enable_disk_cache(30)
+        self.assertIs(Host.disk_cache, cache)
+        self.assertTrue(cache.directory.startswith(os.environ[
+            'XDG_CACHE_HOME']))
+        TestHost.add_response()
+        beam.host(TestHost.IDENTITY.name)
+        beam.host(TestHost.IDENTITY.name)
+        self.assertEqual(len(responses.calls), 1)
+
+    def test_disable_disk_cache(self):
+        beam.enable_disk_cache(30)
+        beam.disable_disk_cache()
+        self.assertIsNone(Host.disk_cache)
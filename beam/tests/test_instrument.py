@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import unittest
+
+from beam import instrument
+from beam.instrument import Collector, Span
+
+
+class TestSpan(unittest.TestCase):
+
+    def setUp(self):
+        self.spans = []
+        instrument.add_listener(self.spans.append)
+        self.addCleanup(instrument.remove_listener, self.spans.append)
+
+    def test_span(self):
+        with instrument.span(instrument.FETCH, host='nyc-1') as span:
+            span.attributes['status'] = 200
+        self.assertEqual(self.spans, [span])
+        self.assertEqual(span.attributes, {'host': 'nyc-1', 'status': 200})
+        self.assertGreaterEqual(span.duration, 0)
+        self.assertFalse(span.failed)
+
+    def test_span_error(self):
+        with self.assertRaises(RuntimeError):
+            with instrument.span(instrument.PARSE):
+                raise RuntimeError('malformed')
+        self.assertIsInstance(self.spans[0].error, RuntimeError)
+        self.assertTrue(self.spans[0].failed)
+
+    def test_span_error_status(self):
+        with instrument.span(instrument.REQUEST, status=503):
+            pass
+        self.assertTrue(self.spans[0].failed)
+
+    def test_listener_error_ignored(self):
+        def broken(_):
+            raise ValueError()
+
+        instrument.add_listener(broken)
+        self.addCleanup(instrument.remove_listener, broken)
+        with instrument.span(instrument.ACTION):
+            pass
+        self.assertEqual(len(self.spans), 1)
+
+    def test_remove_listener_unknown(self):
+        with self.assertRaises(ValueError):
+            instrument.remove_listener(len)
+
+
+class TestCollector(unittest.TestCase):
+
+    @staticmethod
+    def _span(duration, vendor='ramnode', **attributes):
+        span = Span(instrument.FETCH, dict(attributes, vendor=vendor))
+        span.duration = duration
+        return span
+
+    def test_summary(self):
+        collector = Collector()
+        for i in range(1, 101):
+            collector(self._span(i / 1000))
+        collector(self._span(1, status=500))
+        collector(self._span(0.5, vendor='other'))
+        summary = collector.summary()
+        self.assertEqual(set(summary), set([('fetch', 'ramnode'),
+                                            ('fetch', 'other')]))
+        ramnode = summary['fetch', 'ramnode']
+        self.assertEqual(ramnode.count, 101)
+        self.assertEqual(ramnode.errors, 1)
+        self.assertEqual(ramnode.max, 1)
+        self.assertAlmostEqual(ramnode.mean, (5.05 + 1) / 101)
+        self.assertAlmostEqual(ramnode.p50, 0.05, delta=0.005)
+        self.assertAlmostEqual(ramnode.p90, 0.09, delta=0.009)
+        self.assertAlmostEqual(ramnode.p99, 0.099, delta=0.01)
+
+    def test_summary_small(self):
+        collector = Collector()
+        collector(self._span(0))
+        self.assertEqual(collector.summary()['fetch', 'ramnode'].p99, 0)
+
+    def test_reset(self):
+        collector = Collector()
+        collector(self._span(1))
+        collector.reset()
+        self.assertEqual(collector.summary(), {})
+
+    def test_default_collector_registered(self):
+        self.assertIn(instrument.collector, instrument._listeners)
@@ -5,9 +5,14 @@ import sys
 import unittest
 import mock
 import contextlib
+import json
+import subprocess
 from six import StringIO
 
 from beam import __main__
+from beam.host import Host
+from beam.resource import Resource
+from beam.tests.test_host import TestHost
 
 
 # TODO may actually want to capture stderr so can check error message is correct
@@ -61,3 +66,159 @@ class TestMain(unittest.TestCase):
     def test_get_attribute_none_attribute(self):
         with self.assertRaises(ValueError):
             __main__._get_attribute('foo', None)
+
+    def test_parse_args_many_hosts_action(self):
+        args = __main__._parse_args(['beam', '-A', 'reboot', '--rolling', '2',
+                                     'nyc-1', 'nyc-2'])
+        self.assertListEqual(args.hosts, ['nyc-1', 'nyc-2'])
+        self.assertEqual(args.rolling, 2)
+
+    def test_parse_args_many_hosts_attributes(self):
+        args = __main__._parse_args(['beam', '-f', 'csv', '-a', 'fqdn', '--',
+                                     'nyc-*', 'ams-1'])
+        self.assertListEqual(args.hosts, ['nyc-*', 'ams-1'])
+        self.assertEqual(args.format, 'csv')
+
+    def test_is_single_host(self):
+        self.assertTrue(__main__._is_single_host(
+            __main__._parse_args(['beam', 'nyc-1', '-a', 'fqdn'])))
+
+    def test_is_single_host_glob(self):
+        self.assertFalse(__main__._is_single_host(
+            __main__._parse_args(['beam', 'nyc-*', '-a', 'fqdn'])))
+
+    def test_is_single_host_all(self):
+        self.assertFalse(__main__._is_single_host(
+            __main__._parse_args(['beam', '-a', 'fqdn', '--all'])))
+
+    def test_get_attributes(self):
+        self.assertListEqual(
+            __main__._get_attributes(Resource(1, 3),
+                                     ['used_bytes', 'missing']),
+            [1, None])
+
+    def test_text_writer(self):
+        stream = StringIO()
+        __main__._TextWriter(stream, ['a', 'b']).write('nyc-1', [1, None])
+        self.assertEqual(stream.getvalue(), 'nyc-1\t1\t\n')
+
+    def test_json_lines_writer(self):
+        stream = StringIO()
+        writer = __main__._JsonLinesWriter(stream, ['a', 'b.c'])
+        writer.write('nyc-1', [1, Resource(1, 3)])
+        self.assertEqual(json.loads(stream.getvalue()),
+                         {'host': 'nyc-1', 'a': 1,
+                          'b.c': str(Resource(1, 3))})
+
+    def test_csv_writer(self):
+        stream = StringIO()
+        writer = __main__._CsvWriter(stream, ['a', 'b'])
+        writer.write('nyc-1', [1, None])
+        self.assertEqual(stream.getvalue(), 'host,a,b\r\nnyc-1,1,\r\n')
+
+    @mock.patch('sys.stdout', new_callable=StringIO)
+    def test_print_attributes_of_hosts(self, mock_stdout):
+        args = __main__._parse_args(['beam', '-a', 'memory.used_bytes',
+                                     '--all'])
+        with mock.patch.object(Host, 'request_from_identity',
+                               side_effect=[TestHost.HOST,
+                                            RuntimeError('down')]), \
+                gobble_stderr():
+            status = __main__._print_attributes_of_hosts(
+                args, [TestHost.IDENTITY, TestHost.IDENTITY])
+        self.assertEqual(status, 1)
+        self.assertEqual(json.loads(mock_stdout.getvalue()),
+                         {'host': TestHost.IDENTITY.name,
+                          'memory.used_bytes': 100})
+
+    def test_parse_serve_args(self):
+        args = __main__._parse_serve_args(['beam', 'serve', '--socket',
+                                           '/tmp/beam.sock', '--ttl', '5'])
+        self.assertEqual(args.socket, '/tmp/beam.sock')
+        self.assertEqual(args.ttl, 5)
+
+    def test_parse_export_args(self):
+        args = __main__._parse_export_args(['beam', 'export', '--port', '9100',
+                                            '--interval', '30'])
+        self.assertEqual(args.address, '')
+        self.assertEqual(args.port, 9100)
+        self.assertEqual(args.interval, 30)
+
+    def test_query_attributes(self):
+        with mock.patch('beam.host', return_value=TestHost.HOST):
+            self.assertListEqual(
+                __main__._query({'host': 'nyc-1',
+                                 'attributes': ['memory.used_bytes',
+                                                'missing']}),
+                [0, ['100', ''], []])
+
+    def test_query_undefined(self):
+        error = ValueError('No host found matching nyc-9; did you mean '
+                           'nyc-1?')
+        with mock.patch('beam.host', side_effect=error):
+            self.assertListEqual(
+                __main__._query({'host': 'nyc-9'}),
+                [1, [], ['No host found matching nyc-9; did you mean '
+                         'nyc-1?']])
+
+    def test_import_light(self):
+        # queries answered by a daemon never need requests or asyncio
+        loaded = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, beam.__main__; '
+            'print(sorted({"requests", "asyncio"} & set(sys.modules)))'])
+        self.assertEqual(loaded.strip(), b'[]')
+
+    def test_answer(self):
+        with mock.patch.object(__main__, '_query',
+                               return_value=[0, [], []]) as query:
+            self.assertListEqual(
+                __main__._answer(['a.ini', 1, 2],
+                                 {'host': 'nyc-1', 'config': ['a.ini', 1, 2]}),
+                [0, [], []])
+        query.assert_called_once_with({'host': 'nyc-1',
+                                       'config': ['a.ini', 1, 2]})
+
+    def test_answer_other_config(self):
+        with mock.patch.object(__main__, '_query') as query:
+            self.assertIsNone(__main__._answer(
+                ['a.ini', 1, 2], {'host': 'nyc-1', 'config': ['a.ini', 1, 3]}))
+            self.assertIsNone(__main__._answer(
+                ['a.ini', 1, 2], {'host': 'nyc-1'}))
+        query.assert_not_called()
+
+    def test_config_signature(self):
+        with mock.patch.object(__main__.Config, 'locate', return_value=None):
+            self.assertIsNone(__main__._config_signature())
+        with mock.patch.object(__main__.Config, 'locate',
+                               return_value=__file__):
+            self.assertListEqual(__main__._config_signature(),
+                                 list(__main__.Config.file_signature(
+                                     __file__)))
+
+    @mock.patch('sys.stdout', new_callable=StringIO)
+    def test_main_daemon_declined(self, mock_stdout):
+        with mock.patch.object(sys, 'argv', ['beam', 'nyc-1', '-a', 'fqdn']), \
+                mock.patch('beam.daemon.request', return_value=None), \
+                mock.patch.object(__main__, '_query',
+                                  return_value=[0, ['nyc-1.example'], []]):
+            self.assertEqual(__main__.main(), 0)
+        self.assertEqual(mock_stdout.getvalue(), 'nyc-1.example\n')
+
+    def test_is_single_host_tag(self):
+        self.assertFalse(__main__._is_single_host(
+            __main__._parse_args(['beam', 'tag:web', '-a', 'fqdn'])))
+
+    def test_parse_args_cache_ttl(self):
+        with mock.patch.dict(os.environ, {'BEAM_CACHE_TTL': '10'}):
+            self.assertEqual(__main__._parse_args(
+                ['beam', 'nyc-1', '-a', 'fqdn']).cache_ttl, 10)
+            self.assertEqual(__main__._parse_args(
+                ['beam', 'nyc-1', '-a', 'fqdn', '--cache-ttl', '5']).cache_ttl,
+                5)
+
+    def test_parse_args_cache_ttl_default(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('BEAM_CACHE_TTL', None)
+            self.assertIsNone(__main__._parse_args(
+                ['beam', 'nyc-1', '-a', 'fqdn']).cache_ttl)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+import time
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from beam.host import Host, HostIdentity
+from beam.poller import Poller
+from beam.vendor import Vendor
+
+
+_VENDOR = Vendor('a', 'https://a.example.com')
+
+
+def _host(identity, is_online):
+    return Host(identity, identity.name, None, is_online, None, None, None,
+                None)
+
+
+class TestPoller(unittest.TestCase):
+
+    _IDENTITIES = [HostIdentity('host-{0}'.format(i), 'key-{0}'.format(i),
+                                'hash-{0}'.format(i), _VENDOR)
+                   for i in range(4)]
+
+    def setUp(self):
+        self.online = {identity: True for identity in self._IDENTITIES}
+
+    def _fetch(self, identity):
+        if self.online[identity] is None:
+            raise RuntimeError('down')
+        return _host(identity, self.online[identity])
+
+    def test_invalid_interval(self):
+        with self.assertRaises(ValueError):
+            Poller(0, self._IDENTITIES)
+
+    def test_invalid_jitter(self):
+        with self.assertRaises(ValueError):
+            Poller(1, self._IDENTITIES, jitter=2)
+
+    def test_snapshot_initially_empty(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        self.assertEqual(len(poller.snapshot), 0)
+        self.assertIsNone(poller.snapshot.state(self._IDENTITIES[0]))
+
+    def test_poll(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        self.online[self._IDENTITIES[1]] = False
+        self.online[self._IDENTITIES[2]] = None
+        snapshot = poller.poll()
+        self.assertIs(snapshot, poller.snapshot)
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.state(self._IDENTITIES[0]), Poller.ONLINE)
+        self.assertEqual(snapshot.state(self._IDENTITIES[1]), Poller.OFFLINE)
+        self.assertEqual(snapshot.state(self._IDENTITIES[2]),
+                         Poller.UNREACHABLE)
+        self.assertIsNone(snapshot.get(self._IDENTITIES[2]))
+        self.assertIsNotNone(snapshot.updated_at(self._IDENTITIES[2]))
+
+    def test_snapshot_immutable(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        first = poller.poll()
+        self.online[self._IDENTITIES[0]] = False
+        poller.poll()
+        self.assertTrue(first.get(self._IDENTITIES[0]).is_online)
+        with self.assertRaises(TypeError):
+            first.hosts[self._IDENTITIES[0]] = None
+
+    def test_error_keeps_last_host(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        poller.poll()
+        self.online[self._IDENTITIES[0]] = None
+        snapshot = poller.poll()
+        self.assertIsNotNone(snapshot.get(self._IDENTITIES[0]))
+        self.assertIn(self._IDENTITIES[0], snapshot.errors)
+
+    def test_subscribe(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        changes = []
+        poller.subscribe(lambda *change: changes.append(change))
+        poller.poll()
+        self.assertListEqual(changes, [])
+        self.online[self._IDENTITIES[0]] = False
+        self.online[self._IDENTITIES[1]] = None
+        poller.poll()
+        self.assertListEqual(changes, [
+            (self._IDENTITIES[0], Poller.ONLINE, Poller.OFFLINE),
+            (self._IDENTITIES[1], Poller.ONLINE, Poller.UNREACHABLE)])
+
+    def test_unsubscribe(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        changes = []
+        callback = poller.subscribe(lambda *change: changes.append(change))
+        poller.unsubscribe(callback)
+        poller.poll()
+        self.online[self._IDENTITIES[0]] = False
+        poller.poll()
+        self.assertListEqual(changes, [])
+
+    def test_callback_error_ignored(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+
+        @poller.subscribe
+        def fail(*_):
+            raise KeyError()
+        poller.poll()
+        self.online[self._IDENTITIES[0]] = False
+        self.assertEqual(poller.poll().state(self._IDENTITIES[0]),
+                         Poller.OFFLINE)
+
+    def test_watch(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        diffs = []
+        poller.watch(lambda *diff: diffs.append(diff))
+        poller.poll()
+        self.assertListEqual(diffs, [])
+        self.online[self._IDENTITIES[0]] = False
+        self.online[self._IDENTITIES[1]] = None
+        poller.poll()
+        self.assertListEqual(diffs, [
+            (self._IDENTITIES[0], {'is_online': (True, False)})])
+
+    def test_watch_reused_host(self):
+        host = _host(self._IDENTITIES[0], True)
+        poller = Poller(1, self._IDENTITIES[:1], fetch=lambda _: host)
+        diffs = []
+        poller.watch(lambda *diff: diffs.append(diff))
+        with mock.patch.object(Host, 'diff') as diff:
+            poller.poll()
+            poller.poll()
+        diff.assert_not_called()
+        self.assertListEqual(diffs, [])
+
+    def test_unwatch(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        diffs = []
+        callback = poller.watch(lambda *diff: diffs.append(diff))
+        poller.unwatch(callback)
+        poller.poll()
+        self.online[self._IDENTITIES[0]] = False
+        poller.poll()
+        self.assertListEqual(diffs, [])
+
+    def test_default_fetch_previous(self):
+        poller = Poller(1, self._IDENTITIES[:1], fields=['is_online'])
+        with mock.patch.object(Host, 'request_from_identity',
+                               side_effect=lambda identity, *_, **__:
+                               _host(identity, True)) as request:
+            first = poller.poll().get(self._IDENTITIES[0])
+            poller.poll()
+        request.assert_called_with(self._IDENTITIES[0], ['is_online'],
+                                   previous=first)
+
+    def test_background(self):
+        times = {}
+        lock = threading.Lock()
+
+        def fetch(identity):
+            with lock:
+                times.setdefault(identity, []).append(time.monotonic())
+            return _host(identity, True)
+
+        with Poller(0.2, self._IDENTITIES, jitter=0, publish_interval=0,
+                    fetch=fetch) as poller:
+            time.sleep(0.5)
+        self.assertEqual(len(poller.snapshot), 4)
+        for identity in self._IDENTITIES:
+            self.assertGreaterEqual(len(times[identity]), 2)
+        # spread across the interval rather than all at once
+        firsts = sorted(polls[0] for polls in times.values())
+        self.assertGreater(firsts[-1] - firsts[0], 0.1)
+
+    def test_start_twice(self):
+        poller = Poller(1, self._IDENTITIES, fetch=self._fetch)
+        with poller:
+            with self.assertRaises(RuntimeError):
+                poller.start()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import asyncio
+import threading
+import unittest
+
+from beam.ratelimit import AdaptiveLimiter, parse_rate
+from beam.tests.fake_clock import FakeClock
+
+
+class TestParseRate(unittest.TestCase):
+
+    def test_per_second(self):
+        self.assertEqual(parse_rate('10/s'), 10)
+
+    def test_per_minute(self):
+        self.assertEqual(parse_rate('120 / m'), 2)
+
+    def test_per_hour(self):
+        self.assertEqual(parse_rate('3600/h'), 1)
+
+    def test_default_unit(self):
+        self.assertEqual(parse_rate('0.5'), 0.5)
+
+    def test_invalid(self):
+        for value in ['', 'fast', '10/d', '-1/s', '0/s']:
+            with self.assertRaises(ValueError):
+                parse_rate(value)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    @staticmethod
+    def _request(limiter, latency, congested, clock=None):
+        if clock is not None:
+            # refill the bucket, so acquiring never sleeps
+            clock.now += 100
+        limiter.acquire()
+        limiter.release(latency, congested)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            AdaptiveLimiter(rate=0)
+
+    def test_invalid_max_in_flight(self):
+        with self.assertRaises(ValueError):
+            AdaptiveLimiter(max_in_flight=0)
+
+    def test_unlimited(self):
+        limiter = AdaptiveLimiter()
+        for _ in range(100):
+            limiter.acquire()
+        self.assertIsNone(limiter.rate)
+        self.assertIsNone(limiter.limit)
+
+    def test_token_bucket(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(rate=2, clock=clock)
+        # a burst of up to the rate is allowed, then requests are spaced out
+        self.assertEqual(limiter._reserve(), 0)
+        self.assertEqual(limiter._reserve(), 0)
+        self.assertAlmostEqual(limiter._reserve(), .5)
+        self.assertAlmostEqual(limiter._reserve(), 1)
+        clock.now = 10
+        self.assertEqual(limiter._reserve(), 0)
+
+    def test_max_in_flight(self):
+        limiter = AdaptiveLimiter(max_in_flight=2)
+        limiter.acquire()
+        limiter.acquire()
+        entered = threading.Event()
+
+        def third():
+            limiter.acquire()
+            entered.set()
+        thread = threading.Thread(target=third)
+        thread.start()
+        self.assertFalse(entered.wait(0.05))
+        limiter.release(0.1, False)
+        self.assertTrue(entered.wait(1))
+        thread.join()
+
+    def test_congestion_halves_limits(self):
+        limiter = AdaptiveLimiter(rate=16, max_in_flight=8)
+        self._request(limiter, 0.1, True)
+        self.assertEqual(limiter.rate, 8)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_rate_floor(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(rate=16, max_in_flight=8, clock=clock)
+        for _ in range(10):
+            self._request(limiter, 0.1, True, clock)
+        self.assertEqual(limiter.rate, 1)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_success_recovers(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(rate=20, max_in_flight=4, clock=clock)
+        self._request(limiter, 0.1, True, clock)
+        for _ in range(50):
+            self._request(limiter, 0.1, False, clock)
+        self.assertEqual(limiter.rate, 20)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_slow_response(self):
+        limiter = AdaptiveLimiter(max_in_flight=8)
+        self._request(limiter, 0.1, False)
+        self._request(limiter, 1, False)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_abandoned(self):
+        limiter = AdaptiveLimiter(max_in_flight=8)
+        limiter.acquire()
+        limiter.release()
+        self.assertEqual(limiter.limit, 8)
+        self._request(limiter, 0.1, True)
+        self.assertEqual(limiter.limit, 4)
+
+
+class TestAdaptiveLimiterAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def test_aacquire(self):
+        limiter = AdaptiveLimiter(max_in_flight=1)
+        await limiter.aacquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        limiter.release(0.1, False)
+        await asyncio.wait_for(waiter, 1)
+
+    async def test_aacquire_cancelled(self):
+        limiter = AdaptiveLimiter(max_in_flight=1)
+        await limiter.aacquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        limiter.release(0.1, False)
+        # the cancelled caller's place is not held
+        await asyncio.wait_for(limiter.aacquire(), 1)
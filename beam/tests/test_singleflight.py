@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import asyncio
+import threading
+import time
+import unittest
+
+from beam.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def _func(self, result=None, error=None):
+        def func():
+            self.calls += 1
+            self.release.wait(5)
+            if error is not None:
+                raise error
+            return result
+        return func
+
+    def _concurrently(self, count, func, key='nyc-1'):
+        outcomes = [None] * count
+
+        def run(i):
+            try:
+                outcomes[i] = self.flights.do(key, func)
+            except Exception as e:
+                outcomes[i] = e
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        # let every thread join the call before it completes
+        time.sleep(0.05)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_do_coalesces(self):
+        outcomes = self._concurrently(4, self._func(result=7))
+        self.assertListEqual(outcomes, [7] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(self.flights), 0)
+
+    def test_do_shares_exception(self):
+        error = RuntimeError('down')
+        outcomes = self._concurrently(3, self._func(error=error))
+        self.assertListEqual(outcomes, [error] * 3)
+        self.assertEqual(self.calls, 1)
+
+    def test_do_sequential_calls_execute(self):
+        self.release.set()
+        self.flights.do('nyc-1', self._func())
+        self.flights.do('nyc-1', self._func())
+        self.assertEqual(self.calls, 2)
+
+    def test_do_distinct_keys(self):
+        self.release.set()
+        self.flights.do('nyc-1', self._func())
+        self.flights.do('nyc-2', self._func())
+        self.assertEqual(self.calls, 2)
+
+
+class TestSingleFlightAsync(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = 0
+
+    async def _func(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.calls
+
+    async def test_ado_coalesces(self):
+        results = await asyncio.gather(
+            *[self.flights.ado('nyc-1', self._func) for _ in range(4)])
+        self.assertListEqual(results, [1] * 4)
+        self.assertEqual(len(self.flights), 0)
+
+    async def test_ado_shares_exception(self):
+        async def fail():
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError('down')
+        results = await asyncio.gather(
+            *[self.flights.ado('nyc-1', fail) for _ in range(2)],
+            return_exceptions=True)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(result, RuntimeError)
+                            for result in results))
+
+    async def test_ado_cancelled_caller(self):
+        first = asyncio.ensure_future(self.flights.ado('nyc-1', self._func))
+        second = asyncio.ensure_future(self.flights.ado('nyc-1', self._func))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, 1)
+        self.assertTrue(first.cancelled())
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import unittest
+import mock
+
+from beam import table
+from beam.host import Host, HostIdentity
+from beam.resource import Resource
+from beam.table import FleetStats, ResourceTable
+from beam.vendor import Vendor
+
+
+_VENDOR_A = Vendor('a', 'https://a.example.com')
+_VENDOR_B = Vendor('b', 'https://b.example.com')
+
+
+def _host(i, vendor, memory, storage=None):
+    return Host(HostIdentity('host-{0}'.format(i), 'key-{0}'.format(i),
+                             'hash-{0}'.format(i), vendor),
+                None, None, True, memory, storage, None, None)
+
+
+class _TestResourceTable(object):
+
+    _HOSTS = [_host(0, _VENDOR_A, Resource(90, 10), Resource(1, 1)),
+              _host(1, _VENDOR_B, Resource(20, 80)),
+              _host(2, _VENDOR_A, Resource(50, 50)),
+              _host(3, _VENDOR_B, Resource(0, 0)),
+              _host(4, _VENDOR_A, None)]
+
+    def setUp(self):
+        self.table = ResourceTable.from_hosts(self._HOSTS, 'memory')
+
+    @staticmethod
+    def _names(table_):
+        return [identity.name for identity in table_.identities]
+
+    def test_from_hosts_skips_missing(self):
+        self.assertEqual(len(self.table), 4)
+
+    def test_from_hosts_unknown_resource(self):
+        with self.assertRaises(ValueError):
+            ResourceTable.from_hosts(self._HOSTS, 'fqdn')
+
+    def test_mismatched_columns(self):
+        with self.assertRaises(ValueError):
+            ResourceTable([], [1], [])
+
+    def test_percentages(self):
+        self.assertListEqual(list(self.table.used_percentage),
+                             [.9, .2, .5, 1])
+        self.assertAlmostEqual(self.table.free_percentage[0], .1)
+
+    def test_total(self):
+        self.assertEqual(self.table.total(), Resource(160, 140))
+
+    def test_by_vendor(self):
+        self.assertDictEqual(self.table.by_vendor(),
+                             {_VENDOR_A: Resource(140, 60),
+                              _VENDOR_B: Resource(20, 80)})
+
+    def test_above(self):
+        self.assertListEqual(self._names(self.table.above(.5)),
+                             ['host-0', 'host-3'])
+
+    def test_below(self):
+        self.assertListEqual(self._names(self.table.below(60)),
+                             ['host-0', 'host-2', 'host-3'])
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            self.table.above(1, 'fqdn')
+
+    def test_sort(self):
+        self.assertListEqual(self._names(self.table.sort('used_bytes')),
+                             ['host-3', 'host-1', 'host-2', 'host-0'])
+
+    def test_sort_descending_stable(self):
+        sorted_ = ResourceTable.from_hosts(
+            [_host(i, _VENDOR_A, Resource(i % 2, 1)) for i in range(4)],
+            'memory').sort('used_bytes', descending=True)
+        self.assertListEqual(self._names(sorted_),
+                             ['host-1', 'host-3', 'host-0', 'host-2'])
+
+    def test_top(self):
+        self.assertListEqual(self._names(self.table.top(2)),
+                             ['host-0', 'host-2'])
+
+    def test_top_more_than_rows(self):
+        self.assertEqual(len(self.table.top(10)), 4)
+
+    def test_top_none(self):
+        self.assertEqual(len(self.table.top(0)), 0)
+
+    def test_percentile(self):
+        self.assertAlmostEqual(self.table.percentile(50, 'used_bytes'), 35)
+        self.assertAlmostEqual(self.table.percentile(100), 1)
+
+    def test_percentile_empty(self):
+        with self.assertRaises(ValueError):
+            ResourceTable([], [], []).percentile(50)
+
+    def test_percentile_out_of_range(self):
+        with self.assertRaises(ValueError):
+            self.table.percentile(101)
+
+    def test_fleet_stats(self):
+        stats = FleetStats(self._HOSTS)
+        self.assertEqual(len(stats.memory), 4)
+        self.assertEqual(len(stats.storage), 1)
+        self.assertEqual(len(stats.bandwidth), 0)
+
+
+@unittest.skipIf(table.numpy is None, 'NumPy is not installed')
+class TestResourceTableNumPy(_TestResourceTable, unittest.TestCase):
+    pass
+
+
+class TestResourceTableArray(_TestResourceTable, unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(table, 'numpy', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super(TestResourceTableArray, self).setUp()
@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, division
+import asyncio
+import threading
 import unittest
+import requests
+import responses
+import mock
 
+from beam import vendor as vendor_module
+from beam.breaker import CircuitOpenError
+from beam.transport import Response
 from beam.vendor import Vendor
 
 
@@ -34,3 +42,245 @@ class TestVendor(unittest.TestCase):
     def test_str(self):
         self.assertEqual(str(self.vendor),
                          'Vendor(ramnode, https://vpscp.ramnode.com)')
+
+    def test_init_invalid_pool_size(self):
+        with self.assertRaises(ValueError):
+            Vendor(self._NAME, self._ENDPOINT, pool_size=0)
+
+    def test_init_invalid_timeout(self):
+        with self.assertRaises(ValueError):
+            Vendor(self._NAME, self._ENDPOINT, timeout=0)
+
+    def test_init_invalid_connect_timeout(self):
+        with self.assertRaises(ValueError):
+            Vendor(self._NAME, self._ENDPOINT, connect_timeout=0)
+
+    def test_init_invalid_hedge_after(self):
+        with self.assertRaises(ValueError):
+            Vendor(self._NAME, self._ENDPOINT, hedge_after=0)
+
+    def test_init_invalid_failure_threshold(self):
+        with self.assertRaises(ValueError):
+            Vendor(self._NAME, self._ENDPOINT, failure_threshold=-1)
+
+    def test_init_no_breaker(self):
+        self.assertIsNone(
+            Vendor(self._NAME, self._ENDPOINT, failure_threshold=0).breaker)
+
+    def test_init_invalid_retries(self):
+        with self.assertRaises(ValueError):
+            Vendor(self._NAME, self._ENDPOINT, retries=-1)
+
+    def test_init_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            Vendor(self._NAME, self._ENDPOINT, rate=0)
+
+    def test_init_invalid_max_in_flight(self):
+        with self.assertRaises(ValueError):
+            Vendor(self._NAME, self._ENDPOINT, max_in_flight=0)
+
+    def test_init_no_limiter(self):
+        self.assertIsNone(self.vendor.limiter)
+
+    def test_init_limiter(self):
+        vendor = Vendor(self._NAME, self._ENDPOINT, rate=5, max_in_flight=2)
+        self.assertEqual(vendor.limiter.rate, 5)
+        self.assertEqual(vendor.limiter.limit, 2)
+
+    def test_session_reused(self):
+        vendor = Vendor(self._NAME, self._ENDPOINT)
+        self.assertIs(vendor.session, vendor.session)
+
+    def test_session_pool_size(self):
+        vendor = Vendor(self._NAME, self._ENDPOINT, pool_size=3, retries=2)
+        adapter = vendor.session.get_adapter(self._ENDPOINT)
+        self.assertEqual(adapter._pool_maxsize, 3)
+        # retries are made by the vendor, for asynchronous requests too
+        self.assertEqual(adapter.max_retries.total, 0)
+
+    def test_session_no_keep_alive(self):
+        vendor = Vendor(self._NAME, self._ENDPOINT, keep_alive=False)
+        self.assertEqual(vendor.session.headers['Connection'], 'close')
+
+    @responses.activate
+    def test_get(self):
+        responses.add(responses.GET, self._ENDPOINT + '/path', body='body')
+        vendor = Vendor(self._NAME, self._ENDPOINT)
+        self.assertEqual(vendor.get('/path', {'a': 'b'}).text, 'body')
+        self.assertEqual(responses.calls[0].request.url,
+                         self._ENDPOINT + '/path?a=b')
+
+    @responses.activate
+    def test_post(self):
+        responses.add(responses.POST, self._ENDPOINT + '/path', body='body')
+        vendor = Vendor(self._NAME, self._ENDPOINT)
+        self.assertEqual(vendor.post('/path', {'a': 'b'}).text, 'body')
+        self.assertEqual(responses.calls[0].request.body, 'a=b')
+
+    @responses.activate
+    def test_get_congested(self):
+        responses.add(responses.GET, self._ENDPOINT + '/path', status=503)
+        vendor = Vendor(self._NAME, self._ENDPOINT, max_in_flight=4)
+        self.assertEqual(vendor.get('/path', {}).status_code, 503)
+        self.assertEqual(vendor.limiter.limit, 2)
+
+    @responses.activate
+    def test_post_limited(self):
+        responses.add(responses.POST, self._ENDPOINT + '/path', body='body')
+        vendor = Vendor(self._NAME, self._ENDPOINT, max_in_flight=4)
+        self.assertEqual(vendor.post('/path', {}).text, 'body')
+        self.assertEqual(vendor.limiter.limit, 4)
+
+    def test_timeouts(self):
+        vendor = Vendor(self._NAME, self._ENDPOINT, connect_timeout=2,
+                        timeout=5)
+        with mock.patch.object(requests.Session, 'get',
+                               return_value=Response(200, b'')) as get:
+            vendor.get('/path', {})
+        self.assertEqual(get.call_args[1]['timeout'], (2, 5))
+
+    def test_transport(self):
+        vendor = Vendor(self._NAME, self._ENDPOINT, pool_size=3,
+                        keep_alive=False, connect_timeout=2, timeout=5)
+        transport = vendor.transport()
+        self.assertEqual(transport.connect_timeout, 2)
+        self.assertEqual(transport.timeout, 5)
+        self.assertEqual(transport.pool_size, 3)
+        self.assertFalse(transport.keep_alive)
+        # shared, so connections are reused between requests
+        self.assertIs(vendor.transport(), transport)
+
+    def test_backoff_jitter(self):
+        vendor = Vendor(self._NAME, self._ENDPOINT, backoff=1)
+        delays = [vendor._backoff(3) for _ in range(100)]
+        self.assertTrue(all(0 <= delay <= 4 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+        self.assertLessEqual(vendor._backoff(100), Vendor._MAX_BACKOFF)
+
+    @responses.activate
+    def test_get_retries_server_error(self):
+        responses.add(responses.GET, self._ENDPOINT + '/path', status=503)
+        responses.add(responses.GET, self._ENDPOINT + '/path', body='body')
+        vendor = Vendor(self._NAME, self._ENDPOINT, retries=1)
+        self.assertEqual(vendor.get('/path', {}).text, 'body')
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_get_retries_exhausted(self):
+        responses.add(responses.GET, self._ENDPOINT + '/path', status=503)
+        vendor = Vendor(self._NAME, self._ENDPOINT, retries=2)
+        self.assertEqual(vendor.get('/path', {}).status_code, 503)
+        self.assertEqual(len(responses.calls), 3)
+
+    @responses.activate
+    def test_get_retries_connection_error(self):
+        responses.add(responses.GET, self._ENDPOINT + '/path',
+                      body=requests.ConnectionError())
+        vendor = Vendor(self._NAME, self._ENDPOINT, retries=1)
+        with self.assertRaises(requests.ConnectionError):
+            vendor.get('/path', {})
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_post_not_retried(self):
+        responses.add(responses.POST, self._ENDPOINT + '/path', status=503)
+        vendor = Vendor(self._NAME, self._ENDPOINT, retries=2)
+        self.assertEqual(vendor.post('/path', {}).status_code, 503)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_circuit_opens(self):
+        responses.add(responses.GET, self._ENDPOINT + '/path', status=500)
+        vendor = Vendor(self._NAME, self._ENDPOINT, failure_threshold=2)
+        vendor.get('/path', {})
+        vendor.get('/path', {})
+        with self.assertRaises(CircuitOpenError):
+            vendor.post('/path', {})
+        self.assertEqual(len(responses.calls), 2)
+
+    def test_get_hedged(self):
+        release = threading.Event()
+        calls = []
+
+        def get(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                # the first request hangs until the test ends
+                release.wait(5)
+                return Response(500, b'slow')
+            return Response(200, b'fast')
+
+        self.addCleanup(release.set)
+        vendor = Vendor(self._NAME, self._ENDPOINT, hedge_after=0.01)
+        with mock.patch.object(requests.Session, 'get', side_effect=get):
+            self.assertEqual(vendor.get('/path', {}).content, b'fast')
+        self.assertEqual(len(calls), 2)
+
+    def test_hedging_executor_shared(self):
+        executor = vendor_module._hedging_executor()
+        self.assertIs(vendor_module._hedging_executor(), executor)
+
+    def test_parse_boolean(self):
+        self.assertTrue(vendor_module._parse_boolean('Yes'))
+        self.assertFalse(vendor_module._parse_boolean('off'))
+
+    def test_parse_boolean_invalid(self):
+        with self.assertRaises(ValueError):
+            vendor_module._parse_boolean('maybe')
+
+
+class TestVendorAsync(unittest.IsolatedAsyncioTestCase):
+
+    _ENDPOINT = 'https://vpscp.ramnode.com'
+
+    async def test_request_retries(self):
+        transport = mock.Mock()
+        transport.request = mock.AsyncMock(side_effect=[
+            OSError('refused'), Response(502, b''), Response(200, b'body')])
+        vendor = Vendor('ramnode', self._ENDPOINT, retries=2)
+        response = await vendor.request(transport, 'GET', '/path', {})
+        self.assertEqual(response.content, b'body')
+        self.assertEqual(transport.request.await_count, 3)
+
+    async def test_request_post_not_retried(self):
+        transport = mock.Mock()
+        transport.request = mock.AsyncMock(return_value=Response(503, b''))
+        vendor = Vendor('ramnode', self._ENDPOINT, retries=2)
+        response = await vendor.request(transport, 'POST', '/path', {})
+        self.assertEqual(response.status_code, 503)
+        transport.request.assert_awaited_once()
+
+    async def test_request_circuit_opens(self):
+        transport = mock.Mock()
+        transport.request = mock.AsyncMock(side_effect=asyncio.TimeoutError)
+        vendor = Vendor('ramnode', self._ENDPOINT, failure_threshold=1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await vendor.request(transport, 'GET', '/path', {})
+        with self.assertRaises(CircuitOpenError):
+            await vendor.request(transport, 'GET', '/path', {})
+        transport.request.assert_awaited_once()
+
+    async def test_request_hedged(self):
+        cancelled = []
+
+        async def request(method, url, params):
+            if not cancelled:
+                cancelled.append(False)
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled[0] = True
+                    raise
+            return Response(200, b'fast')
+
+        transport = mock.Mock()
+        transport.request = request
+        vendor = Vendor('ramnode', self._ENDPOINT, hedge_after=0.01,
+                        failure_threshold=1, max_in_flight=2)
+        response = await vendor.request(transport, 'GET', '/path', {})
+        self.assertEqual(response.content, b'fast')
+        await asyncio.sleep(0)
+        # the slow request was abandoned, which is not a failure
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(vendor.breaker.state, 'closed')
+        self.assertEqual(vendor.limiter.limit, 2)
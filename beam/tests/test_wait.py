@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+import time
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from beam import wait
+from beam.host import Host, HostIdentity
+from beam.vendor import Vendor
+
+_VENDOR = Vendor('ramnode', 'https://vpscp.ramnode.com')
+_IDENTITIES = [HostIdentity('host-{0}'.format(i), 'key-{0}'.format(i),
+                            'hash-{0}'.format(i), _VENDOR)
+               for i in range(3)]
+
+
+class _Fleet(object):
+    """
+    Fakes the status of hosts, each coming online after a number of polls.
+    """
+
+    def __init__(self, polls_until_online):
+        self.polls_until_online = polls_until_online
+        self.polls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, identity):
+        with self._lock:
+            self.polls.append((identity, time.monotonic()))
+            count = sum(1 for polled, _ in self.polls if polled is identity)
+        remaining = self.polls_until_online[identity.name]
+        if isinstance(remaining, Exception):
+            raise remaining
+        return mock.Mock(is_online=count >= remaining)
+
+
+class TestWaiter(unittest.TestCase):
+
+    def test_init_invalid_min_interval(self):
+        with self.assertRaises(ValueError):
+            wait.Waiter(min_interval=0)
+
+    def test_init_invalid_max_interval(self):
+        with self.assertRaises(ValueError):
+            wait.Waiter(min_interval=2, max_interval=1)
+
+    def test_init_invalid_backoff(self):
+        with self.assertRaises(ValueError):
+            wait.Waiter(backoff=0.5)
+
+    def test_init_invalid_grace(self):
+        with self.assertRaises(ValueError):
+            wait.Waiter(grace=-1)
+
+    def test_submit_invalid_state(self):
+        with self.assertRaises(ValueError):
+            wait.Waiter().submit(_IDENTITIES[0], 'rebooting')
+
+    def test_wait(self):
+        fleet = _Fleet({'host-0': 1, 'host-1': 3, 'host-2': 2})
+        waiter = wait.Waiter(0.01, 0.05, fetch=fleet)
+        hosts = waiter.wait(_IDENTITIES, wait.ONLINE, timeout=5)
+        self.assertTrue(all(host.is_online for host in hosts))
+        self.assertEqual(len(fleet.polls), 6)
+        self.assertEqual(len(waiter), 0)
+
+    def test_wait_transition(self):
+        statuses = iter([True, True, False, False, True, False])
+        polls = []
+
+        def fetch(identity):
+            polls.append(identity)
+            return mock.Mock(is_online=next(statuses))
+
+        waiter = wait.Waiter(0.01, fetch=fetch)
+        host = waiter.wait(_IDENTITIES[:1], wait.EXPECTED_STATES['reboot'],
+                           timeout=5)[0]
+        self.assertTrue(host.is_online)
+        # not the first polls, while the host was yet to go down
+        self.assertEqual(len(polls), 5)
+
+    def test_wait_transition_timeout(self):
+        waiter = wait.Waiter(0.01, fetch=_Fleet({'host-0': 100}))
+        with self.assertRaisesRegex(RuntimeError,
+                                    'host-0 did not come online'):
+            waiter.wait(_IDENTITIES[:1], (wait.OFFLINE, wait.ONLINE),
+                        timeout=0.05)
+
+    def test_wait_transition_grace_timeout(self):
+        # still online when the wait times out, before the grace period
+        fleet = _Fleet({'host-0': 1})
+        waiter = wait.Waiter(0.01, fetch=fleet, grace=60)
+        host = waiter.wait(_IDENTITIES[:1], (wait.OFFLINE, wait.ONLINE),
+                           timeout=0.05)[0]
+        self.assertTrue(host.is_online)
+
+    def test_wait_transition_not_backed_off(self):
+        # a fast reboot, down briefly between the fourth and fifth polls
+        polls = []
+
+        def fetch(identity):
+            polls.append(time.monotonic())
+            return mock.Mock(is_online=len(polls) not in (4, 5))
+
+        waiter = wait.Waiter(0.02, 1, backoff=4, fetch=fetch)
+        start = time.monotonic()
+        waiter.wait(_IDENTITIES[:1], (wait.OFFLINE, wait.ONLINE), timeout=5)
+        self.assertEqual(len(polls), 6)
+        # at the minimum interval throughout, rather than backing off
+        self.assertLess(polls[-1] - start, 0.5)
+
+    def test_wait_transition_grace(self):
+        # never seen offline, e.g. rebooted between polls
+        fleet = _Fleet({'host-0': 1})
+        waiter = wait.Waiter(0.01, fetch=fleet, grace=0.05)
+        host = waiter.wait(_IDENTITIES[:1], (wait.OFFLINE, wait.ONLINE),
+                           timeout=5)[0]
+        self.assertTrue(host.is_online)
+        self.assertGreater(fleet.polls[-1][1] - fleet.polls[0][1], 0.03)
+
+    def test_submit_no_states(self):
+        with self.assertRaises(ValueError):
+            wait.Waiter().submit(_IDENTITIES[0], ())
+
+    def test_wait_offline(self):
+        fleet = _Fleet({'host-0': 1})
+        waiter = wait.Waiter(0.01, fetch=fleet)
+        with self.assertRaises(RuntimeError):
+            waiter.wait(_IDENTITIES[:1], wait.OFFLINE, timeout=0.05)
+
+    def test_backoff(self):
+        fleet = _Fleet({'host-0': 5})
+        waiter = wait.Waiter(0.02, 0.08, backoff=2, fetch=fleet)
+        start = time.monotonic()
+        waiter.wait(_IDENTITIES[:1], wait.ONLINE, timeout=5)
+        times = [at - start for _, at in fleet.polls]
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        # 0.02, then 0.04, 0.08 and the maximum of 0.08
+        self.assertGreaterEqual(times[0], 0.02)
+        self.assertGreaterEqual(gaps[0], 0.04)
+        self.assertGreaterEqual(gaps[1], 0.08)
+        self.assertLess(gaps[2], 0.15)
+
+    def test_timeout(self):
+        fleet = _Fleet({'host-0': 100})
+        waiter = wait.Waiter(0.01, fetch=fleet)
+        future = waiter.submit(_IDENTITIES[0], wait.ONLINE, timeout=0.05)
+        with self.assertRaisesRegex(RuntimeError,
+                                    'host-0 did not come online'):
+            future.result(1)
+
+    def test_errors_retried(self):
+        polls = []
+
+        def fetch(identity):
+            polls.append(identity)
+            if len(polls) == 1:
+                raise RuntimeError('panel unavailable')
+            return mock.Mock(is_online=True)
+
+        waiter = wait.Waiter(0.01, fetch=fetch)
+        waiter.wait(_IDENTITIES[:1], wait.ONLINE, timeout=1)
+        self.assertEqual(len(polls), 2)
+
+    def test_timeout_last_error(self):
+        error = RuntimeError('panel unavailable')
+        waiter = wait.Waiter(0.01, fetch=_Fleet({'host-0': error}))
+        with self.assertRaises(RuntimeError) as context:
+            waiter.wait(_IDENTITIES[:1], wait.ONLINE, timeout=0.03)
+        self.assertIs(context.exception, error)
+
+    def test_cancel(self):
+        fleet = _Fleet({'host-0': 100})
+        waiter = wait.Waiter(0.05, fetch=fleet)
+        future = waiter.submit(_IDENTITIES[0], wait.ONLINE)
+        self.assertTrue(future.cancel())
+        time.sleep(0.1)
+        self.assertEqual(len(fleet.polls), 0)
+        self.assertEqual(len(waiter), 0)
+
+    def test_default_fetch(self):
+        with mock.patch.object(Host, 'request_from_identity',
+                               return_value=mock.Mock(is_online=True)) \
+                as request:
+            wait.Waiter(0.01).wait(_IDENTITIES[:1], wait.ONLINE)
+        request.assert_called_once_with(_IDENTITIES[0], fields=['is_online'],
+                                        cached=False)
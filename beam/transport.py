@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import codecs
+import collections
+import ssl
+import threading
+# noinspection PyUnresolvedReferences
+from six.moves.urllib.parse import urlencode, urlsplit
+
+
+def content_charset(headers):
+    """
+    Find the character set a response's body is encoded in.
+
+    :param headers: The response's headers, looked up by lower-cased name,
+                    e.g. a dictionary from `StreamTransport` or the
+                    case-insensitive headers of a `requests.Response`. May be
+                    None if the response has no headers.
+    :return: The normalised name of the charset declared by the Content-Type
+             header, or 'utf-8' if none is declared or it is not recognised.
+    """
+    content_type = (headers or {}).get('content-type') or ''
+    for parameter in content_type.split(';')[1:]:
+        name, _, value = parameter.partition('=')
+        if name.strip().lower() == 'charset':
+            try:
+                return codecs.lookup(value.strip().strip('"\'')).name
+            except LookupError:
+                break
+    return 'utf-8'
+
+
+class Response(collections.namedtuple('Response',
+                                       ['status_code', 'content', 'headers'])):
+    """
+    The subset of a HTTP response beam needs; mirrors `requests.Response`.
+    `headers` maps lower-cased names to values, and may be None.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, status_code, content, headers=None):
+        """
+        Create a new response.
+
+        :param status_code: The HTTP status code.
+        :param content: The body, as bytes.
+        :param headers: The headers, keyed by lower-cased name, if known.
+        :return: The response.
+        """
+        return super(Response, cls).__new__(cls, status_code, content,
+                                            headers)
+
+    @property
+    def text(self):
+        """
+        Retrieve the body of the response as text, decoded with the charset it
+        declares, or UTF-8 if it declares none.
+
+        :return: The decoded body.
+        """
+        return self.content.decode(content_charset(self.headers), 'replace')
+
+
+class StreamTransport(object):
+    """
+    A minimal asyncio HTTP/1.1 client, sufficient for talking to SolusVM.
+    Connections are kept alive and reused for later requests to the same
+    server, keeping up to `pool_size` idle connections per server and event
+    loop.
+
+    Any object with a compatible `request()` coroutine can be used in place of
+    this class, e.g. to talk to a fake server in tests.
+    """
+
+    def __init__(self, timeout=30, ssl_context=None, connect_timeout=None,
+                 pool_size=10, keep_alive=True):
+        """
+        Initialise a new transport.
+
+        :param timeout: The number of seconds after which to abandon a request,
+                        or None to wait indefinitely.
+        :param ssl_context: The SSL context to use for https endpoints;
+                            defaults to the system's default context.
+        :param connect_timeout: The number of seconds after which to abandon
+                                connecting, or None to only apply `timeout`.
+        :param pool_size: The maximum number of idle connections to keep open
+                          to each server.
+        :param keep_alive: Whether to reuse connections between requests.
+        :raises ValueError: If the pool size is less than 1.
+        """
+        if pool_size < 1:
+            raise ValueError('Pool size must be at least 1')
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self._ssl_context = ssl_context
+        # maps (event loop, scheme, host, port) to a list of idle
+        # (reader, writer) tuples, most recently used last; loops in several
+        # threads may share a vendor's transport
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    async def request(self, method, url, params):
+        """
+        Make a HTTP request.
+
+        :param method: The HTTP method, either 'GET' or 'POST'.
+        :param url: The URL to request, with protocol.
+        :param params: A dictionary of parameters, sent in the query string for
+                       GET requests and as a form-encoded body for POST
+                       requests.
+        :return: The response received.
+        :raises ValueError: If the method or URL is invalid.
+        :raises RuntimeError: If the response is malformed.
+        :raises OSError: If the connection fails.
+        :raises asyncio.TimeoutError: If the request times out.
+        """
+        return await asyncio.wait_for(self._request(method, url, params),
+                                      self.timeout)
+
+    async def _request(self, method, url, params):
+        """
+        Make a HTTP request, without a timeout.
+
+        :param method: The HTTP method, either 'GET' or 'POST'.
+        :param url: The URL to request, with protocol.
+        :param params: A dictionary of parameters.
+        :return: The response received.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('Unsupported URL: {0}'.format(url))
+        if method not in ('GET', 'POST'):
+            raise ValueError('Unsupported method: {0}'.format(method))
+
+        path = parts.path or '/'
+        encoded = urlencode(params)
+        headers = ['Host: {0}'.format(parts.netloc),
+                   'Connection: {0}'.format(
+                       'keep-alive' if self.keep_alive else 'close')]
+        if method == 'GET':
+            path += '?' + encoded
+            body = b''
+        else:
+            body = encoded.encode('ascii')
+            headers += ['Content-Type: application/x-www-form-urlencoded',
+                        'Content-Length: {0}'.format(len(body))]
+        message = '{0} {1} HTTP/1.1\r\n{2}\r\n\r\n'.format(
+            method, path, '\r\n'.join(headers)).encode('ascii') + body
+
+        secure = parts.scheme == 'https'
+        key = (asyncio.get_running_loop(), parts.scheme, parts.hostname,
+               parts.port or (443 if secure else 80))
+        # the server may have closed an idle connection just as it was reused,
+        # in which case the request was not processed; actions are not
+        # idempotent, so only info requests risk this
+        connection = self._checkout(key) if method == 'GET' else None
+        if connection is not None:
+            try:
+                return await self._exchange(key, connection, message)
+            except OSError:
+                pass
+        return await self._exchange(key, await self._connect(key), message)
+
+    async def _connect(self, key):
+        """
+        Open a new connection to a server.
+
+        :param key: The pool key of the server.
+        :return: A `(reader, writer)` tuple.
+        :raises OSError: If the connection fails.
+        :raises asyncio.TimeoutError: If connecting times out.
+        """
+        _, scheme, hostname, port = key
+        context = None
+        if scheme == 'https':
+            context = self._ssl_context or ssl.create_default_context()
+        return await asyncio.wait_for(
+            asyncio.open_connection(hostname, port, ssl=context),
+            self.connect_timeout)
+
+    def _checkout(self, key):
+        """
+        Take an idle connection to a server from the pool, discarding any
+        the server has closed, and connections on event loops that have since
+        been closed.
+
+        :param key: The pool key of the server.
+        :return: A `(reader, writer)` tuple, or None if there is no usable
+                 idle connection.
+        """
+        with self._lock:
+            for other in [other for other in self._idle
+                          if other[0].is_closed()]:
+                del self._idle[other]
+            idle = self._idle.get(key, [])
+            while idle:
+                reader, writer = idle.pop()
+                if not reader.at_eof() and not writer.is_closing():
+                    return reader, writer
+                writer.close()
+        return None
+
+    def _checkin(self, key, connection):
+        """
+        Return a connection to the pool once its response has been read in
+        full, closing it if the pool is full.
+
+        :param key: The pool key of the server.
+        :param connection: A `(reader, writer)` tuple.
+        """
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection[1].close()
+
+    async def _exchange(self, key, connection, message):
+        """
+        Send a request on a connection and read its response, returning the
+        connection to the pool if it can be reused.
+
+        :param key: The pool key of the server.
+        :param connection: A `(reader, writer)` tuple.
+        :param message: The encoded request.
+        :return: The response received.
+        :raises RuntimeError: If the response is malformed.
+        :raises OSError: If the connection fails or is closed before the
+                         response is complete.
+        """
+        reader, writer = connection
+        try:
+            writer.write(message)
+            await writer.drain()
+            response, reusable = await self._read_response(reader)
+        except asyncio.IncompleteReadError:
+            writer.close()
+            raise ConnectionError('Connection closed before the response was '
+                                  'complete')
+        except BaseException:
+            # e.g. cancelled by the timeout; the connection is mid-response
+            writer.close()
+            raise
+        if reusable and self.keep_alive:
+            self._checkin(key, connection)
+        else:
+            writer.close()
+        return response
+
+    @classmethod
+    async def _read_response(cls, reader):
+        """
+        Read a response from a connection, using its framing headers to find
+        where it ends.
+
+        :param reader: The connection's stream reader.
+        :return: A `(response, reusable)` tuple, where `reusable` is whether
+                 the connection may be used for another request.
+        :raises RuntimeError: If the response is malformed, or its headers
+                              are too long.
+        :raises asyncio.IncompleteReadError: If the server closed the
+                                             connection early.
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise RuntimeError('HTTP response headers too long')
+        status_code, version, headers = cls._parse_head(head)
+        connection = headers.get('connection', '').lower()
+        reusable = connection == 'keep-alive' if version == b'HTTP/1.0' \
+            else connection != 'close'
+        if status_code in (204, 304) or 100 <= status_code < 200:
+            body = b''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            body = await cls._read_chunked(reader)
+        elif 'content-length' in headers:
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                raise RuntimeError('Malformed HTTP Content-Length')
+            body = await reader.readexactly(length)
+        else:
+            # delimited by the server closing the connection
+            body = await reader.read()
+            reusable = False
+        return Response(status_code, body, headers), reusable
+
+    @staticmethod
+    async def _read_chunked(reader):
+        """
+        Read a body sent with chunked transfer encoding.
+
+        :param reader: The connection's stream reader.
+        :return: The decoded body.
+        :raises RuntimeError: If a chunk size is malformed.
+        :raises asyncio.IncompleteReadError: If the server closed the
+                                             connection early.
+        """
+        chunks = []
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            try:
+                size = int(line.split(b';', 1)[0], 16)
+            except ValueError:
+                raise RuntimeError('Malformed HTTP chunk size')
+            if not size:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        # skip any trailers
+        while await reader.readuntil(b'\r\n') != b'\r\n':
+            pass
+        return b''.join(chunks)
+
+    @staticmethod
+    def _parse_head(head):
+        """
+        Parse the status line and headers of a HTTP/1.x response.
+
+        :param head: The bytes received up to the blank line after the
+                     headers.
+        :return: A `(status code, version, headers)` tuple, where headers
+                 maps lower-cased names to values.
+        :raises RuntimeError: If the response is malformed.
+        """
+        lines = head.rstrip(b'\r\n').split(b'\r\n')
+        status_line = lines[0].split()
+        if len(status_line) < 2 or not status_line[0].startswith(b'HTTP/'):
+            raise RuntimeError('Malformed HTTP response')
+        try:
+            status_code = int(status_line[1])
+        except ValueError:
+            raise RuntimeError('Malformed HTTP status line')
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return status_code, status_line[0], headers
+
+    def close(self):
+        """
+        Close every idle connection. Connections on event loops that have
+        been closed are discarded, as they can no longer be used.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for (loop, _, _, _), connections in idle.items():
+            if loop.is_closed():
+                continue
+            for _, writer in connections:
+                writer.close()
@@ -1,27 +1,453 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import asyncio
+import random
+import threading
+import time
+from concurrent import futures
+
 import six
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from beam import instrument
+from beam.breaker import CircuitBreaker
+from beam.ratelimit import AdaptiveLimiter, parse_rate
+from beam.transport import StreamTransport
+
+
+# the pool making hedged requests, shared by every vendor so no vendor owns
+# threads that would outlive it; created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+# the most hedged requests in progress at once across all vendors
+_HEDGING_WORKERS = 32
+
+
+def _hedging_executor():
+    """
+    Retrieve the executor hedged requests are made on, creating it if
+    necessary. Its idle threads are joined when the interpreter exits.
+
+    :return: The shared `ThreadPoolExecutor`.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = futures.ThreadPoolExecutor(
+                    _HEDGING_WORKERS, thread_name_prefix='beam-hedge')
+    return _executor
+
+
+def _parse_boolean(value):
+    """
+    Parse a boolean in any of the forms accepted by configparser.
+
+    :param value: The string to parse.
+    :return: The parsed boolean.
+    :raises ValueError: If the string is not a recognised boolean.
+    """
+    lowered = value.lower()
+    if lowered in ('1', 'yes', 'true', 'on'):
+        return True
+    if lowered in ('0', 'no', 'false', 'off'):
+        return False
+    raise ValueError('Not a boolean: {0}'.format(value))
 
 
 @six.python_2_unicode_compatible
 class Vendor(object):
     """
-    Represents a VPS provider.
+    Represents a VPS provider. Each vendor owns a pooled HTTP session, so
+    requests for all of its hosts reuse the same connections to its control
+    panel.
     """
 
-    def __init__(self, name, endpoint):
+    # connection options that can be set per vendor in the configuration file,
+    # and the function used to parse each from a string
+    OPTIONS = {
+        'pool_size': int,
+        'keep_alive': _parse_boolean,
+        'connect_timeout': float,
+        'timeout': float,
+        'retries': int,
+        'backoff': float,
+        'hedge_after': float,
+        'failure_threshold': int,
+        'reset_timeout': float,
+        'rate': parse_rate,
+        'max_in_flight': int
+    }
+
+    # info requests receiving these statuses are retried
+    _RETRY_STATUSES = frozenset([500, 502, 503, 504])
+
+    # the longest time to wait between retries, in seconds
+    _MAX_BACKOFF = 30
+
+    @property
+    def session(self):
+        """
+        Retrieve the HTTP session used to make requests to this vendor,
+        creating it if necessary.
+
+        :return: The vendor's session.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def __init__(self, name, endpoint, pool_size=10, keep_alive=True,
+                 connect_timeout=10, timeout=60, retries=0, backoff=0,
+                 hedge_after=None, failure_threshold=5, reset_timeout=30,
+                 rate=None, max_in_flight=None):
         """
         Initialise a new vendor object.
 
         :param name: The name of the vendor, e.g. "RamNode".
         :param endpoint: The hostname of the SolusVM control panel, with
                          protocol.
+        :param pool_size: The maximum number of connections to keep open to the
+                          control panel.
+        :param keep_alive: Whether to reuse connections between requests.
+        :param connect_timeout: The number of seconds to wait for a connection
+                                to the control panel, or None to wait
+                                indefinitely.
+        :param timeout: The number of seconds to wait for the control panel to
+                        respond, or None to wait indefinitely.
+        :param retries: The number of times to retry an info request that
+                        failed to connect, timed out or returned a server
+                        error.
+        :param backoff: The backoff factor between retries, in seconds. The
+                        wait before the nth retry is chosen at random up to
+                        `backoff * 2 ** (n - 1)`.
+        :param hedge_after: If an info request has not completed after this
+                            many seconds, send a second, identical request and
+                            use whichever response arrives first; None to
+                            never hedge.
+        :param failure_threshold: The number of consecutive failed requests
+                                  after which requests fail immediately, or 0
+                                  to always make requests.
+        :param reset_timeout: The number of seconds to fail requests
+                              immediately for before trying again.
+        :param rate: The maximum number of requests per second to make to the
+                     control panel, or None for no limit.
+        :param max_in_flight: The maximum number of requests to have in
+                              progress at once, or None for no limit.
+        :raises ValueError: If any of the connection options are invalid.
         """
+        if pool_size < 1:
+            raise ValueError('Pool size must be at least 1')
+        if connect_timeout is not None and connect_timeout <= 0:
+            raise ValueError('Connect timeout must be positive')
+        if timeout is not None and timeout <= 0:
+            raise ValueError('Timeout must be positive')
+        if retries < 0:
+            raise ValueError('Retries cannot be negative')
+        if backoff < 0:
+            raise ValueError('Backoff cannot be negative')
+        if hedge_after is not None and hedge_after <= 0:
+            raise ValueError('Hedging delay must be positive')
+        if failure_threshold < 0:
+            raise ValueError('Failure threshold cannot be negative')
+        if reset_timeout <= 0:
+            raise ValueError('Reset timeout must be positive')
+        if rate is not None and rate <= 0:
+            raise ValueError('Rate must be positive')
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError('At least one request must be allowed in flight')
+
         self.name = name
         """ The vendor's name, e.g. "RamNode". """
         self.endpoint = endpoint
         """ The hostname of the SolusVM control panel, with protocol. """
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.limiter = None
+        """ The `AdaptiveLimiter` applied to requests, if any limit is set. """
+        if rate is not None or max_in_flight is not None:
+            self.limiter = AdaptiveLimiter(rate, max_in_flight)
+        self.breaker = None
+        """ The `CircuitBreaker` guarding requests, unless disabled. """
+        if failure_threshold:
+            self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._transport = None
+
+    def get(self, path, params):
+        """
+        Make a GET request to this vendor's control panel, retrying and hedging
+        it according to the vendor's options.
+
+        :param path: The path relative to the vendor's endpoint.
+        :param params: The query string parameters.
+        :return: The response.
+        :raises CircuitOpenError: If requests to the vendor are failing.
+        :raises requests.RequestException: If the request fails.
+        """
+        def attempt():
+            return self._call('GET', self.session.get, self.endpoint + path,
+                              params=params, timeout=self._timeouts())
+
+        for retry in range(self.retries + 1):
+            if retry:
+                time.sleep(self._backoff(retry))
+            try:
+                response = self._hedged(attempt) \
+                    if self.hedge_after is not None else attempt()
+            except (requests.ConnectionError, requests.Timeout):
+                if retry == self.retries:
+                    raise
+                continue
+            if response.status_code not in self._RETRY_STATUSES:
+                break
+        return response
+
+    def post(self, path, data):
+        """
+        Make a POST request to this vendor's control panel. These carry
+        actions, which are not idempotent, so are never retried or hedged.
+
+        :param path: The path relative to the vendor's endpoint.
+        :param data: The form parameters.
+        :return: The response.
+        :raises CircuitOpenError: If requests to the vendor are failing.
+        :raises requests.RequestException: If the request fails.
+        """
+        return self._call('POST', self.session.post, self.endpoint + path,
+                          data=data, timeout=self._timeouts())
+
+    async def request(self, transport, method, path, params):
+        """
+        Asynchronously make a request to this vendor's control panel. GET
+        requests are retried and hedged according to the vendor's options.
+
+        :param transport: The transport to send the request with, e.g. a
+                          `StreamTransport`.
+        :param method: The HTTP method, either 'GET' or 'POST'.
+        :param path: The path relative to the vendor's endpoint.
+        :param params: The query string or form parameters.
+        :return: The response.
+        :raises CircuitOpenError: If requests to the vendor are failing.
+        """
+        def attempt():
+            return self._acall(transport.request, method,
+                               self.endpoint + path, params)
+
+        if method != 'GET':
+            return await attempt()
+        for retry in range(self.retries + 1):
+            if retry:
+                await asyncio.sleep(self._backoff(retry))
+            try:
+                response = await self._ahedged(attempt) \
+                    if self.hedge_after is not None else await attempt()
+            except (OSError, asyncio.TimeoutError):
+                if retry == self.retries:
+                    raise
+                continue
+            if response.status_code not in self._RETRY_STATUSES:
+                break
+        return response
+
+    def transport(self):
+        """
+        Retrieve the transport used for asynchronous requests to this vendor,
+        creating it if necessary. Like the session, it keeps up to
+        `pool_size` connections alive, and uses the vendor's timeouts.
+
+        :return: The vendor's `StreamTransport`.
+        """
+        if self._transport is None:
+            with self._session_lock:
+                if self._transport is None:
+                    self._transport = StreamTransport(
+                        self.timeout, connect_timeout=self.connect_timeout,
+                        pool_size=self.pool_size, keep_alive=self.keep_alive)
+        return self._transport
+
+    def _timeouts(self):
+        """
+        Find the timeouts to pass to requests.
+
+        :return: A `(connect, read)` tuple of timeouts in seconds.
+        """
+        return self.connect_timeout, self.timeout
+
+    def _backoff(self, retry):
+        """
+        Choose how long to wait before a retry, with full jitter, so clients
+        retrying at once do not hit the control panel in lockstep.
+
+        :param retry: The number of the retry, starting at 1.
+        :return: The number of seconds to wait.
+        """
+        return random.uniform(
+            0, min(self._MAX_BACKOFF, self.backoff * 2 ** (retry - 1)))
+
+    def _hedged(self, attempt):
+        """
+        Make a request, and a second, identical request if the first has not
+        completed within the hedging delay.
+
+        :param attempt: A function making the request.
+        :return: The first response received.
+        :raises Exception: The error raised by the last request to fail, if
+                           both do.
+        """
+        executor = _hedging_executor()
+        pending = [executor.submit(attempt)]
+        if not futures.wait(pending, self.hedge_after).done:
+            pending.append(executor.submit(attempt))
+        error = None
+        for completed in futures.as_completed(pending):
+            try:
+                # a slower request is left to complete in the background
+                return completed.result()
+            except Exception as e:
+                error = e
+        raise error
+
+    async def _ahedged(self, attempt):
+        """
+        Asynchronously make a request, and a second, identical request if the
+        first has not completed within the hedging delay. Whichever request is
+        still in progress when the other completes is cancelled.
+
+        :param attempt: A coroutine function making the request.
+        :return: The first response received.
+        :raises Exception: The error raised by the last request to fail, if
+                           both do.
+        """
+        tasks = [asyncio.ensure_future(attempt())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                tasks.append(asyncio.ensure_future(attempt()))
+            error = None
+            for completed in asyncio.as_completed(tasks):
+                try:
+                    return await completed
+                except Exception as e:
+                    error = e
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _call(self, method, func, *args, **kwargs):
+        """
+        Make a single request, subject to this vendor's circuit breaker and
+        limits.
+
+        :param method: The HTTP method, for instrumentation.
+        :param func: The function making the request, returning a response.
+        :return: The response.
+        :raises CircuitOpenError: If requests to the vendor are failing.
+        """
+        if self.breaker is not None:
+            self.breaker.allow()
+        if self.limiter is not None:
+            self.limiter.acquire()
+        start = time.monotonic()
+        # connection errors and timeouts count as failures too
+        status = None
+        try:
+            with instrument.span(instrument.REQUEST, vendor=self.name,
+                                 method=method) as span:
+                response = func(*args, **kwargs)
+                status = span.attributes['status'] = response.status_code
+            return response
+        finally:
+            self._record(status, time.monotonic() - start)
+
+    async def _acall(self, func, *args):
+        """
+        Asynchronously make a single request, subject to this vendor's circuit
+        breaker and limits.
+
+        :param func: The coroutine function making the request, returning a
+                     response.
+        :return: The response.
+        :raises CircuitOpenError: If requests to the vendor are failing.
+        """
+        if self.breaker is not None:
+            self.breaker.allow()
+        if self.limiter is not None:
+            try:
+                await self.limiter.aacquire()
+            except BaseException:
+                # the limiter frees any slot itself; only end a trial
+                if self.breaker is not None:
+                    self.breaker.record(None)
+                raise
+        start = time.monotonic()
+        try:
+            with instrument.span(instrument.REQUEST, vendor=self.name,
+                                 method=args[0]) as span:
+                response = await func(*args)
+                span.attributes['status'] = response.status_code
+        except asyncio.CancelledError:
+            # abandoned, e.g. the losing request of a hedged pair
+            self._record(None, None)
+            raise
+        except BaseException:
+            # connection errors and timeouts count as failures too
+            self._record(None, time.monotonic() - start)
+            raise
+        self._record(response.status_code, time.monotonic() - start)
+        return response
+
+    def _record(self, status, latency):
+        """
+        Record the outcome of a request with the circuit breaker and limiter.
+
+        :param status: The status code of the response, or None if no response
+                       was received.
+        :param latency: The number of seconds the request took, or None if it
+                        was abandoned.
+        """
+        if self.breaker is not None:
+            self.breaker.record(
+                None if latency is None else status is None or status >= 500)
+        if self.limiter is not None:
+            self.limiter.release(
+                latency, status is None or
+                status in AdaptiveLimiter.CONGESTION_STATUSES)
+
+    def _create_session(self):
+        """
+        Create a HTTP session configured with this vendor's connection options.
+        Retries are made by the vendor rather than the session, so they apply
+        to asynchronous requests too.
+
+        :return: The new session.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.pool_size,
+                              max_retries=Retry(0, read=False))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
 
     def __hash__(self):
         """
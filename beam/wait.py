@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import concurrent.futures
+import functools
+import heapq
+import itertools
+import threading
+import time
+
+import six
+
+from beam import fleet
+from beam.host import Host
+
+
+# the states a host can be waited for
+ONLINE = 'online'
+OFFLINE = 'offline'
+
+# the state each action leaves a host in, or the states it passes through in
+# order; SolusVM still reports a host online just after a reboot is accepted,
+# so a reboot is only complete once the host has been seen to go down and come
+# back up, or is still up after `Waiter`'s grace period
+EXPECTED_STATES = {
+    'boot': ONLINE,
+    'reboot': (OFFLINE, ONLINE),
+    'shutdown': OFFLINE
+}
+
+
+class _Wait(object):
+    """
+    A host being waited for: the states it must be seen in, in order, and
+    when to give up. Mutated by `Waiter` as the host is polled.
+    """
+
+    def __init__(self, identity, states, started, deadline, interval, grace,
+                 future):
+        """
+        Initialise a new wait.
+
+        :param identity: The identity of the host to poll.
+        :param states: The states the host must be seen in, in order, e.g.
+                       `(OFFLINE, ONLINE)` for a reboot.
+        :param started: When the wait started, as returned by
+                        `time.monotonic()`.
+        :param deadline: When to give up, as returned by `time.monotonic()`.
+        :param interval: The number of seconds until the next poll.
+        :param grace: When a host in the state after the one being waited for
+                      may be taken to have passed through it unseen, as
+                      returned by `time.monotonic()`.
+        :param future: The future resolved with the host once it has been
+                       seen in the final state, or with the reason it was not.
+        """
+        self.identity = identity
+        # the states still to be seen, in order
+        self.states = list(states)
+        self.started = started
+        self.deadline = deadline
+        self.interval = interval
+        self.grace = grace
+        self.future = future
+        # the exception raised by the last poll, if it failed
+        self.error = None
+
+    @property
+    def is_online(self):
+        """
+        Find which state the host is currently being waited to reach.
+
+        :return: True if the host must come online next, false if it must go
+                 offline.
+        """
+        return self.states[0] == ONLINE
+
+    @property
+    def is_transient(self):
+        """
+        Find whether the state being waited for is one the host only passes
+        through, e.g. offline during a reboot.
+
+        :return: True if other states must be seen after it, false otherwise.
+        """
+        return len(self.states) > 1
+
+
+class Waiter(object):
+    """
+    Waits for hosts to come online or go offline, e.g. after an action, by
+    polling only their status. A single scheduler thread serves every wait,
+    so many hosts can be waited for at once. The interval between polls of a
+    host grows the longer it takes to reach its final state, so quick
+    transitions are noticed quickly and slow ones do not load the control
+    panel. States a host only passes through, e.g. offline during a reboot,
+    are polled for at the minimum interval, as they may be brief.
+    """
+
+    def __init__(self, min_interval=1, max_interval=15, backoff=1.5,
+                 workers=fleet.DEFAULT_WORKERS, fetch=None, grace=30):
+        """
+        Initialise a new waiter.
+
+        :param min_interval: The number of seconds before the first poll of a
+                             host.
+        :param max_interval: The maximum number of seconds between polls.
+        :param backoff: The factor the interval is multiplied by after each
+                        poll finding the host yet to reach its final state.
+        :param workers: The maximum number of polls to make at once.
+        :param fetch: A function taking an identity and returning its host
+                      with `is_online` populated; defaults to requesting only
+                      the host's status, bypassing the host cache.
+        :param grace: The number of seconds after which a host already in the
+                      state following a transient one is taken to have passed
+                      through it between polls, e.g. a host still online
+                      this long after a reboot was requested is taken to have
+                      rebooted quickly. Capped at each wait's timeout.
+        :raises ValueError: If any parameter is out of range.
+        """
+        if min_interval <= 0:
+            raise ValueError('Minimum interval must be positive')
+        if max_interval < min_interval:
+            raise ValueError(
+                'Maximum interval cannot be less than the minimum')
+        if backoff < 1:
+            raise ValueError('Backoff cannot be less than 1')
+        if workers < 1:
+            raise ValueError('At least one worker is required')
+        if grace < 0:
+            raise ValueError('Grace period cannot be negative')
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.workers = workers
+        self.grace = grace
+        self._fetch = fetch or functools.partial(Host.request_from_identity,
+                                                 fields=['is_online'],
+                                                 cached=False)
+        # (due time, sequence, wait); the sequence breaks ties
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, identity, state, timeout=300):
+        """
+        Start waiting for a host to reach a state.
+
+        :param identity: The identity of the host.
+        :param state: `ONLINE` or `OFFLINE`, or a sequence of them the host
+                      must be seen in one after the other, e.g.
+                      `(OFFLINE, ONLINE)` to wait for a reboot to finish.
+        :param timeout: The maximum number of seconds to wait for the host to
+                        reach the final state.
+        :return: A `concurrent.futures.Future` resolving to the host once it
+                 is in the final state, or raising `RuntimeError` if it is not
+                 within the timeout.
+        :raises ValueError: If any state is invalid.
+        """
+        states = (state,) if isinstance(state, six.string_types) \
+            else tuple(state)
+        if not states:
+            raise ValueError('At least one state is required')
+        for state_ in states:
+            if state_ not in (ONLINE, OFFLINE):
+                raise ValueError('Invalid state: {0}'.format(state_))
+        future = concurrent.futures.Future()
+        now = time.monotonic()
+        wait = _Wait(identity, states, now, now + timeout, self.min_interval,
+                     now + min(self.grace, timeout), future)
+        with self._condition:
+            self._schedule_poll(wait, now)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def wait(self, identities, state, timeout=300):
+        """
+        Wait for several hosts to reach a state.
+
+        :param identities: The identities of the hosts.
+        :param state: `ONLINE` or `OFFLINE`, or a sequence of them, as
+                      accepted by `submit()`.
+        :param timeout: The maximum number of seconds to wait for each host.
+        :return: The hosts, in the final state, in the order given.
+        :raises ValueError: If any state is invalid.
+        :raises RuntimeError: If any host does not reach the state in time.
+        """
+        futures = [self.submit(identity, state, timeout)
+                   for identity in identities]
+        return [future.result() for future in futures]
+
+    def __len__(self):
+        """
+        Find the number of hosts being waited for.
+
+        :return: The number of waits in progress.
+        """
+        with self._condition:
+            return len(self._schedule) + self._in_flight
+
+    def _schedule_poll(self, wait, now):
+        """
+        Schedule the next poll of a host. Must be called with the condition
+        held.
+
+        :param wait: The wait to poll for.
+        :param now: The current time, as returned by `time.monotonic()`.
+        """
+        due = min(now + wait.interval, wait.deadline)
+        heapq.heappush(self._schedule, (due, next(self._sequence), wait))
+
+    def _run(self):
+        """
+        Run the scheduler thread. Polls are handed to a pool of workers as
+        they fall due, and the thread sleeps until the next is due or a wait
+        is submitted. It exits once there is nothing scheduled or in flight.
+        """
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            while True:
+                with self._condition:
+                    if not self._schedule:
+                        if not self._in_flight:
+                            # exit while idle; the next submission restarts
+                            # the thread
+                            self._thread = None
+                            return
+                        self._condition.wait()
+                        continue
+                    now = time.monotonic()
+                    due = []
+                    while self._schedule and self._schedule[0][0] <= now:
+                        due.append(heapq.heappop(self._schedule)[2])
+                    if not due:
+                        self._condition.wait(self._schedule[0][0] - now)
+                        continue
+                    self._in_flight += len(due)
+                for wait in due:
+                    executor.submit(self._poll, wait)
+
+    def _poll(self, wait):
+        """
+        Poll a host's status, then resolve its wait or schedule the next poll.
+
+        :param wait: The wait to poll for.
+        """
+        host = None
+        if not wait.future.cancelled():
+            try:
+                host = self._fetch(wait.identity)
+                wait.error = None
+            except Exception as e:
+                # e.g. the control panel is briefly unavailable; keep trying
+                wait.error = e
+        now = time.monotonic()
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+            if wait.future.cancelled():
+                return
+            if host is not None and wait.is_transient and \
+                    host.is_online != wait.is_online and now >= wait.grace:
+                # already in the next state; a quick transition, e.g. a fast
+                # reboot, fell between polls
+                wait.states.pop(0)
+                wait.grace = now + self.grace
+            if host is not None and host.is_online == wait.is_online and \
+                    wait.is_transient:
+                # seen in this state; start watching for the next promptly
+                wait.states.pop(0)
+                wait.interval = self.min_interval
+                wait.grace = now + self.grace
+                if now < wait.deadline:
+                    self._schedule_poll(wait, now)
+                    return
+            elif host is None or host.is_online != wait.is_online:
+                if now < wait.deadline:
+                    if not wait.is_transient:
+                        # transient states may be brief, so are not backed
+                        # off from
+                        wait.interval = min(self.max_interval,
+                                            wait.interval * self.backoff)
+                    self._schedule_poll(wait, now)
+                    return
+        if not wait.future.set_running_or_notify_cancel():
+            return
+        if host is not None and host.is_online == wait.is_online:
+            wait.future.set_result(host)
+        elif wait.error is not None:
+            wait.future.set_exception(wait.error)
+        else:
+            wait.future.set_exception(RuntimeError(
+                '{0} did not {1} within {2:g}s'.format(
+                    wait.identity.name,
+                    'come online' if wait.is_online else 'go offline',
+                    wait.deadline - wait.started)))
+
+
+_waiter = None
+_waiter_lock = threading.Lock()
+
+
+def _get_waiter():
+    """
+    Retrieve the waiter shared by `wait_until()`, creating it if necessary.
+
+    :return: The shared `Waiter`.
+    """
+    global _waiter
+    if _waiter is None:
+        with _waiter_lock:
+            if _waiter is None:
+                _waiter = Waiter()
+    return _waiter
+
+
+def wait_until(identities, state, timeout=300):
+    """
+    Wait for hosts to reach a state, polling only their status. Calls from
+    different threads share a single scheduler.
+
+    :param identities: The identities of the hosts, e.g. `Host` objects.
+    :param state: `ONLINE` or `OFFLINE`, or a sequence of them the hosts must
+                  be seen in one after the other.
+    :param timeout: The maximum number of seconds to wait for each host.
+    :return: The hosts, retrieved in the final state, in the order given.
+    :raises ValueError: If any state is invalid.
+    :raises RuntimeError: If any host does not reach the state in time.
+    """
+    return _get_waiter().wait(identities, state, timeout)
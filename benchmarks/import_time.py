@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measure how long `import beam` takes with a large inventory, compared with
+importing beam and then parsing its configuration, which is what every import
+did before configuration was loaded lazily, and with loading the compiled
+configuration as beam now does on first use.
+
+Usage: python benchmarks/import_time.py [--hosts N] [--runs N]
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_STATEMENTS = [
+    ('import beam', 'import beam'),
+    ('import beam + parse', 'import beam; '
+                            'beam.config.Config.from_ini(".beam.ini")'),
+    ('import beam + compiled', 'import beam; beam._get_config()')
+]
+
+
+def write_inventory(path, hosts, endpoints=('https://vpscp.ramnode.com',
+                                            'https://solus.fliphost.net')):
+    """
+    Write a generated inventory file.
+
+    :param path: The path to write to.
+    :param hosts: The number of hosts to define.
+    :param endpoints: The endpoints of the two vendors hosts alternate
+                      between.
+    """
+    with open(path, 'w') as f:
+        f.write('[special:vendors]\n'
+                'ramnode = {0}\n'
+                'fliphost = {1}\n'
+                'default = ramnode\n'.format(*endpoints))
+        for i in range(hosts):
+            f.write('\n[host-{0}]\nkey = key-{0}\nhash = hash-{0}\n'.format(i))
+            if i % 2:
+                f.write('vendor = fliphost\n')
+
+
+def time_statement(statement, cwd, runs):
+    """
+    Time a statement in fresh interpreters. Anything beam caches is kept in
+    the directory, rather than the user's cache.
+
+    :param statement: The Python code to run.
+    :param cwd: The directory to run it in.
+    :param runs: The number of interpreters to start.
+    :return: The median wall time in seconds.
+    """
+    env = dict(os.environ, PYTHONPATH=_ROOT,
+               XDG_CACHE_HOME=os.path.join(cwd, 'cache'))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', statement], cwd=cwd,
+                              env=env)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--hosts', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        write_inventory(os.path.join(directory, '.beam.ini'), args.hosts)
+        for name, statement in _STATEMENTS:
+            median = time_statement(statement, directory, args.runs)
+            print('{0:<24} {1:8.1f} ms'.format(name, median * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare the memory used by a fleet of `Host` objects against the previous
+implementation, which held every attribute of hosts and resources in a
+per-instance dictionary.
+
+Usage: python benchmarks/memory.py [--hosts N]
+"""
+from __future__ import unicode_literals, print_function, division
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beam.host import Host, HostIdentity  # noqa: E402
+from beam.resource import Resource  # noqa: E402
+from beam.vendor import Vendor  # noqa: E402
+
+_VENDOR = Vendor('vendor', 'https://vendor.example.com')
+
+
+class LegacyResource(object):
+    """
+    The implementation `Resource` replaced, kept for comparison.
+    """
+
+    def __init__(self, used_bytes, free_bytes):
+        self.used_bytes = used_bytes
+        self.free_bytes = free_bytes
+        self.total_bytes = used_bytes + free_bytes
+        self.used_percentage = 1 if not self.total_bytes else \
+            used_bytes / self.total_bytes
+        self.free_percentage = 1 - self.used_percentage
+
+
+class LegacyHost(object):
+    """
+    The implementation `Host` replaced, kept for comparison.
+    """
+
+    def __init__(self, identity, fqdn, primary_ip, is_online, memory, storage,
+                 bandwidth, ip_addresses):
+        self.name = identity.name
+        self.key = identity.key
+        self.hash = identity.hash
+        self.vendor = identity.vendor
+        self.fqdn = fqdn
+        self.primary_ip = primary_ip
+        self.is_online = is_online
+        self.memory = memory
+        self.storage = storage
+        self.bandwidth = bandwidth
+        self.ip_addresses = ip_addresses
+        self.fields = frozenset(field for field in Host.FIELDS
+                                if getattr(self, field) is not None)
+
+
+def build(count, host, resource):
+    """
+    Build a fleet of hosts, as would be retrieved from SolusVM.
+
+    :param count: The number of hosts.
+    :param host: The host class to instantiate.
+    :param resource: The resource class to instantiate.
+    :return: The list of hosts.
+    """
+    hosts = []
+    for i in range(count):
+        identity = HostIdentity('host-{0}'.format(i), 'key-{0}'.format(i),
+                                'hash-{0}'.format(i), _VENDOR)
+        hosts.append(host(identity,
+                          'host-{0}.example.com'.format(i),
+                          '10.0.{0}.{1}'.format(i // 256 % 256, i % 256),
+                          True,
+                          resource(i * 1024, 2 ** 30 - i * 1024),
+                          resource(i * 4096, 2 ** 35 - i * 4096),
+                          resource(i * 8192, 2 ** 40 - i * 8192),
+                          ['10.0.{0}.{1}'.format(i // 256 % 256, i % 256)]))
+    return hosts
+
+
+def measure(count, host, resource):
+    """
+    Find how much memory a fleet of hosts occupies.
+
+    :param count: The number of hosts.
+    :param host: The host class to instantiate.
+    :param resource: The resource class to instantiate.
+    :return: The number of bytes allocated and still held.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        hosts = build(count, host, resource)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del hosts
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--hosts', type=int, default=50000)
+    args = parser.parse_args()
+
+    candidates = [
+        ('legacy', LegacyHost, LegacyResource),
+        ('slotted', Host, Resource)
+    ]
+    for name, host, resource in candidates:
+        size = measure(args.hosts, host, resource)
+        print('{0:<10} {1:8.1f} MiB {2:8.0f} bytes/host'.format(
+            name, size / 2 ** 20, size / args.hosts))
+
+
+if __name__ == '__main__':
+    main()
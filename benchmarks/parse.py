@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare the throughput of `Host.from_response` against the previous
+implementation, which wrapped the body in a root element, built a tree with
+`fromstring` and queried it with `find`.
+
+Usage: python benchmarks/parse.py [--seconds N]
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import glob
+import os
+import sys
+import timeit
+from xml.etree import ElementTree
+from xml.etree.ElementTree import ParseError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beam.host import Host, HostIdentity  # noqa: E402
+from beam.resource import Resource  # noqa: E402
+from beam.vendor import Vendor  # noqa: E402
+
+_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       'responses')
+
+_IDENTITY = HostIdentity('name', 'key', 'hash',
+                         Vendor('vendor', 'https://vendor.example.com'))
+
+
+def legacy_from_response(body, identity):
+    """
+    The implementation `Host.from_response` replaced, kept for comparison.
+    """
+    if not body:
+        raise ValueError('Cannot construct host from empty response')
+
+    try:
+        root = ElementTree.fromstring('<root>' + body + '</root>')
+
+        if root.find('status').text != 'success':
+            message = root.find('statusmsg')
+            raise RuntimeError(
+                'Response indicates failed API call: {0}'.format(
+                    message.text if message else 'unspecified error'))
+
+        return Host(identity,
+                    root.find('hostname').text,
+                    root.find('ipaddress').text,
+                    root.find('vmstat').text == 'online',
+                    Resource.from_response(root.find('mem').text),
+                    Resource.from_response(root.find('hdd').text),
+                    Resource.from_response(root.find('bw').text),
+                    root.find('ipaddr').text.split(','))
+    except ParseError as e:
+        raise ValueError('Host response is malformed: {0}'.format(e))
+    except AttributeError as e:
+        raise ValueError(
+            'Host response is missing an attribute: {0}'.format(e))
+
+
+def parse_corpus(func, bodies):
+    for body in bodies:
+        try:
+            func(body, _IDENTITY)
+        except RuntimeError:
+            pass
+
+
+def measure(func, bodies, seconds):
+    """
+    Find how many responses per second a parser can handle.
+
+    :param func: The parser.
+    :param bodies: The responses to parse.
+    :param seconds: The approximate length of time to measure for.
+    :return: The best observed responses per second.
+    """
+    timer = timeit.Timer(lambda: parse_corpus(func, bodies))
+    number, elapsed = timer.autorange()
+    repeat = max(3, int(seconds / max(elapsed, 1e-6)))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number * len(bodies) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    texts = []
+    for path in sorted(glob.glob(os.path.join(_CORPUS, '*.xml'))):
+        with open(path, 'rb') as f:
+            texts.append(f.read().decode('utf-8'))
+    encoded = [text.encode('utf-8') for text in texts]
+
+    candidates = [
+        ('legacy (text)', legacy_from_response, texts),
+        ('from_response (text)', Host.from_response, texts),
+        ('from_response (bytes)', Host.from_response, encoded)
+    ]
+    for name, func, bodies in candidates:
+        rate = measure(func, bodies, args.seconds / len(candidates))
+        print('{0:<24} {1:10.0f} responses/s'.format(name, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run beam's benchmark suite against a local fake SolusVM server, saving the
+results as JSON so runs can be compared to catch performance regressions.
+
+Usage: python benchmarks/run.py [--output FILE] [--compare BASELINE] [--quick]
+"""
+from __future__ import unicode_literals, print_function, division
+import argparse
+import collections
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_BENCHMARKS)
+sys.path.insert(0, _ROOT)
+
+import beam  # noqa: E402
+from beam import instrument  # noqa: E402
+from beam.config import Config  # noqa: E402
+from beam.host import Host  # noqa: E402
+from beam.tests.fake_solusvm import FakeSolusVM  # noqa: E402
+from import_time import write_inventory  # noqa: E402
+from parse import _CORPUS, measure  # noqa: E402
+
+
+class Result(collections.namedtuple('Result', ['value', 'unit',
+                                               'higher_is_better'])):
+    """
+    A single measurement.
+    """
+
+
+def _online_body():
+    """
+    Read the recorded info response of an online host, which the fake server
+    returns for every generated host.
+
+    :return: The response body, as text.
+    """
+    with open(os.path.join(_CORPUS, 'online.xml'), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def _start_server(args, hosts):
+    """
+    Create a fake SolusVM server answering for generated hosts. It starts
+    when used as a context manager.
+
+    :param args: The parsed command line arguments.
+    :param hosts: The number of hosts to answer for.
+    :return: The server.
+    """
+    server = FakeSolusVM(args.latency / 1000, args.jitter / 1000,
+                         args.error_rate, seed=0)
+    body = _online_body()
+    for i in range(hosts):
+        server.bodies['hash-{0}'.format(i)] = body
+    return server
+
+
+def _configure(directory, hosts, server):
+    """
+    Point beam at a generated inventory whose vendors are the fake server.
+
+    :param directory: The directory to write the inventory to.
+    :param hosts: The number of hosts to define.
+    :param server: The fake server.
+    :return: The path of the inventory.
+    """
+    path = os.path.join(directory, '.beam.ini')
+    write_inventory(path, hosts, (server.url, server.url))
+    beam.configure(Config.from_ini(path))
+    return path
+
+
+def bench_hosts(args, directory):
+    """
+    Measure retrieving every host in the inventory with `beam.hosts()`.
+    """
+    with _start_server(args, args.hosts) as server:
+        _configure(directory, args.hosts, server)
+        instrument.collector.reset()
+        start = time.perf_counter()
+        results = beam.hosts(workers=args.workers, return_exceptions=True)
+        elapsed = time.perf_counter() - start
+    fetches = [summary for (operation, _), summary in
+               beam.stats().items() if operation == instrument.FETCH]
+    return {
+        'hosts.throughput': Result(len(results) / elapsed, 'hosts/s', True),
+        'hosts.fetch_p50': Result(
+            max(summary.p50 for summary in fetches) * 1000, 'ms', False),
+        'hosts.fetch_p99': Result(
+            max(summary.p99 for summary in fetches) * 1000, 'ms', False),
+        'hosts.errors': Result(
+            sum(isinstance(result, Exception) for result in results),
+            'hosts', False)
+    }
+
+
+def bench_actions(args, directory):
+    """
+    Measure rebooting every host in the inventory with `beam.actions()`.
+    """
+    with _start_server(args, args.hosts) as server:
+        _configure(directory, args.hosts, server)
+        start = time.perf_counter()
+        report = beam.actions(['host-{0}'.format(i)
+                               for i in range(args.hosts)], 'reboot',
+                              workers=args.workers)
+        elapsed = time.perf_counter() - start
+    return {
+        'actions.throughput': Result(len(report) / elapsed, 'actions/s',
+                                     True),
+        'actions.failed': Result(len(report.failed), 'actions', False)
+    }
+
+
+def bench_cli(args, directory):
+    """
+    Measure a single-host query from a freshly started CLI.
+    """
+    env = dict(os.environ, PYTHONPATH=_ROOT,
+               XDG_CACHE_HOME=os.path.join(directory, 'cache'))
+    command = [sys.executable, '-m', 'beam', 'host-0', '--no-daemon', '-a',
+               'is_online']
+    with _start_server(args, 1) as server:
+        _configure(directory, args.hosts, server)
+        samples = []
+        # the first run compiles the inventory, so is not counted
+        for _ in range(args.runs + 1):
+            start = time.perf_counter()
+            subprocess.check_call(command, cwd=directory, env=env,
+                                  stdout=subprocess.DEVNULL, timeout=60)
+            samples.append(time.perf_counter() - start)
+    return {
+        'cli.cold_start': Result(statistics.median(samples[1:]) * 1000, 'ms',
+                                 False)
+    }
+
+
+def bench_config(args, directory):
+    """
+    Measure parsing a large generated inventory, and loading its compiled
+    copy.
+    """
+    path = os.path.join(directory, 'inventory.ini')
+    write_inventory(path, args.inventory_hosts)
+    results = {}
+    # compile the inventory into the temporary directory, not the user's cache
+    with mock.patch.dict(os.environ,
+                         {'XDG_CACHE_HOME': os.path.join(directory, 'cache')}):
+        for name, func in [('config.parse', Config.from_ini),
+                           ('config.load_compiled', Config.load)]:
+            func(path)
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                func(path)
+                samples.append(time.perf_counter() - start)
+            results[name] = Result(statistics.median(samples) * 1000, 'ms',
+                                   False)
+    return results
+
+
+def bench_parse(args, _):
+    """
+    Measure the throughput of `Host.from_response`.
+    """
+    bodies = []
+    for path in sorted(glob.glob(os.path.join(_CORPUS, '*.xml'))):
+        with open(path, 'rb') as f:
+            bodies.append(f.read())
+
+    def parse(body, identity):
+        try:
+            Host.from_response(body, identity)
+        except RuntimeError:
+            pass
+
+    return {
+        'parse.throughput': Result(measure(parse, bodies, args.seconds),
+                                   'responses/s', True)
+    }
+
+
+_SUITE = collections.OrderedDict([
+    ('hosts', bench_hosts),
+    ('actions', bench_actions),
+    ('cli', bench_cli),
+    ('config', bench_config),
+    ('parse', bench_parse)
+])
+
+
+def compare(baseline, results, threshold):
+    """
+    Print how results differ from a baseline.
+
+    :param baseline: The results of a previous run, as saved.
+    :param results: The results of this run, as saved.
+    :param threshold: The proportion by which a result must be worse than the
+                      baseline to count as a regression.
+    :return: The names of the results that regressed.
+    """
+    regressions = []
+    for name, result in sorted(results['results'].items()):
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        difference = result['value'] - previous['value']
+        if previous['value']:
+            change = difference / previous['value']
+        else:
+            # e.g. errors appearing where there were none
+            change = float('inf') if difference else 0.
+        worse = -change if result['higher_is_better'] else change
+        flag = ''
+        if worse > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{0:<24} {1:12.2f} -> {2:12.2f} {3:<12} {4:+7.1%}{5}'.format(
+            name, previous['value'], result['value'], result['unit'], change,
+            flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--output',
+                        help='the file to save results to as JSON')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='results of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='the proportion a result must worsen by to count '
+                             'as a regression')
+    parser.add_argument('--only', nargs='+', choices=list(_SUITE),
+                        help='the benchmarks to run; defaults to all')
+    parser.add_argument('--quick', action='store_true',
+                        help='run smaller benchmarks, e.g. in CI')
+    parser.add_argument('--hosts', type=int, default=1000,
+                        help='the number of hosts served by the fake server')
+    parser.add_argument('--inventory-hosts', type=int, default=10000,
+                        help='the number of hosts in the generated inventory '
+                             'parsed by the config benchmark')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=20,
+                        help='milliseconds the fake server delays responses by')
+    parser.add_argument('--jitter', type=float, default=10,
+                        help='maximum milliseconds of random extra delay')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='the proportion of requests the fake server fails')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='repetitions of the CLI and config benchmarks')
+    parser.add_argument('--seconds', type=float, default=3,
+                        help='approximate duration of the parse benchmark')
+    args = parser.parse_args()
+    if args.quick:
+        args.hosts = min(args.hosts, 200)
+        args.inventory_hosts = min(args.inventory_hosts, 1000)
+        args.runs = min(args.runs, 3)
+        args.seconds = min(args.seconds, 1)
+
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        for name in args.only or _SUITE:
+            for key, result in sorted(_SUITE[name](args, directory).items()):
+                results[key] = result
+                print('{0:<24} {1:12.2f} {2}'.format(key, result.value,
+                                                     result.unit))
+    finally:
+        shutil.rmtree(directory)
+
+    saved = {
+        'meta': {
+            'timestamp': datetime.datetime.now(
+                datetime.timezone.utc).isoformat(),
+            'beam': beam.__version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'options': vars(args)
+        },
+        'results': dict((key, result._asdict())
+                        for key, result in results.items())
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(baseline, saved, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
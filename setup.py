@@ -31,6 +31,10 @@ setup(
         'six>=1.9.0',
         'requests'
     ],
+    extras_require={
+        # vectorises `beam.table`, which falls back to the array module
+        'numpy': ['numpy']
+    },
     test_suite='nose.collector',
     tests_require=[
         'nose',